@@ -57,4 +57,13 @@ Secrets
 */}}
 {{- define "coral-credits.djangoSecretName" -}}
 {{- default (printf "%s-django-env" (include "coral-credits.fullname" .)) -}}
-{{- end -}}
\ No newline at end of file
+{{- end -}}
+{{/*
+Whether the database is a SQLite file on the data volume
+*/}}
+{{- define "coral-credits.sqliteDatabase" -}}
+{{- $engine := default "" .Values.settings.database.engine -}}
+{{- if or (not $engine) (contains "sqlite" $engine) -}}
+true
+{{- end -}}
+{{- end -}}
@@ -1,16 +1,256 @@
+"""Admin views that stay usable with millions of consumers.
+
+The changelists of the larger tables:
+
+- select the related objects their rows display, so a page is one query;
+- use raw id or autocomplete widgets in place of unbounded dropdowns;
+- only search with lookups that can use an index, see IndexedSearchMixin;
+- estimate the number of rows of an unfiltered table, rather than counting
+  them, see EstimatedCountPaginator.
+"""
+
+from collections import Counter
+import functools
+import operator
+import uuid
+
 from django.contrib import admin
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils.functional import cached_property
 
-from coral_credits.api import models
+from coral_credits.api import history, models
 
 # Admin views are decorated with @csrf_protect so
 # CSRF protection is enabled even without a middleware.
 
-# Register your models here.
-admin.site.register(models.CreditAccount)
-admin.site.register(models.CreditAllocation)
-admin.site.register(models.CreditAllocationResource)
-admin.site.register(models.Consumer)
-admin.site.register(models.ResourceClass)
-admin.site.register(models.ResourceConsumptionRecord)
-admin.site.register(models.ResourceProvider)
-admin.site.register(models.ResourceProviderAccount)
+# Unfiltered tables with fewer rows than this are counted exactly
+ESTIMATED_COUNT_THRESHOLD = 100000
+
+
+def estimated_row_count(model, using):
+    """Returns the planner's estimate of the rows in a table, or None."""
+    connection = connections[using]
+    if connection.vendor != "postgresql":
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+            [model._meta.db_table],
+        )
+        row = cursor.fetchone()
+    # Tables that have never been analysed are estimated at -1
+    return row[0] if row and row[0] >= 0 else None
+
+
+class EstimatedCountPaginator(Paginator):
+    """Estimates the count of a large, unfiltered table.
+
+    Counting every row of a table with millions of rows takes seconds on
+    PostgreSQL, while the planner's estimate is free and close enough to
+    page through. Filtered changelists are still counted exactly.
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = estimated_row_count(queryset.model, queryset.db)
+            if estimate is not None and estimate >= ESTIMATED_COUNT_THRESHOLD:
+                return estimate
+        return super().count
+
+
+class IndexedSearchMixin:
+    """Searches only with lookups that can use an index.
+
+    A search term that is a UUID is matched exactly against
+    uuid_search_fields, and any other term is matched as a case sensitive
+    prefix of prefix_search_fields.
+    """
+
+    uuid_search_fields = ()
+    prefix_search_fields = ()
+
+    def get_search_fields(self, request):
+        return self.uuid_search_fields + self.prefix_search_fields
+
+    def get_search_results(self, request, queryset, search_term):
+        search_term = search_term.strip()
+        if not search_term:
+            return queryset, False
+        try:
+            value = uuid.UUID(search_term)
+            lookups = [f"{field}__exact" for field in self.uuid_search_fields]
+        except ValueError:
+            value = search_term
+            lookups = [f"{field}__startswith" for field in self.prefix_search_fields]
+        if not lookups:
+            return queryset.none(), False
+        query = functools.reduce(
+            operator.or_, (Q(**{lookup: value}) for lookup in lookups)
+        )
+        return queryset.filter(query), False
+
+
+class LargeTableAdmin(IndexedSearchMixin, admin.ModelAdmin):
+    paginator = EstimatedCountPaginator
+    # Don't count the whole table as well as the filtered results
+    show_full_result_count = False
+    list_per_page = 50
+    # Avoid sorting on the joined columns of the default model ordering
+    ordering = ("-pk",)
+
+
+@admin.register(models.ResourceClass)
+class ResourceClassAdmin(admin.ModelAdmin):
+    list_display = ("name", "created")
+    search_fields = ("name",)
+
+
+@admin.register(models.ResourceProvider)
+class ResourceProviderAdmin(admin.ModelAdmin):
+    list_display = ("name", "email", "created")
+    search_fields = ("name",)
+
+
+@admin.register(models.CreditAccount)
+class CreditAccountAdmin(admin.ModelAdmin):
+    list_display = ("name", "email", "created")
+    search_fields = ("name",)
+
+
+@admin.register(models.ResourceProviderAccount)
+class ResourceProviderAccountAdmin(LargeTableAdmin):
+    list_display = ("project_id", "account", "provider")
+    list_select_related = ("account", "provider")
+    autocomplete_fields = ("account", "provider")
+    uuid_search_fields = ("project_id",)
+    prefix_search_fields = ("account__name",)
+
+
+@admin.register(models.CreditAllocation)
+class CreditAllocationAdmin(LargeTableAdmin):
+    list_display = ("name", "account", "start", "end")
+    list_select_related = ("account",)
+    autocomplete_fields = ("account",)
+    prefix_search_fields = ("name", "account__name")
+    date_hierarchy = "start"
+
+
+@admin.register(models.CreditAllocationResource)
+class CreditAllocationResourceAdmin(LargeTableAdmin):
+    list_display = (
+        "allocation",
+        "resource_class",
+        "resource_hours",
+        "allocated_resource_hours",
+    )
+    list_select_related = ("allocation__account", "resource_class")
+    list_filter = ("resource_class",)
+    raw_id_fields = ("allocation",)
+    prefix_search_fields = ("allocation__name", "allocation__account__name")
+
+    def save_model(self, request, obj, form, change):
+        # Deletions are recorded by a signal, but saves are recorded by the
+        # code making them, as only it knows the previous resource hours
+        changes = {}
+        if change:
+            previous = models.CreditAllocationResource.objects.select_related(
+                "allocation"
+            ).get(pk=obj.pk)
+            changes.setdefault(previous.allocation.account_id, Counter())[
+                previous.resource_class_id
+            ] -= previous.resource_hours
+        super().save_model(request, obj, form, change)
+        changes.setdefault(obj.allocation.account_id, Counter())[
+            obj.resource_class_id
+        ] += obj.resource_hours
+        for account_id, account_changes in changes.items():
+            history.record(
+                account_id, account_changes, models.CreditTransaction.ALLOCATION
+            )
+
+
+class ResourceConsumptionRecordInline(admin.TabularInline):
+    model = models.ResourceConsumptionRecord
+    extra = 0
+
+
+@admin.register(models.Consumer)
+class ConsumerAdmin(LargeTableAdmin):
+    list_display = ("consumer_ref", "consumer_uuid", "project", "start", "end")
+    # Each row is labelled with the consumer's __str__, which includes the
+    # project's account and provider
+    list_select_related = (
+        "resource_provider_account__account",
+        "resource_provider_account__provider",
+    )
+    raw_id_fields = ("resource_provider_account",)
+    uuid_search_fields = (
+        "consumer_uuid",
+        "resource_provider_account__project_id",
+    )
+    prefix_search_fields = ("consumer_ref",)
+    date_hierarchy = "end"
+    inlines = (ResourceConsumptionRecordInline,)
+
+    @admin.display(ordering="resource_provider_account__project_id")
+    def project(self, consumer):
+        account = consumer.resource_provider_account
+        return account.project_id if account else None
+
+
+@admin.register(models.ResourceConsumptionRecord)
+class ResourceConsumptionRecordAdmin(LargeTableAdmin):
+    list_display = ("consumer_ref", "consumer_uuid", "resource_class", "resource_hours")
+    list_select_related = (
+        "consumer__resource_provider_account__account",
+        "consumer__resource_provider_account__provider",
+        "resource_class",
+    )
+    list_filter = ("resource_class",)
+    raw_id_fields = ("consumer",)
+    uuid_search_fields = ("consumer__consumer_uuid",)
+    prefix_search_fields = ("consumer__consumer_ref",)
+
+    @admin.display(ordering="consumer__consumer_ref")
+    def consumer_ref(self, record):
+        return record.consumer.consumer_ref
+
+    @admin.display(ordering="consumer__consumer_uuid")
+    def consumer_uuid(self, record):
+        return record.consumer.consumer_uuid
+
+
+@admin.register(models.Flavor)
+class FlavorAdmin(admin.ModelAdmin):
+    list_display = ("flavor_id", "name")
+    search_fields = ("flavor_id", "name")
+
+
+@admin.register(models.Host)
+class HostAdmin(admin.ModelAdmin):
+    list_display = ("hypervisor_hostname",)
+    search_fields = ("hypervisor_hostname",)
+
+
+@admin.register(models.CreditTransaction)
+class CreditTransactionAdmin(LargeTableAdmin):
+    list_display = ("created", "account", "resource_class", "kind", "change", "balance")
+    list_select_related = ("account", "resource_class")
+    list_filter = ("kind", "resource_class")
+    uuid_search_fields = ("consumer_uuid",)
+    prefix_search_fields = ("account__name",)
+    date_hierarchy = "created"
+
+    # The history is append-only
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
@@ -0,0 +1,380 @@
+"""Bulk import of credit allocations from a manifest.
+
+A manifest has one row per project, as CSV, YAML or JSON. YAML and JSON
+manifests are a list of rows of the form:
+
+    - account: my-account
+      email: pi@example.com
+      provider: my-cloud
+      project_id: 20354d7a-e4fe-47af-8ff6-187bca92f3f9
+      allocation: 2026-spring
+      start: 2026-01-01T00:00:00Z
+      end: 2026-07-01T00:00:00Z
+      resources:
+        VCPU: 50000
+        MEMORY_MB: 1000000
+
+CSV manifests have the same columns, with a column per resource class in
+place of resources. Accounts and allocations are created or updated by name,
+and the provider and resource classes must already exist.
+"""
+
+import csv
+from dataclasses import dataclass
+from datetime import datetime
+import json
+from pathlib import Path
+from typing import Dict
+from uuid import UUID
+
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from coral_credits.api import db_utils, models
+
+FIELDS = ("account", "email", "provider", "project_id", "allocation", "start", "end")
+
+
+class ManifestError(Exception):
+    """Raised when a manifest is invalid"""
+
+    def __init__(self, errors):
+        super().__init__("\n".join(errors))
+        self.errors = errors
+
+
+@dataclass(frozen=True, slots=True)
+class ManifestRow:
+    row: int
+    account: str
+    email: str
+    provider: str
+    project_id: UUID
+    allocation: str
+    start: datetime
+    end: datetime
+    resources: Dict[str, int]
+
+
+def load_manifest(path):
+    """Reads and parses a manifest, raising ManifestError if it is invalid."""
+    suffix = Path(path).suffix.lower()
+    with open(path, newline="") as f:
+        if suffix == ".csv":
+            raw_rows = [
+                {
+                    **{field: row.pop(field, None) for field in FIELDS},
+                    "resources": {k: v for k, v in row.items() if v not in ("", None)},
+                }
+                for row in csv.DictReader(f)
+            ]
+        elif suffix in (".yaml", ".yml"):
+            try:
+                import yaml
+            except ImportError:
+                raise ManifestError(["PyYAML is required for YAML manifests"])
+            raw_rows = yaml.safe_load(f)
+        elif suffix == ".json":
+            raw_rows = json.load(f)
+        else:
+            raise ManifestError([f"Unsupported manifest format '{suffix}'"])
+    return parse_manifest(raw_rows)
+
+
+def parse_manifest(raw_rows):
+    """Converts raw manifest rows to ManifestRows.
+
+    Raises ManifestError describing every invalid row.
+    """
+    if not isinstance(raw_rows, list):
+        raise ManifestError(["Manifest must be a list of rows"])
+    rows = []
+    errors = []
+    for index, raw_row in enumerate(raw_rows, start=1):
+        try:
+            rows.append(_parse_row(index, raw_row))
+        except ValueError as e:
+            errors.append(f"Row {index}: {e}")
+    if errors:
+        raise ManifestError(errors)
+    return rows
+
+
+def _parse_datetime(value):
+    if not isinstance(value, datetime):
+        value = parse_datetime(str(value))
+        if value is None:
+            raise ValueError("invalid datetime")
+    if timezone.is_naive(value):
+        value = timezone.make_aware(value)
+    return value
+
+
+def _parse_row(index, raw_row):
+    if not isinstance(raw_row, dict):
+        raise ValueError("expected a mapping")
+    missing = [field for field in FIELDS if raw_row.get(field) in ("", None)]
+    if missing:
+        raise ValueError(f"missing {', '.join(missing)}")
+    resources = raw_row.get("resources") or {}
+    if not isinstance(resources, dict) or not resources:
+        raise ValueError("no resources given")
+
+    try:
+        project_id = UUID(str(raw_row["project_id"]))
+    except ValueError:
+        raise ValueError(f"invalid project_id '{raw_row['project_id']}'")
+    try:
+        start = _parse_datetime(raw_row["start"])
+        end = _parse_datetime(raw_row["end"])
+    except ValueError:
+        raise ValueError(f"invalid start or end '{raw_row['start']}/{raw_row['end']}'")
+    if start >= end:
+        raise ValueError("start must be before end")
+
+    resource_hours = {}
+    for resource_class, hours in resources.items():
+        try:
+            resource_hours[resource_class] = int(hours)
+        except (TypeError, ValueError):
+            raise ValueError(f"invalid hours '{hours}' for {resource_class}")
+        if resource_hours[resource_class] < 0:
+            raise ValueError(f"negative hours for {resource_class}")
+
+    return ManifestRow(
+        row=index,
+        account=str(raw_row["account"]),
+        email=str(raw_row["email"]),
+        provider=str(raw_row["provider"]),
+        project_id=project_id,
+        allocation=str(raw_row["allocation"]),
+        start=start,
+        end=end,
+        resources=resource_hours,
+    )
+
+
+def validate_manifest(rows):
+    """Checks the manifest is consistent, both with itself and the database.
+
+    Raises ManifestError describing every problem found.
+    """
+    errors = []
+    emails = {}
+    project_accounts = {}
+    provider_accounts = set()
+    allocations = {}
+    allocation_starts = {}
+    allocation_resources = {}
+    for row in rows:
+        if emails.setdefault(row.account, row.email) != row.email:
+            errors.append(f"Row {row.row}: conflicting email for {row.account}")
+        if (row.account, row.provider) in provider_accounts:
+            errors.append(
+                f"Row {row.row}: {row.account} appears twice for {row.provider}"
+            )
+        provider_accounts.add((row.account, row.provider))
+        project_account = project_accounts.setdefault(
+            (row.provider, row.project_id), row.account
+        )
+        if project_account != row.account:
+            errors.append(
+                f"Row {row.row}: project {row.project_id} is already used by "
+                f"{project_account}"
+            )
+        allocation = (row.account, row.allocation)
+        if allocations.setdefault(allocation, (row.start, row.end)) != (
+            row.start,
+            row.end,
+        ):
+            errors.append(
+                f"Row {row.row}: conflicting dates for allocation {row.allocation}"
+            )
+        if (
+            allocation_starts.setdefault((row.account, row.start), row.allocation)
+            != row.allocation
+        ):
+            errors.append(
+                f"Row {row.row}: {row.account} already has an allocation starting "
+                f"at {row.start}"
+            )
+        for resource_class, hours in row.resources.items():
+            if (
+                allocation_resources.setdefault((*allocation, resource_class), hours)
+                != hours
+            ):
+                errors.append(
+                    f"Row {row.row}: conflicting hours for {resource_class} in "
+                    f"allocation {row.allocation}"
+                )
+
+    providers = {row.provider for row in rows}
+    existing_providers = set(
+        models.ResourceProvider.objects.filter(name__in=providers).values_list(
+            "name", flat=True
+        )
+    )
+    for provider in sorted(providers - existing_providers):
+        errors.append(f"Resource provider '{provider}' does not exist")
+
+    resource_classes = {rc for row in rows for rc in row.resources}
+    existing_resource_classes = set(
+        models.ResourceClass.objects.filter(name__in=resource_classes).values_list(
+            "name", flat=True
+        )
+    )
+    for resource_class in sorted(resource_classes - existing_resource_classes):
+        errors.append(f"Resource class '{resource_class}' does not exist")
+
+    # Projects already used by other accounts
+    for provider, project_id, account in models.ResourceProviderAccount.objects.filter(
+        project_id__in={row.project_id for row in rows}
+    ).values_list("provider__name", "project_id", "account__name"):
+        manifest_account = project_accounts.get((provider, project_id))
+        if manifest_account is not None and manifest_account != account:
+            errors.append(
+                f"Project {project_id} in {provider} belongs to account {account}"
+            )
+
+    accounts = list(emails)
+    for account, name, start in models.CreditAllocation.objects.filter(
+        account__name__in=accounts
+    ).values_list("account__name", "name", "start"):
+        other = allocation_starts.get((account, start))
+        if other is not None and other != name:
+            errors.append(
+                f"Allocation {other} for {account} starts at the same time as "
+                f"existing allocation {name}"
+            )
+
+    # Resources can't be set to fewer hours than have been consumed
+    for (
+        account,
+        allocation,
+        resource_class,
+        resource_hours,
+        allocated_resource_hours,
+    ) in models.CreditAllocationResource.objects.filter(
+        allocation__account__name__in=accounts
+    ).values_list(
+        "allocation__account__name",
+        "allocation__name",
+        "resource_class__name",
+        "resource_hours",
+        "allocated_resource_hours",
+    ):
+        hours = allocation_resources.get((account, allocation, resource_class))
+        if hours is not None and hours < allocated_resource_hours - resource_hours:
+            errors.append(
+                f"Cannot set {resource_class} in allocation {allocation} for "
+                f"{account} to fewer hours than currently consumed"
+            )
+
+    if errors:
+        raise ManifestError(errors)
+
+
+def import_manifest(rows, chunk_size=500):
+    """Creates or updates everything in the manifest.
+
+    Rows are imported in chunks, each in its own transaction, keeping all the
+    rows for an account in the same chunk.
+    """
+    providers = dict(
+        models.ResourceProvider.objects.filter(
+            name__in={row.provider for row in rows}
+        ).values_list("name", "id")
+    )
+    resource_classes = dict(
+        models.ResourceClass.objects.filter(
+            name__in={rc for row in rows for rc in row.resources}
+        ).values_list("name", "id")
+    )
+
+    rows_by_account = {}
+    for row in rows:
+        rows_by_account.setdefault(row.account, []).append(row)
+
+    chunk = []
+    for account_rows in rows_by_account.values():
+        chunk.extend(account_rows)
+        if len(chunk) >= chunk_size:
+            _import_chunk(chunk, providers, resource_classes)
+            chunk = []
+    if chunk:
+        _import_chunk(chunk, providers, resource_classes)
+
+
+@transaction.atomic
+def _import_chunk(rows, providers, resource_classes):
+    emails = {row.account: row.email for row in rows}
+    models.CreditAccount.objects.bulk_create(
+        [
+            models.CreditAccount(name=name, email=email)
+            for name, email in emails.items()
+        ],
+        update_conflicts=True,
+        unique_fields=["name"],
+        update_fields=["email"],
+    )
+    account_ids = dict(
+        models.CreditAccount.objects.filter(name__in=emails).values_list("name", "id")
+    )
+
+    models.ResourceProviderAccount.objects.bulk_create(
+        [
+            models.ResourceProviderAccount(
+                account_id=account_ids[row.account],
+                provider_id=providers[row.provider],
+                project_id=row.project_id,
+            )
+            for row in rows
+        ],
+        update_conflicts=True,
+        unique_fields=["account", "provider"],
+        update_fields=["project_id"],
+    )
+
+    allocations = {(row.account, row.allocation): row for row in rows}
+    models.CreditAllocation.objects.bulk_create(
+        [
+            models.CreditAllocation(
+                name=name,
+                account_id=account_ids[account],
+                start=row.start,
+                end=row.end,
+            )
+            for (account, name), row in allocations.items()
+        ],
+        update_conflicts=True,
+        unique_fields=["name", "account"],
+        update_fields=["start", "end"],
+    )
+    account_names = {account_id: name for name, account_id in account_ids.items()}
+    allocation_ids = {
+        (account_names[account_id], name): allocation_id
+        for account_id, name, allocation_id in models.CreditAllocation.objects.filter(
+            account_id__in=account_ids.values()
+        ).values_list("account_id", "name", "id")
+    }
+
+    resource_hours = {
+        (
+            allocation_ids[(row.account, row.allocation)],
+            resource_classes[resource_class],
+        ): hours
+        for row in rows
+        for resource_class, hours in row.resources.items()
+    }
+    _, errors = db_utils.set_credit_allocation_resources(resource_hours)
+    if errors:
+        # Consumption changed since the manifest was validated
+        raise ManifestError(sorted(set(errors.values())))
+
+    db_utils.bump_versions(
+        *(
+            db_utils.account_version_key(account_id)
+            for account_id in account_ids.values()
+        )
+    )
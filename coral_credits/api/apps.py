@@ -1,5 +1,3 @@
-import os
-
 from django.apps import AppConfig
 
 
@@ -8,12 +6,4 @@ class ApiConfig(AppConfig):
     name = "coral_credits.api"
 
     def ready(self):
-        if os.environ.get("REGISTER_PROM_COLLECTOR") == "true":
-            return
-        else:
-            if os.environ.get("RUN_PROM") == "true":
-                from coral_credits.prom_exporter import CustomCollector
-                from prometheus_client.core import REGISTRY
-
-                REGISTRY.register(CustomCollector())
-                os.environ["REGISTER_PROM_COLLECTOR"] = "true"
+        from coral_credits.api import signals  # noqa: F401
@@ -0,0 +1,142 @@
+"""Archival of consumers that ended before a retention horizon.
+
+Consumers and their consumption records are moved into the archive tables in
+batches, keeping the hot tables small. The archived resource hours are added
+to per-account totals, so account summaries are unchanged by archival.
+"""
+
+from collections import Counter
+import logging
+
+from auditlog.context import disable_auditlog
+from django.db import transaction
+from django.db.models import F
+
+from coral_credits.api import db_utils, models, signals
+
+LOG = logging.getLogger(__name__)
+
+
+def archive_consumers(ended_before, batch_size=1000):
+    """Archives all consumers that ended before the given time.
+
+    Returns the number of consumers archived.
+    """
+    archived = 0
+    while True:
+        count = archive_consumer_batch(ended_before, batch_size)
+        if not count:
+            return archived
+        archived += count
+        LOG.info(f"Archived {archived} consumers that ended before {ended_before}.")
+
+
+@transaction.atomic
+def archive_consumer_batch(ended_before, batch_size):
+    """Archives up to batch_size consumers that ended before the given time.
+
+    Returns the number of consumers archived.
+    """
+    consumers = list(
+        models.Consumer.objects.select_for_update(of=("self",))
+        .filter(end__lt=ended_before)
+        .annotate(account_id=F("resource_provider_account__account_id"))
+        .prefetch_related("resources")
+        .order_by("pk")[:batch_size]
+    )
+    if not consumers:
+        return 0
+
+    archived_consumers = models.ArchivedConsumer.objects.bulk_create(
+        [
+            models.ArchivedConsumer(
+                consumer_ref=consumer.consumer_ref,
+                consumer_uuid=consumer.consumer_uuid,
+                resource_provider_account_id=consumer.resource_provider_account_id,
+                user_ref=consumer.user_ref,
+                created=consumer.created,
+                start=consumer.start,
+                end=consumer.end,
+            )
+            for consumer in consumers
+        ]
+    )
+
+    records = []
+    totals = Counter()
+    for consumer, archived_consumer in zip(consumers, archived_consumers):
+        for record in consumer.resources.all():
+            records.append(
+                models.ArchivedResourceConsumptionRecord(
+                    consumer=archived_consumer,
+                    resource_class_id=record.resource_class_id,
+                    resource_hours=record.resource_hours,
+                )
+            )
+            if consumer.account_id is not None:
+                totals[
+                    (consumer.account_id, record.resource_class_id)
+                ] += record.resource_hours
+    models.ArchivedResourceConsumptionRecord.objects.bulk_create(records)
+    _add_archived_resource_hours(totals)
+
+    # Archival is not a change in what was consumed, so it isn't audited.
+    with disable_auditlog(), signals.disable_version_bumps():
+        models.Consumer.objects.filter(
+            pk__in=[consumer.pk for consumer in consumers]
+        ).delete()
+
+    db_utils.bump_versions(
+        *{
+            db_utils.account_version_key(consumer.account_id)
+            for consumer in consumers
+            if consumer.account_id is not None
+        }
+    )
+    return len(consumers)
+
+
+def _add_archived_resource_hours(totals):
+    """Adds to the archived resource hours for each (account, resource class)."""
+    if not totals:
+        return
+    account_ids = {account_id for account_id, _ in totals}
+    resource_class_ids = {resource_class_id for _, resource_class_id in totals}
+    existing = {
+        (total.account_id, total.resource_class_id): total
+        for total in models.ArchivedResourceHours.objects.select_for_update().filter(
+            account_id__in=account_ids, resource_class_id__in=resource_class_ids
+        )
+    }
+
+    updated = []
+    created = []
+    for (account_id, resource_class_id), resource_hours in totals.items():
+        total = existing.get((account_id, resource_class_id))
+        if total:
+            total.resource_hours += resource_hours
+            updated.append(total)
+        else:
+            created.append(
+                models.ArchivedResourceHours(
+                    account_id=account_id,
+                    resource_class_id=resource_class_id,
+                    resource_hours=resource_hours,
+                )
+            )
+    models.ArchivedResourceHours.objects.bulk_update(updated, ["resource_hours"])
+    models.ArchivedResourceHours.objects.bulk_create(created)
+
+
+def get_archived_resource_hours(account_pk):
+    """Returns a dictionary of the form:
+
+    {
+        "resource_class_name": "resource_hours"
+    }
+    """
+    return dict(
+        models.ArchivedResourceHours.objects.filter(account__pk=account_pk).values_list(
+            "resource_class__name", "resource_hours"
+        )
+    )
@@ -1,36 +1,36 @@
 from dataclasses import dataclass, field
 from datetime import datetime
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, Optional, Tuple
 from uuid import UUID
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Context:
     user_id: UUID
     project_id: UUID
     auth_url: str
-    region_name: str
+    region_name: Optional[str] = None
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class ResourceRequest:
     resources: Dict[str, Any]
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Allocation:
     id: str
     hypervisor_hostname: UUID
-    extra: Dict[str, Any]
+    extra: Dict[str, Any] = field(default_factory=dict)
 
 
-@dataclass(kw_only=True)
+@dataclass(frozen=True, slots=True, kw_only=True)
 class BaseReservation:
     resource_type: str
-    allocations: List[Allocation] = field(default_factory=list)
+    allocations: Tuple[Allocation, ...] = ()
 
 
-@dataclass(kw_only=True)
+@dataclass(frozen=True, slots=True, kw_only=True)
 class PhysicalReservation(BaseReservation):
     min: int
     max: int
@@ -38,14 +38,14 @@ class PhysicalReservation(BaseReservation):
     resource_properties: Optional[str] = None
 
 
-@dataclass(kw_only=True)
+@dataclass(frozen=True, slots=True, kw_only=True)
 class FlavorReservation(BaseReservation):
     amount: int
     flavor_id: str
     affinity: Optional[str] = None
 
 
-@dataclass(kw_only=True)
+@dataclass(frozen=True, slots=True, kw_only=True)
 class VirtualReservation(BaseReservation):
     amount: int
     vcpus: int
@@ -55,22 +55,23 @@ class VirtualReservation(BaseReservation):
     resource_properties: Optional[str] = None
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Lease:
     id: UUID
     name: str
     start_date: datetime
     end_date: datetime
-    reservations: List[BaseReservation]
-    resource_requests: ResourceRequest
+    reservations: Tuple[BaseReservation, ...]
+    # Priced from the reservations when not given
+    resource_requests: Optional[ResourceRequest] = None
 
     @property
     def duration(self):
         return (self.end_date - self.start_date).total_seconds() / 3600
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class ConsumerRequest:
     context: Context
     lease: Lease
-    current_lease: Lease = None
+    current_lease: Optional[Lease] = None
@@ -0,0 +1,130 @@
+"""Timelines of the capacity committed to consumers.
+
+Each consumption record commits resource_hours of a resource class, spread
+evenly over its consumer's window, i.e. resource_hours / duration units of
+the resource at a time. A timeline is built from a single query of the
+records whose consumers overlap the range, totalled by window, by sorting
+the start and end of each window into one list of events and sweeping
+through it in order.
+
+Each series keeps its current rate and the time it last changed, so time is
+only split into buckets when the rate of that series changes, or the sweep
+ends. That makes building a timeline O(n log n) in the number of records,
+plus the number of buckets in each series.
+"""
+
+from dataclasses import dataclass
+import math
+
+from django.db.models import Sum
+
+from coral_credits.api import models
+from coral_credits.api.rollups import PERIODS, period_start
+
+HOUR = 3600
+
+
+@dataclass(slots=True)
+class _Series:
+    first: object
+    length: object
+    hours: list
+    peak: list
+    # Units of the resource committed since the time of the last event
+    rate: float = 0
+    since: object = None
+
+    def advance(self, until):
+        """Adds the hours committed between the last event and until."""
+        since = self.since
+        while since < until:
+            index = (since - self.first) // self.length
+            boundary = min(until, self.first + (index + 1) * self.length)
+            self.hours[index] += self.rate * (boundary - since).total_seconds() / HOUR
+            self.peak[index] = max(self.peak[index], self.rate)
+            since = boundary
+        self.since = until
+
+
+def timeline(start, end, period, **filters):
+    """Returns the resource hours committed in each period between start and end.
+
+    Returns a list of dictionaries of the form:
+
+    {
+        "provider": "...",
+        "resource_class": "...",
+        "buckets": [{"start": ..., "committed_hours": ..., "peak": ...}]
+    }
+
+    with one for each provider and resource class, where peak is the most
+    units of the resource committed at once during the bucket. The records
+    are filtered by the given lookups.
+    """
+    length = PERIODS[period]
+    first = period_start(start, period)
+    bucket_count = math.ceil((end - first) / length)
+    last = first + bucket_count * length
+
+    records = (
+        models.ResourceConsumptionRecord.objects.filter(
+            consumer__resource_provider_account__isnull=False,
+            consumer__start__lt=last,
+            consumer__end__gt=first,
+            **filters,
+        )
+        .values_list(
+            "consumer__start",
+            "consumer__end",
+            "consumer__resource_provider_account__provider__name",
+            "resource_class__name",
+        )
+        # Records with the same window commit their hours at the same rate
+        .annotate(Sum("resource_hours"))
+        .order_by("consumer__start")
+    )
+
+    events = []
+    for consumer_start, consumer_end, provider, resource_class, hours in records:
+        duration = (consumer_end - consumer_start).total_seconds() / HOUR
+        if duration <= 0:
+            continue
+        rate = hours / duration
+        key = (provider, resource_class)
+        events.append((max(consumer_start, first), rate, key))
+        events.append((min(consumer_end, last), -rate, key))
+    # The starts come from the query in order, so this mostly merges the ends
+    events.sort(key=lambda event: event[0])
+
+    series = {}
+    for when, change, key in events:
+        state = series.get(key)
+        if state is None:
+            state = series[key] = _Series(
+                first=first,
+                length=length,
+                hours=[0.0] * bucket_count,
+                peak=[0.0] * bucket_count,
+                since=first,
+            )
+        state.advance(when)
+        state.rate += change
+
+    results = []
+    for (provider, resource_class), state in sorted(series.items()):
+        state.advance(last)
+        results.append(
+            {
+                "provider": provider,
+                "resource_class": resource_class,
+                "buckets": [
+                    {
+                        "start": first + index * length,
+                        "committed_hours": round(state.hours[index], 6),
+                        "peak": round(state.peak[index], 6),
+                    }
+                    for index in range(bucket_count)
+                ],
+            }
+        )
+    return results
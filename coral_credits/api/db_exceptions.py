@@ -26,3 +26,9 @@ class ActiveConsumersInAllocation(Exception):
     """Raised when trying to delete an allocation with active consumers"""
 
     pass
+
+
+class PricingError(ResourceRequestFormatError):
+    """Raised when the reservations of a lease can't be priced"""
+
+    pass
@@ -1,23 +1,52 @@
+from collections import Counter, defaultdict
 import logging
 import math
-import uuid
 
+from django.db.models import (
+    ExpressionWrapper,
+    F,
+    FloatField,
+    Func,
+    Q,
+    Sum,
+    Value,
+    Window,
+)
+from django.db.models.functions import Greatest, RowNumber
+from django.http import Http404
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
 
-from coral_credits.api import db_exceptions, models
+from coral_credits import tracing
+from coral_credits.api import db_exceptions, history, models
 
 LOG = logging.getLogger(__name__)
 
+RESOURCE_CLASS_VERSION = "resource_class"
+RESOURCE_PROVIDER_VERSION = "resource_provider"
 
+
+@tracing.traced
 def get_current_lease(current_lease_required, context, current_lease):
+    """Returns the consumer for the current lease and its consumption records.
+
+    The records are returned as a dictionary of the form:
+
+    {
+        "resource_class": "resource_consumption_record"
+    }
+    """
     if current_lease_required:
         current_consumer = get_object_or_404(
-            models.Consumer, consumer_uuid=current_lease.id
-        )
-        current_resource_requests = models.ResourceConsumptionRecord.objects.filter(
-            consumer=current_consumer
+            models.Consumer.objects.select_for_update(),
+            consumer_uuid=current_lease.id,
         )
+        current_resource_requests = {
+            record.resource_class: record
+            for record in models.ResourceConsumptionRecord.objects.filter(
+                consumer=current_consumer
+            ).select_related("resource_class")
+        }
         LOG.info(
             f"User {context.user_id} requested an update to lease "
             f"{current_lease.id}."
@@ -31,6 +60,7 @@ def get_current_lease(current_lease_required, context, current_lease):
     return current_consumer, current_resource_requests
 
 
+@tracing.traced
 def get_resource_provider_account(project_id):
     resource_provider_account = models.ResourceProviderAccount.objects.get(
         project_id=project_id
@@ -70,6 +100,208 @@ def get_all_active_reservations(resource_provider_account):
     return resources
 
 
+class EpochSeconds(Func):
+    """Seconds since the Unix epoch of a datetime, worked out by the database."""
+
+    output_field = FloatField()
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return self.as_sql(
+            compiler,
+            connection,
+            template="((julianday(%(expressions)s) - 2440587.5) * 86400.0)",
+            **extra_context,
+        )
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        return self.as_sql(
+            compiler,
+            connection,
+            template="EXTRACT(EPOCH FROM %(expressions)s)::double precision",
+            **extra_context,
+        )
+
+
+def get_consumed_resource_hours(account_pk):
+    """Returns the hours reserved by the consumers of an account.
+
+    Returns a dictionary of the form:
+
+    {
+        "resource_class_name": "resource_hours"
+    }
+    """
+    return dict(
+        models.ResourceConsumptionRecord.objects.filter(
+            consumer__resource_provider_account__account__pk=account_pk
+        )
+        .order_by()
+        .values_list("resource_class__name")
+        .annotate(Sum("resource_hours"))
+    )
+
+
+def get_account_balances(account_ids, project_ids, now):
+    """Returns the balances of many accounts, in a constant number of queries.
+
+    Accounts are given by id, or by the id of any of their projects, and
+    returned in order of id as a list of the form:
+
+    [
+        {
+            "id": "account_id",
+            "name": "account_name",
+            "project_ids": ["project_id"],
+            "resources": {
+                "resource_class_name": {
+                    "allocated": "allocated_resource_hours",
+                    "remaining": "resource_hours",
+                    "reserved": "resource_hours",
+                }
+            },
+        }
+    ]
+
+    where remaining is the hours left in the account's allocations, from
+    which consumers have already been charged, and reserved is the hours of
+    the consumers that haven't ended by now.
+    """
+    accounts = {
+        account["id"]: dict(account, project_ids=[], resources={})
+        for account in models.CreditAccount.objects.filter(
+            Q(pk__in=account_ids)
+            | Q(resourceprovideraccount__project_id__in=project_ids)
+        )
+        .distinct()
+        .order_by("pk")
+        .values("id", "name")
+    }
+
+    def resources(account_id, resource_class):
+        return accounts[account_id]["resources"].setdefault(
+            resource_class, {"allocated": 0, "remaining": 0, "reserved": 0}
+        )
+
+    for account_id, project_id in models.ResourceProviderAccount.objects.filter(
+        account_id__in=accounts
+    ).values_list("account_id", "project_id"):
+        accounts[account_id]["project_ids"].append(project_id)
+    for account_id, resource_class, allocated, remaining in (
+        models.CreditAllocationResource.objects.filter(
+            allocation__account_id__in=accounts
+        )
+        .order_by()
+        .values_list("allocation__account_id", "resource_class__name")
+        .annotate(Sum("allocated_resource_hours"), Sum("resource_hours"))
+    ):
+        balance = resources(account_id, resource_class)
+        balance["allocated"] = allocated
+        balance["remaining"] = remaining
+    for account_id, resource_class, reserved in (
+        models.ResourceConsumptionRecord.objects.filter(
+            consumer__resource_provider_account__account_id__in=accounts,
+            consumer__end__gt=now,
+        )
+        .order_by()
+        .values_list(
+            "consumer__resource_provider_account__account_id", "resource_class__name"
+        )
+        .annotate(Sum("resource_hours"))
+    ):
+        resources(account_id, resource_class)["reserved"] = reserved
+    return list(accounts.values())
+
+
+def get_reclaimable_resource_hours(now):
+    """Get the unused resource hours of all active consumers.
+
+    These are the hours that would be refunded if every active consumer ended
+    now. The unused share of each consumption record is summed by the
+    database, so a single query returns one row per project and resource class.
+
+    Returns a dictionary of the form:
+    {
+        ("project_id", "resource_class", "provider"): resource_hours
+    }
+    """
+    start = EpochSeconds(F("consumer__start"))
+    end = EpochSeconds(F("consumer__end"))
+    unused_share = ExpressionWrapper(
+        (end - Greatest(start, Value(now.timestamp()))) / (end - start),
+        output_field=FloatField(),
+    )
+    reclaimable = (
+        models.ResourceConsumptionRecord.objects.filter(
+            consumer__end__gt=now,
+            consumer__start__lt=F("consumer__end"),
+            consumer__resource_provider_account__isnull=False,
+        )
+        .values_list(
+            "consumer__resource_provider_account__project_id",
+            "resource_class__name",
+            "consumer__resource_provider_account__provider__name",
+        )
+        .annotate(resource_hours=Sum(F("resource_hours") * unused_share))
+        .order_by()
+    )
+    return {
+        (str(project_id), resource_class, provider): resource_hours
+        for project_id, resource_class, provider, resource_hours in reclaimable
+    }
+
+
+def get_largest_active_consumers(now, top_n):
+    """Get the consumers reserving the most hours in each project.
+
+    For each project and resource class, the top_n active consumption records
+    with the most resource hours are returned, each with the total over all the
+    active records for that project and resource class. The ranking is done by
+    the database, with window functions, in a single query.
+
+    Returns a list of tuples of the form:
+    [
+        (
+            "lease_id", "user_id", "project_id", "resource_class", "provider",
+            resource_hours, total_resource_hours
+        ),
+        ...
+    ]
+    """
+    partition = [
+        F("consumer__resource_provider_account"),
+        F("resource_class"),
+    ]
+    records = (
+        models.ResourceConsumptionRecord.objects.filter(
+            consumer__end__gt=now,
+            consumer__resource_provider_account__isnull=False,
+        )
+        .annotate(
+            rank=Window(
+                RowNumber(),
+                partition_by=partition,
+                order_by=[F("resource_hours").desc(), F("consumer_id")],
+            ),
+            total_resource_hours=Window(Sum("resource_hours"), partition_by=partition),
+        )
+        .filter(rank__lte=top_n)
+        .values_list(
+            "consumer__consumer_uuid",
+            "consumer__user_ref",
+            "consumer__resource_provider_account__project_id",
+            "resource_class__name",
+            "consumer__resource_provider_account__provider__name",
+            "resource_hours",
+            "total_resource_hours",
+        )
+        .order_by()
+    )
+    return [
+        (str(lease_id), str(user_id), str(project_id), *rest)
+        for lease_id, user_id, project_id, *rest in records
+    ]
+
+
 def get_credit_allocation(id):
 
     credit_allocation = models.CreditAllocation.objects.filter(id=id).first()
@@ -79,6 +311,7 @@ def get_credit_allocation(id):
     return credit_allocation
 
 
+@tracing.traced
 def get_all_credit_allocations(resource_provider_account):
     # Find all associated active CreditAllocations
     # Make sure we only look for CreditAllocations valid for the current time
@@ -119,14 +352,16 @@ def get_all_credit_allocation_resources(credit_allocations):
     }
     """
     resource_allocations = {}
-    for credit_allocation in credit_allocations:
-        credit_allocation_resources = models.CreditAllocationResource.objects.filter(
-            allocation=credit_allocation
+    # TODO(tylerchristie): I think this breaks for the case where we have
+    # multiple credit allocations for the same resource_class.
+    for car in (
+        models.CreditAllocationResource.objects.filter(
+            allocation__in=credit_allocations
         )
-        # TODO(tylerchristie): I think this breaks for the case where we have
-        # multiple credit allocations for the same resource_class.
-        for car in credit_allocation_resources:
-            resource_allocations[car.resource_class] = car
+        .select_related("resource_class")
+        .order_by("allocation_id", "pk")
+    ):
+        resource_allocations[car.resource_class] = car
 
     return resource_allocations
 
@@ -141,6 +376,28 @@ def get_resource_class(resource_class_name):
     return resource_class
 
 
+def get_resource_classes(resource_class_names):
+    """Resolves resource class names with a single query.
+
+    Returns a dictionary of the form:
+
+    {
+        "resource_class_name": "resource_class"
+    }
+    """
+    resource_class_names = set(resource_class_names)
+    resource_classes = {
+        resource_class.name: resource_class
+        for resource_class in models.ResourceClass.objects.filter(
+            name__in=resource_class_names
+        )
+    }
+    missing = resource_class_names - resource_classes.keys()
+    if missing:
+        raise Http404(f"No ResourceClass matches the given query: {sorted(missing)}")
+    return resource_classes
+
+
 def get_valid_allocations(resources):
     """Validates a dictionary of resource allocations.
 
@@ -152,10 +409,20 @@ def get_valid_allocations(resources):
         ...
     ]
     """
+    resource_classes = {
+        resource_class.name: resource_class
+        for resource_class in models.ResourceClass.objects.filter(
+            name__in=resources.keys()
+        )
+    }
     try:
         allocations = {}
         for resource_class_name, resource_hours in resources.items():
-            resource_class = get_resource_class(resource_class_name)
+            resource_class = resource_classes.get(resource_class_name)
+            if resource_class is None:
+                raise db_exceptions.NoResourceClass(
+                    f"Resource class '{resource_class_name}' does not exist."
+                )
             allocations[resource_class] = float(resource_hours)
     except ValueError:
         raise db_exceptions.ResourceRequestFormatError(
@@ -164,6 +431,7 @@ def get_valid_allocations(resources):
     return allocations
 
 
+@tracing.traced
 def get_resource_requests(lease, current_resource_requests=None):
     """Returns a dictionary of the form:
 
@@ -172,11 +440,12 @@ def get_resource_requests(lease, current_resource_requests=None):
     }
     """
     resource_requests = {}
+    resource_classes = get_resource_classes(lease.resource_requests.resources.keys())
     for (
         resource_type,
         amount,
     ) in lease.resource_requests.resources.items():
-        resource_class = get_object_or_404(models.ResourceClass, name=resource_type)
+        resource_class = resource_classes[resource_type]
         try:
             requested_resource_hours = float(amount) * lease.duration
             LOG.info(
@@ -217,15 +486,14 @@ def calculate_delta_resource_hours(
     requested_resource_hours, current_resource_requests, resource_class
 ):
     # Case: user requests the same resource
-    current_resource_request = current_resource_requests.filter(
-        resource_class=resource_class
-    ).first()
+    current_resource_request = current_resource_requests.get(resource_class)
     if current_resource_request:
         return requested_resource_hours - current_resource_request.resource_hours
     # Case: user requests a new resource
     return requested_resource_hours
 
 
+@tracing.traced
 def check_credit_allocations(resource_requests, credit_allocations):
     """Subtracts resources requested from credit allocations.
 
@@ -233,7 +501,7 @@ def check_credit_allocations(resource_requests, credit_allocations):
     """
 
     result = {}
-    for resource_class in credit_allocations:
+    for resource_class in resource_requests:
         result[resource_class] = (
             credit_allocations[resource_class].resource_hours
             - resource_requests[resource_class]
@@ -249,6 +517,7 @@ def check_credit_allocations(resource_requests, credit_allocations):
     return result
 
 
+@tracing.traced
 def check_credit_balance(credit_allocations, resource_requests):
     # TODO(tylerchristie) Fresh DB query
     credit_allocation_resources = get_credit_allocation_resources(
@@ -267,6 +536,7 @@ def check_credit_balance(credit_allocations, resource_requests):
             )
 
 
+@tracing.traced
 def spend_credits(
     lease,
     resource_provider_account,
@@ -276,47 +546,108 @@ def spend_credits(
     current_consumer,
     current_resource_requests,
 ):
-    # We use a temporary UUID to avoid integrity errors
-    # Whilst we create the new ResourceConsumptionRecords.
-    consumer = models.Consumer.objects.create(
-        consumer_ref=lease.name,
-        consumer_uuid=uuid.uuid4(),
-        resource_provider_account=resource_provider_account,
-        user_ref=context.user_id,
-        start=lease.start_date,
-        end=lease.end_date,
-    )
+    """Records the consumer and subtracts its resource hours from the allocations.
 
-    for resource_class in resource_requests:
-        if current_resource_requests:
-            current_resource_hours = (
-                current_resource_requests.filter(resource_class=resource_class)
-                .first()
-                .resource_hours
-            )
-        else:
-            current_resource_hours = 0
-
-        models.ResourceConsumptionRecord.objects.create(
-            consumer=consumer,
-            resource_class=resource_class,
-            resource_hours=current_resource_hours + resource_requests[resource_class],
+    For an update the existing consumer and its consumption records are modified
+    in place, with resource_requests holding the delta for each resource class.
+    """
+    if current_consumer:
+        consumer = current_consumer
+        consumer.consumer_ref = lease.name
+        consumer.consumer_uuid = lease.id
+        consumer.resource_provider_account = resource_provider_account
+        consumer.user_ref = context.user_id
+        consumer.start = lease.start_date
+        consumer.end = lease.end_date
+        consumer.save(
+            update_fields=[
+                "consumer_ref",
+                "consumer_uuid",
+                "resource_provider_account",
+                "user_ref",
+                "start",
+                "end",
+                "modified",
+            ]
         )
+    else:
+        consumer = models.Consumer.objects.create(
+            consumer_ref=lease.name,
+            consumer_uuid=lease.id,
+            resource_provider_account=resource_provider_account,
+            user_ref=context.user_id,
+            start=lease.start_date,
+            end=lease.end_date,
+        )
+    current_resource_requests = current_resource_requests or {}
+    balances = {
+        resource_class: car.resource_hours
+        for resource_class, car in credit_allocations.items()
+    }
+
+    updated_records = []
+    new_records = []
+    for resource_class, delta_resource_hours in resource_requests.items():
+        record = current_resource_requests.get(resource_class)
+        if record:
+            record.resource_hours += delta_resource_hours
+            updated_records.append(record)
+        else:
+            new_records.append(
+                models.ResourceConsumptionRecord(
+                    consumer=consumer,
+                    resource_class=resource_class,
+                    resource_hours=delta_resource_hours,
+                )
+            )
         # Subtract expenditure from CreditAllocationResource
         # Or add, if the update delta is < 0
         credit_allocations[resource_class].resource_hours = math.ceil(
-            credit_allocations[resource_class].resource_hours
-            - resource_requests[resource_class]
+            credit_allocations[resource_class].resource_hours - delta_resource_hours
         )
-        credit_allocations[resource_class].save()
 
-    if current_consumer:
-        # We have CASCADE behaviour for ResourceConsumptionRecords
-        # Also we roll back all db transactions if the final check fails
-        current_consumer.delete()
-    # Now we set the real ID
-    consumer.consumer_uuid = lease.id
-    consumer.save()
+    # Resource classes no longer requested are refunded
+    dropped_records = [
+        record
+        for resource_class, record in current_resource_requests.items()
+        if resource_class not in resource_requests
+    ]
+    for record in dropped_records:
+        if record.resource_class in credit_allocations:
+            credit_allocations[
+                record.resource_class
+            ].resource_hours += record.resource_hours
+
+    if updated_records:
+        models.ResourceConsumptionRecord.objects.bulk_update(
+            updated_records, ["resource_hours"]
+        )
+    if new_records:
+        models.ResourceConsumptionRecord.objects.bulk_create(new_records)
+    if dropped_records:
+        models.ResourceConsumptionRecord.objects.filter(
+            pk__in=[record.pk for record in dropped_records]
+        ).delete()
+
+    changed_classes = [
+        resource_class
+        for resource_class in set(resource_requests)
+        | {record.resource_class for record in dropped_records}
+        if resource_class in credit_allocations
+    ]
+    models.CreditAllocationResource.objects.bulk_update(
+        [credit_allocations[resource_class] for resource_class in changed_classes],
+        ["resource_hours"],
+    )
+    history.record(
+        resource_provider_account.account_id,
+        {
+            resource_class.pk: credit_allocations[resource_class].resource_hours
+            - balances[resource_class]
+            for resource_class in changed_classes
+        },
+        consumer_uuid=lease.id,
+    )
 
 
 def create_credit_resource_allocations(credit_allocation, resource_allocations):
@@ -328,6 +659,7 @@ def create_credit_resource_allocations(credit_allocation, resource_allocations):
     ]
     """
     cars = []
+    changes = {}
     for resource_class, resource_hours in resource_allocations.items():
         # TODO(tyler) logging create or update?
         car, created = models.CreditAllocationResource.objects.get_or_create(
@@ -341,17 +673,136 @@ def create_credit_resource_allocations(credit_allocation, resource_allocations):
         # If exists, update:
         if not created:
             newly_allocated_resource_hours = resource_hours
-            car.resource_hours += (
-                newly_allocated_resource_hours - car.allocated_resource_hours
-            )
+            change = newly_allocated_resource_hours - car.allocated_resource_hours
+            car.resource_hours += change
             if car.resource_hours < 0:
                 raise db_exceptions.InsufficientCredits(
                     "Cannot set credits to fewer than currently consumed"
                 )
             car.allocated_resource_hours = newly_allocated_resource_hours
             car.save()
+        else:
+            change = car.resource_hours
+        changes[car.resource_class_id] = change
 
         # Refresh from db to get the updated resource_hours
         car.refresh_from_db()
         cars.append(car)
+    history.record(
+        credit_allocation.account_id, changes, models.CreditTransaction.ALLOCATION
+    )
     return cars
+
+
+def set_credit_allocation_resources(resource_hours):
+    """Sets the allocated resource hours for many credit allocations at once.
+
+    Takes a dictionary of the form:
+
+    {
+        ("allocation_id", "resource_class_id"): "resource_hours"
+    }
+
+    As with create_credit_resource_allocations, the hours already consumed are
+    kept, so resources can't be set to fewer hours than are consumed.
+
+    Returns a tuple of the new/updated CreditAllocationResources and a
+    dictionary of errors keyed in the same way. Nothing is written if there
+    are any errors.
+    """
+    allocation_ids = {allocation_id for allocation_id, _ in resource_hours}
+    existing = {
+        (car.allocation_id, car.resource_class_id): car
+        for car in models.CreditAllocationResource.objects.select_for_update().filter(
+            allocation_id__in=allocation_ids
+        )
+    }
+
+    updated = []
+    created = []
+    errors = {}
+    previous_hours = {}
+    for key, hours in resource_hours.items():
+        car = existing.get(key)
+        if car is None:
+            allocation_id, resource_class_id = key
+            created.append(
+                models.CreditAllocationResource(
+                    allocation_id=allocation_id,
+                    resource_class_id=resource_class_id,
+                    resource_hours=hours,
+                    allocated_resource_hours=hours,
+                )
+            )
+            continue
+        remaining_hours = car.resource_hours + hours - car.allocated_resource_hours
+        if remaining_hours < 0:
+            errors[key] = "Cannot set credits to fewer than currently consumed"
+            continue
+        previous_hours[car.pk] = car.resource_hours
+        car.resource_hours = remaining_hours
+        car.allocated_resource_hours = hours
+        updated.append(car)
+
+    if errors:
+        return [], errors
+
+    models.CreditAllocationResource.objects.bulk_update(
+        updated, ["resource_hours", "allocated_resource_hours"]
+    )
+    models.CreditAllocationResource.objects.bulk_create(created)
+    account_ids = dict(
+        models.CreditAllocation.objects.filter(pk__in=allocation_ids).values_list(
+            "pk", "account_id"
+        )
+    )
+    # Bulk operations don't send signals
+    bump_versions(*(account_version_key(pk) for pk in set(account_ids.values())))
+    changes = defaultdict(Counter)
+    for car in updated:
+        changes[account_ids[car.allocation_id]][car.resource_class_id] += (
+            car.resource_hours - previous_hours[car.pk]
+        )
+    for car in created:
+        changes[account_ids[car.allocation_id]][
+            car.resource_class_id
+        ] += car.resource_hours
+    for account_id, account_changes in changes.items():
+        history.record(account_id, account_changes, models.CreditTransaction.ALLOCATION)
+    return updated + created, {}
+
+
+def account_version_key(account_pk):
+    return f"account:{account_pk}"
+
+
+def bump_versions(*keys):
+    """Increments the version counters for the given keys."""
+    keys = set(keys)
+    if not keys:
+        return
+    now = timezone.now()
+    models.VersionCounter.objects.bulk_create(
+        [models.VersionCounter(key=key, version=0, modified=now) for key in keys],
+        ignore_conflicts=True,
+    )
+    models.VersionCounter.objects.filter(key__in=keys).update(
+        version=F("version") + 1, modified=now
+    )
+
+
+def get_versions(keys):
+    """Returns a dictionary of the form:
+
+    {
+        "key": ("version", "modified")
+    }
+
+    Keys that have never been bumped are at version 0, with no modified time.
+    """
+    versions = {key: (0, None) for key in keys}
+    for key, version, modified in models.VersionCounter.objects.filter(
+        key__in=keys
+    ).values_list("key", "version", "modified"):
+        versions[key] = (version, modified)
+    return versions
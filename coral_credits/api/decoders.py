@@ -0,0 +1,243 @@
+"""Single-pass decoding of Blazar enforcement requests.
+
+The Blazar JSON is validated and converted straight into the frozen
+business_objects dataclasses. Each dataclass is described by a _Spec that is
+compiled once at import time, so decoding a request walks the payload exactly
+once without instantiating any serializers.
+
+Leaf values are validated with the same DRF fields the serializers declare,
+so error messages and coercion rules match the rest of the API.
+"""
+
+from collections.abc import Mapping
+import dataclasses
+
+from rest_framework import serializers
+from rest_framework.fields import SkipField, empty
+from rest_framework.settings import api_settings
+
+from coral_credits.api import business_objects
+
+
+def _invalid_mapping(data):
+    return serializers.ValidationError(
+        {
+            api_settings.NON_FIELD_ERRORS_KEY: [
+                "Invalid data. Expected a dictionary, but got "
+                f"{type(data).__name__}."
+            ]
+        }
+    )
+
+
+class _Spec:
+    """A dataclass together with the parsers for each of its input fields.
+
+    Fields that are validated but not part of the dataclass (for example
+    before_end_date on a lease) are parsed and then discarded.
+    """
+
+    __slots__ = ("cls", "fields", "attrs")
+
+    def __init__(self, cls, **fields):
+        self.cls = cls
+        self.fields = tuple(fields.items())
+        self.attrs = frozenset(f.name for f in dataclasses.fields(cls))
+
+    def decode(self, data, **known):
+        if not isinstance(data, Mapping):
+            raise _invalid_mapping(data)
+        values = {}
+        errors = {}
+        for name, parse in self.fields:
+            if name in known:
+                continue
+            try:
+                value = parse(data.get(name, empty))
+            except serializers.ValidationError as e:
+                errors[name] = e.detail
+            except SkipField:
+                continue
+            else:
+                if name in self.attrs:
+                    values[name] = value
+        if errors:
+            raise serializers.ValidationError(errors)
+        return self.cls(**values, **known)
+
+
+def _field(field):
+    """Parser for a leaf value, using a DRF field instance built once."""
+    return field.run_validation
+
+
+def _nested(decode, required=True, allow_null=False):
+    """Parser for a nested object."""
+
+    def parse(data):
+        if data is empty:
+            if required:
+                raise serializers.ValidationError(["This field is required."])
+            raise SkipField()
+        if data is None:
+            if allow_null:
+                return None
+            raise serializers.ValidationError(["This field may not be null."])
+        return decode(data)
+
+    return parse
+
+
+def _list(parse_item, required=True):
+    """Parser for a list of nested objects, returned as a tuple."""
+
+    def parse(data):
+        if data is empty:
+            if required:
+                raise serializers.ValidationError(["This field is required."])
+            raise SkipField()
+        if isinstance(data, (str, Mapping)) or not hasattr(data, "__iter__"):
+            raise serializers.ValidationError(
+                [f'Expected a list of items but got type "{type(data).__name__}".']
+            )
+        items = []
+        errors = {}
+        for index, item in enumerate(data):
+            try:
+                items.append(parse_item(item))
+            except serializers.ValidationError as e:
+                errors[index] = e.detail
+        if errors:
+            raise serializers.ValidationError(errors)
+        return tuple(items)
+
+    return parse
+
+
+def _decode_resource_request(data):
+    if not isinstance(data, Mapping):
+        raise serializers.ValidationError(
+            [f'Expected a dictionary of items but got type "{type(data).__name__}".']
+        )
+    return business_objects.ResourceRequest(resources=dict(data))
+
+
+_ALLOCATION = _Spec(
+    business_objects.Allocation,
+    id=_field(serializers.CharField()),
+    hypervisor_hostname=_field(serializers.CharField()),
+    extra=_field(serializers.DictField(required=False, allow_null=True)),
+)
+
+_RESERVATION_FIELDS = dict(
+    resource_type=_field(serializers.CharField()),
+    allocations=_list(_nested(_ALLOCATION.decode), required=False),
+)
+
+_RESERVATIONS = {
+    "physical:host": _Spec(
+        business_objects.PhysicalReservation,
+        **_RESERVATION_FIELDS,
+        min=_field(serializers.IntegerField()),
+        max=_field(serializers.IntegerField()),
+        hypervisor_properties=_field(
+            serializers.CharField(required=False, allow_blank=True)
+        ),
+        resource_properties=_field(
+            serializers.CharField(required=False, allow_blank=True)
+        ),
+    ),
+    "flavor:instance": _Spec(
+        business_objects.FlavorReservation,
+        **_RESERVATION_FIELDS,
+        amount=_field(serializers.IntegerField()),
+        flavor_id=_field(serializers.CharField()),
+        affinity=_field(
+            serializers.CharField(required=False, default=None, allow_null=True)
+        ),
+    ),
+    "virtual:instance": _Spec(
+        business_objects.VirtualReservation,
+        **_RESERVATION_FIELDS,
+        amount=_field(serializers.IntegerField()),
+        vcpus=_field(serializers.IntegerField()),
+        memory_mb=_field(serializers.IntegerField()),
+        disk_gb=_field(serializers.IntegerField()),
+        affinity=_field(
+            serializers.CharField(required=False, default=None, allow_blank=True)
+        ),
+        resource_properties=_field(
+            serializers.CharField(required=False, allow_null=True)
+        ),
+    ),
+}
+
+
+def _decode_reservation(data):
+    if not isinstance(data, Mapping):
+        raise _invalid_mapping(data)
+    resource_type = data.get("resource_type")
+    spec = _RESERVATIONS.get(resource_type)
+    if spec is None:
+        raise serializers.ValidationError(
+            {"resource_type": [f"Unknown resource_type: {resource_type}"]}
+        )
+    return spec.decode(data)
+
+
+_LEASE = _Spec(
+    business_objects.Lease,
+    id=_field(serializers.UUIDField()),
+    name=_field(serializers.CharField()),
+    start_date=_field(serializers.DateTimeField()),
+    end_date=_field(serializers.DateTimeField()),
+    before_end_date=_field(serializers.DateTimeField(required=False, allow_null=True)),
+    reservations=_list(_nested(_decode_reservation)),
+    resource_requests=_nested(_decode_resource_request, required=False),
+)
+
+_CONTEXT = _Spec(
+    business_objects.Context,
+    user_id=_field(serializers.UUIDField()),
+    project_id=_field(serializers.UUIDField()),
+    auth_url=_field(serializers.URLField()),
+    region_name=_field(serializers.CharField(required=False, allow_null=True)),
+)
+
+_CONSUMER_REQUEST_FIELDS = dict(
+    context=_nested(_CONTEXT.decode),
+    lease=_nested(_LEASE.decode),
+)
+
+_CONSUMER_REQUEST = _Spec(
+    business_objects.ConsumerRequest,
+    **_CONSUMER_REQUEST_FIELDS,
+    current_lease=_nested(_LEASE.decode, required=False, allow_null=True),
+)
+
+_CONSUMER_UPDATE_REQUEST = _Spec(
+    business_objects.ConsumerRequest,
+    **_CONSUMER_REQUEST_FIELDS,
+    current_lease=_nested(_LEASE.decode),
+)
+
+
+def decode_consumer_request(data, current_lease_required=False):
+    """Decodes a Blazar enforcement request into a ConsumerRequest.
+
+    Raises a rest_framework ValidationError describing every invalid field.
+    """
+    spec = _CONSUMER_UPDATE_REQUEST if current_lease_required else _CONSUMER_REQUEST
+    if (
+        isinstance(data, Mapping)
+        and data.get("current_lease") is not None
+        and data.get("current_lease") is data.get("lease")
+    ):
+        # on-end requests use the same lease as the current lease,
+        # so it only needs decoding once.
+        try:
+            lease = _LEASE.decode(data["lease"])
+        except serializers.ValidationError as e:
+            raise serializers.ValidationError({"lease": e.detail})
+        return spec.decode(data, lease=lease, current_lease=lease)
+    return spec.decode(data)
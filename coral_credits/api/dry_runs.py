@@ -0,0 +1,101 @@
+"""Cache of the decisions made by dry-run credit checks.
+
+Blazar checks every lease before committing it, and Azimuth checks a lease
+repeatedly while it is being edited. Each process remembers the decisions
+it made, keyed by the version counter of the account, the project, the
+resources requested and the lease window. Any change to the allocations or
+consumers of the account bumps its counter, so a decision is never reused
+once the balance it was made from has changed.
+
+Which credit allocations are active also depends on the time, so decisions
+are only kept for DRY_RUN_CACHE_SECONDS, and set it to 0 to turn the cache
+off. At most DRY_RUN_CACHE_SIZE decisions are kept, evicting the least
+recently used.
+"""
+
+from collections import OrderedDict
+import threading
+import time
+
+from django.conf import settings
+from rest_framework.response import Response
+
+from coral_credits.api import db_utils
+
+DRY_RUN_CACHE_SECONDS = 60
+DRY_RUN_CACHE_SIZE = 10000
+
+_decisions = OrderedDict()
+_lock = threading.Lock()
+
+
+def _cache_seconds():
+    return getattr(settings, "DRY_RUN_CACHE_SECONDS", DRY_RUN_CACHE_SECONDS)
+
+
+def _lease_window(lease):
+    return (lease.id, lease.start_date, lease.end_date) if lease else None
+
+
+def decision_key(resource_provider_account, lease, current_lease=None):
+    """Returns the cache key for a dry run of the lease.
+
+    Returns None if the cache is off, or the resources requested aren't
+    numbers, leaving the credit check to report the error.
+    """
+    if _cache_seconds() <= 0:
+        return None
+    try:
+        resources = tuple(
+            sorted(
+                (name, float(amount))
+                for name, amount in lease.resource_requests.resources.items()
+            )
+        )
+    except (TypeError, ValueError):
+        return None
+    account_key = db_utils.account_version_key(resource_provider_account.account_id)
+    return (
+        db_utils.get_versions([account_key])[account_key],
+        resource_provider_account.pk,
+        resources,
+        (lease.start_date, lease.end_date),
+        _lease_window(current_lease),
+    )
+
+
+def get(key):
+    """Returns a response for a decision already made, or None."""
+    if key is None:
+        return None
+    with _lock:
+        decision = _decisions.get(key)
+        if decision is None:
+            return None
+        expires, status_code, data = decision
+        if expires < time.monotonic():
+            del _decisions[key]
+            return None
+        _decisions.move_to_end(key)
+    return Response(data, status=status_code)
+
+
+def remember(key, response):
+    """Caches the decision in a response, and returns the response."""
+    if key is not None:
+        size = getattr(settings, "DRY_RUN_CACHE_SIZE", DRY_RUN_CACHE_SIZE)
+        with _lock:
+            _decisions[key] = (
+                time.monotonic() + _cache_seconds(),
+                response.status_code,
+                response.data,
+            )
+            _decisions.move_to_end(key)
+            while len(_decisions) > size:
+                _decisions.popitem(last=False)
+    return response
+
+
+def clear():
+    with _lock:
+        _decisions.clear()
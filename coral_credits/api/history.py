@@ -0,0 +1,85 @@
+"""Append-only history of the balances of credit accounts.
+
+Every change to the resource hours left in an account's allocations is
+recorded as a CreditTransaction, along with the account's balance of the
+resource class after the change. The balance at any time is then the
+balance of the last transaction before it, found with a single seek of the
+index on account, resource class and time, rather than by replaying the
+changes.
+
+Bulk updates don't send signals, so the code that changes the resource
+hours of allocations records the changes itself.
+"""
+
+from django.db.models import OuterRef, Subquery, Sum
+from django.utils import timezone
+
+from coral_credits.api import models
+
+
+def record(account_id, changes, kind=None, consumer_uuid=None):
+    """Records changes to the balances of an account.
+
+    changes maps resource class ids to the change in resource hours, and
+    must be recorded after the allocations have been saved, as the balances
+    are read back from them. kind defaults to a spend or a refund, by the
+    sign of each change.
+    """
+    changes = {
+        resource_class_id: change
+        for resource_class_id, change in changes.items()
+        if change
+    }
+    if account_id is None or not changes:
+        return
+    balances = dict(
+        models.CreditAllocationResource.objects.filter(
+            allocation__account_id=account_id, resource_class_id__in=changes
+        )
+        .order_by()
+        .values_list("resource_class_id")
+        .annotate(Sum("resource_hours"))
+    )
+    now = timezone.now()
+    models.CreditTransaction.objects.bulk_create(
+        [
+            models.CreditTransaction(
+                account_id=account_id,
+                resource_class_id=resource_class_id,
+                created=now,
+                kind=kind
+                or (
+                    models.CreditTransaction.SPEND
+                    if change < 0
+                    else models.CreditTransaction.REFUND
+                ),
+                change=change,
+                balance=balances.get(resource_class_id, 0),
+                consumer_uuid=consumer_uuid,
+            )
+            for resource_class_id, change in changes.items()
+        ]
+    )
+
+
+def balance_at(account_id, when):
+    """Returns a dictionary of the form:
+
+    {
+        "resource_class_name": "resource_hours"
+    }
+
+    with the balance of each resource class the account had at the time.
+    Makes one query, with an index seek for each resource class.
+    """
+    latest = models.CreditTransaction.objects.filter(
+        account_id=account_id, resource_class=OuterRef("pk"), created__lte=when
+    ).order_by("-created", "-pk")
+    return dict(
+        models.ResourceClass.objects.annotate(
+            balance=Subquery(latest.values("balance")[:1])
+        )
+        .filter(balance__isnull=False)
+        .order_by("name")
+        .values_list("name", "balance")
+    )
@@ -0,0 +1,33 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from coral_credits.api import archive
+
+
+class Command(BaseCommand):
+    help = "Moves consumers that ended before the retention horizon to the archive."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--retention-days",
+            type=int,
+            default=90,
+            help="Archive consumers that ended more than this many days ago.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Number of consumers to archive in each transaction.",
+        )
+
+    def handle(self, *args, **options):
+        ended_before = timezone.now() - timedelta(days=options["retention_days"])
+        archived = archive.archive_consumers(ended_before, options["batch_size"])
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Archived {archived} consumers that ended before {ended_before}."
+            )
+        )
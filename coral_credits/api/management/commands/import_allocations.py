@@ -0,0 +1,45 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from coral_credits.api import allocation_import
+
+
+class Command(BaseCommand):
+    help = (
+        "Creates or updates credit accounts, project accounts and credit "
+        "allocations from a CSV, YAML or JSON manifest."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("manifest", help="Path to the manifest file.")
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=500,
+            help="Number of rows to import in each transaction.",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Validate the manifest without importing it.",
+        )
+
+    def handle(self, *args, **options):
+        start = time.monotonic()
+        try:
+            rows = allocation_import.load_manifest(options["manifest"])
+            allocation_import.validate_manifest(rows)
+            if options["dry_run"]:
+                self.stdout.write(f"Manifest with {len(rows)} rows is valid.")
+                return
+            allocation_import.import_manifest(rows, options["chunk_size"])
+        except allocation_import.ManifestError as e:
+            raise CommandError(f"Invalid manifest:\n{e}")
+        elapsed = time.monotonic() - start
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Imported {len(rows)} rows in {elapsed:.2f}s "
+                f"({len(rows) / elapsed:.0f} rows/second)."
+            )
+        )
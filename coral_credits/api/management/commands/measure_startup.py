@@ -0,0 +1,118 @@
+import json
+import statistics
+import subprocess
+import sys
+
+from django.core.management.base import BaseCommand
+
+# Run in a new process, so nothing has been imported or set up yet
+MEASURE_SCRIPT = """
+import json
+import sys
+import time
+
+start = time.perf_counter()
+from django.core.wsgi import get_wsgi_application
+
+application = get_wsgi_application()
+timings = {"import": time.perf_counter() - start}
+
+from coral_credits import warmup
+
+if sys.argv[1] == "warm":
+    start = time.perf_counter()
+    warmup.warm_up(application)
+    timings["warm_up"] = time.perf_counter() - start
+for name in ("first_request", "second_request"):
+    start = time.perf_counter()
+    warmup.request(application, sys.argv[2])
+    timings[name] = time.perf_counter() - start
+print(json.dumps(timings))
+"""
+
+STEPS = ["import", "warm_up", "first_request", "second_request"]
+
+
+class Command(BaseCommand):
+    help = (
+        "Measures how long a new process takes to import the app and serve its "
+        "first requests, with and without the warm-up done by gunicorn's master."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--runs",
+            type=int,
+            default=3,
+            help="Number of processes to start for each mode, reporting the median.",
+        )
+        parser.add_argument(
+            "--path",
+            default="/allocation",
+            help="Path of the requests to time.",
+        )
+        parser.add_argument(
+            "--slowest-imports",
+            type=int,
+            default=10,
+            help="Number of the slowest top level imports to list.",
+        )
+
+    def measure(self, mode, path, importtime=False):
+        command = [sys.executable]
+        if importtime:
+            command += ["-X", "importtime"]
+        result = subprocess.run(
+            command + ["-c", MEASURE_SCRIPT, mode, path],
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        return json.loads(result.stdout.splitlines()[-1]), result.stderr
+
+    def slowest_imports(self, importtime_output, count):
+        """Parses the output of python -X importtime, for top level imports."""
+        imports = []
+        for line in importtime_output.splitlines():
+            if not line.startswith("import time:") or "|" not in line:
+                continue
+            _, cumulative, name = line.split(":", 1)[1].split("|")
+            # Nested imports are indented under the module that imported them
+            if not cumulative.strip().isdigit() or name.startswith("  "):
+                continue
+            imports.append((int(cumulative) / 1e6, name.strip()))
+        return sorted(imports, reverse=True)[:count]
+
+    def handle(self, *args, **options):
+        results = {}
+        for mode in ("cold", "warm"):
+            runs = [
+                self.measure(mode, options["path"])[0] for _ in range(options["runs"])
+            ]
+            results[mode] = {
+                step: statistics.median(run[step] for run in runs)
+                for step in STEPS
+                if step in runs[0]
+            }
+
+        self.stdout.write(f"{'':<16}{'cold':>10}{'warm':>10}")
+        for step in STEPS:
+            cells = [
+                f"{results[mode][step]:.4f}s" if step in results[mode] else "-"
+                for mode in ("cold", "warm")
+            ]
+            self.stdout.write(f"{step:<16}" + "".join(f"{c:>10}" for c in cells))
+
+        if options["slowest_imports"]:
+            _, output = self.measure("cold", options["path"], importtime=True)
+            self.stdout.write("\nSlowest imports:")
+            for seconds, name in self.slowest_imports(
+                output, options["slowest_imports"]
+            ):
+                self.stdout.write(f"  {seconds:.4f}s  {name}")
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Measured the median of {options['runs']} runs of each mode."
+            )
+        )
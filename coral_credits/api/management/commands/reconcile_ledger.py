@@ -0,0 +1,54 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from coral_credits.api import reconcile
+
+
+class Command(BaseCommand):
+    help = (
+        "Checks that the hours spent from each account's credit allocations "
+        "match the hours consumed, optionally repairing any differences."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--processes",
+            type=int,
+            default=os.cpu_count() or 1,
+            help="Number of processes checking partitions of the accounts.",
+        )
+        parser.add_argument(
+            "--partitions",
+            type=int,
+            default=None,
+            help="Number of partitions, by default four for each process.",
+        )
+        parser.add_argument(
+            "--repair",
+            action="store_true",
+            help="Adjust the latest allocation of each account that is off.",
+        )
+
+    def handle(self, *args, **options):
+        start = time.monotonic()
+        discrepancies = reconcile.find_discrepancies(
+            options["processes"], options["partitions"]
+        )
+        for discrepancy in discrepancies:
+            self.stdout.write(str(discrepancy))
+        elapsed = time.monotonic() - start
+
+        if discrepancies and not options["repair"]:
+            raise CommandError(
+                f"Found {len(discrepancies)} discrepancies in {elapsed:.2f}s."
+            )
+        for discrepancy in discrepancies:
+            reconcile.repair(discrepancy)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Reconciled the ledger in {elapsed:.2f}s, repairing "
+                f"{len(discrepancies)} discrepancies."
+            )
+        )
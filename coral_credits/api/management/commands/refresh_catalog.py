@@ -0,0 +1,39 @@
+import json
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from coral_credits.api import pricing
+
+
+class Command(BaseCommand):
+    help = (
+        "Replaces the flavors and hosts used to price reservations with those in "
+        "a YAML or JSON catalog."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("catalog", help="Path to the catalog file.")
+
+    def handle(self, *args, **options):
+        path = Path(options["catalog"])
+        with open(path) as f:
+            if path.suffix.lower() in (".yaml", ".yml"):
+                try:
+                    import yaml
+                except ImportError:
+                    raise CommandError("PyYAML is required for YAML catalogs")
+                raw_catalog = yaml.safe_load(f)
+            else:
+                raw_catalog = json.load(f)
+        try:
+            flavors, hosts = pricing.parse_catalog(raw_catalog)
+        except pricing.CatalogError as e:
+            raise CommandError(f"Invalid catalog:\n{e}")
+        version = pricing.refresh_catalog(flavors, hosts)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Loaded {len(flavors)} flavors and {len(hosts)} hosts as catalog "
+                f"version {version}."
+            )
+        )
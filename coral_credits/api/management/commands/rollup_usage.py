@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from coral_credits.api import rollups
+
+
+class Command(BaseCommand):
+    help = "Adds consumers changed since the last run to the usage rollups."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Number of consumers to roll up in each transaction.",
+        )
+
+    def handle(self, *args, **options):
+        rolled_up = rollups.rollup_usage(options["batch_size"])
+        self.stdout.write(
+            self.style.SUCCESS(f"Rolled up changes to {rolled_up} consumers.")
+        )
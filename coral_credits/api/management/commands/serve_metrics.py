@@ -0,0 +1,39 @@
+import threading
+
+from django.core.management.base import BaseCommand
+from prometheus_client import start_http_server
+
+from coral_credits import metrics
+
+
+class Command(BaseCommand):
+    help = (
+        "Serves Prometheus metrics, including the credit allocation gauges and "
+        "the request metrics written by the API workers."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--addr",
+            default="0.0.0.0",
+            help="Address to listen on.",
+        )
+        parser.add_argument(
+            "--port",
+            type=int,
+            default=8000,
+            help="Port to listen on.",
+        )
+
+    def handle(self, *args, **options):
+        start_http_server(
+            options["port"],
+            addr=options["addr"],
+            registry=metrics.get_registry(include_allocations=True),
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Serving metrics on {options['addr']}:{options['port']}."
+            )
+        )
+        threading.Event().wait()
@@ -0,0 +1,33 @@
+# Generated by Django 5.1.7 on 2026-10-19 11:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        (
+            "api",
+            "0004_alter_creditallocationresource_allocated_resource_hours_and_more",
+        ),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="VersionCounter",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("key", models.CharField(max_length=200, unique=True)),
+                ("version", models.PositiveBigIntegerField(default=0)),
+                ("modified", models.DateTimeField()),
+            ],
+        ),
+    ]
@@ -0,0 +1,127 @@
+# Generated by Django 5.1.7 on 2026-10-19 11:26
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0005_versioncounter"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ArchivedConsumer",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("consumer_ref", models.CharField(max_length=200)),
+                ("consumer_uuid", models.UUIDField(db_index=True)),
+                ("user_ref", models.UUIDField()),
+                ("created", models.DateTimeField()),
+                ("start", models.DateTimeField()),
+                ("end", models.DateTimeField()),
+                ("archived", models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name="ArchivedResourceConsumptionRecord",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("resource_hours", models.IntegerField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name="ArchivedResourceHours",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("resource_hours", models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name="consumer",
+            index=models.Index(
+                fields=["resource_provider_account", "end"],
+                name="api_consume_resourc_783440_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="consumer",
+            index=models.Index(fields=["end"], name="api_consume_end_38340c_idx"),
+        ),
+        migrations.AddField(
+            model_name="archivedconsumer",
+            name="resource_provider_account",
+            field=models.ForeignKey(
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                to="api.resourceprovideraccount",
+            ),
+        ),
+        migrations.AddField(
+            model_name="archivedresourceconsumptionrecord",
+            name="consumer",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="resources",
+                to="api.archivedconsumer",
+            ),
+        ),
+        migrations.AddField(
+            model_name="archivedresourceconsumptionrecord",
+            name="resource_class",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.DO_NOTHING,
+                related_name="+",
+                to="api.resourceclass",
+            ),
+        ),
+        migrations.AddField(
+            model_name="archivedresourcehours",
+            name="account",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE, to="api.creditaccount"
+            ),
+        ),
+        migrations.AddField(
+            model_name="archivedresourcehours",
+            name="resource_class",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.DO_NOTHING,
+                related_name="+",
+                to="api.resourceclass",
+            ),
+        ),
+        migrations.AlterUniqueTogether(
+            name="archivedresourceconsumptionrecord",
+            unique_together={("consumer", "resource_class")},
+        ),
+        migrations.AlterUniqueTogether(
+            name="archivedresourcehours",
+            unique_together={("account", "resource_class")},
+        ),
+    ]
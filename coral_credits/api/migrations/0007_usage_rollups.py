@@ -0,0 +1,96 @@
+# Generated by Django 5.1.7 on 2026-10-19 11:37
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0006_archived_consumers"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="consumer",
+            name="modified",
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.CreateModel(
+            name="UsageRollupConsumer",
+            fields=[
+                (
+                    "consumer",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="+",
+                        serialize=False,
+                        to="api.consumer",
+                    ),
+                ),
+                ("start", models.DateTimeField()),
+                ("end", models.DateTimeField()),
+                ("resources", models.JSONField(default=dict)),
+                ("modified", models.DateTimeField(db_index=True)),
+                (
+                    "resource_provider_account",
+                    models.ForeignKey(
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="+",
+                        to="api.resourceprovideraccount",
+                    ),
+                ),
+            ],
+        ),
+        migrations.CreateModel(
+            name="UsageRollup",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "period",
+                    models.CharField(
+                        choices=[("hour", "Hour"), ("day", "Day")], max_length=4
+                    ),
+                ),
+                ("start", models.DateTimeField()),
+                ("reserved_hours", models.FloatField(default=0)),
+                ("consumed_hours", models.FloatField(default=0)),
+                (
+                    "resource_class",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.DO_NOTHING,
+                        related_name="+",
+                        to="api.resourceclass",
+                    ),
+                ),
+                (
+                    "resource_provider_account",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="api.resourceprovideraccount",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["period", "start"], name="api_usagero_period_5b8db9_idx"
+                    )
+                ],
+                "unique_together": {
+                    ("period", "start", "resource_provider_account", "resource_class")
+                },
+            },
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.1.7 on 2026-10-19 11:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0007_usage_rollups"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ConsumerCommitReplay",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("key", models.CharField(max_length=64, unique=True)),
+                ("status_code", models.PositiveSmallIntegerField()),
+                ("response", models.JSONField(null=True)),
+                ("created", models.DateTimeField(db_index=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.1.7 on 2026-10-19 12:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0008_consumercommitreplay"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Flavor",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("flavor_id", models.CharField(max_length=200, unique=True)),
+                ("name", models.CharField(blank=True, max_length=200)),
+                ("resources", models.JSONField(default=dict)),
+            ],
+        ),
+        migrations.CreateModel(
+            name="Host",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("hypervisor_hostname", models.CharField(max_length=255, unique=True)),
+                ("resources", models.JSONField(default=dict)),
+            ],
+        ),
+    ]
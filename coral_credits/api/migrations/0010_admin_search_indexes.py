@@ -0,0 +1,23 @@
+# Generated by Django 5.1.7 on 2026-10-19 12:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0009_pricing_catalog"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="consumer",
+            name="consumer_ref",
+            field=models.CharField(db_index=True, max_length=200),
+        ),
+        migrations.AlterField(
+            model_name="resourceprovideraccount",
+            name="project_id",
+            field=models.UUIDField(db_index=True),
+        ),
+    ]
@@ -0,0 +1,99 @@
+# Generated by Django 5.1.7 on 2026-10-19 12:34
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import Sum
+
+
+def record_opening_balances(apps, schema_editor):
+    """Starts the history of each account from its current balance."""
+    CreditAllocationResource = apps.get_model("api", "CreditAllocationResource")
+    CreditTransaction = apps.get_model("api", "CreditTransaction")
+    balances = (
+        CreditAllocationResource.objects.order_by()
+        .values_list("allocation__account_id", "resource_class_id")
+        .annotate(Sum("resource_hours"))
+    )
+    CreditTransaction.objects.bulk_create(
+        [
+            CreditTransaction(
+                account_id=account_id,
+                resource_class_id=resource_class_id,
+                kind="opening",
+                change=balance,
+                balance=balance,
+            )
+            for account_id, resource_class_id, balance in balances
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0010_admin_search_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CreditTransaction",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("created", models.DateTimeField(default=django.utils.timezone.now)),
+                (
+                    "kind",
+                    models.CharField(
+                        choices=[
+                            ("opening", "Opening balance"),
+                            ("spend", "Spend"),
+                            ("refund", "Refund"),
+                            ("allocation", "Allocation change"),
+                            ("repair", "Ledger repair"),
+                        ],
+                        max_length=16,
+                    ),
+                ),
+                ("change", models.BigIntegerField()),
+                ("balance", models.BigIntegerField()),
+                ("consumer_uuid", models.UUIDField(blank=True, null=True)),
+                (
+                    "account",
+                    models.ForeignKey(
+                        db_constraint=False,
+                        on_delete=django.db.models.deletion.DO_NOTHING,
+                        related_name="+",
+                        to="api.creditaccount",
+                    ),
+                ),
+                (
+                    "resource_class",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.DO_NOTHING,
+                        related_name="+",
+                        to="api.resourceclass",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["account", "resource_class", "created"],
+                        name="api_creditt_account_c9f773_idx",
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(
+            record_opening_balances, migrations.RunPython.noop, elidable=True
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.7 on 2026-10-19 12:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0011_credit_transactions"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="consumercommitreplay",
+            name="status_code",
+            field=models.PositiveSmallIntegerField(null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.7 on 2026-10-19 12:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0012_consumercommitreplay_pending"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="creditallocation",
+            name="name",
+            field=models.CharField(db_index=True, max_length=200),
+        ),
+    ]
@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 
 # from django.db.models import Q
 
@@ -35,7 +36,8 @@ class CreditAccount(models.Model):
 class ResourceProviderAccount(models.Model):
     account = models.ForeignKey(CreditAccount, on_delete=models.CASCADE)
     provider = models.ForeignKey(ResourceProvider, on_delete=models.CASCADE)
-    project_id = models.UUIDField()
+    # Looked up on its own by every credit check
+    project_id = models.UUIDField(db_index=True)
 
     class Meta:
         unique_together = (
@@ -55,7 +57,9 @@ class ResourceProviderAccount(models.Model):
 
 class CreditAllocation(models.Model):
     # TODO(tylerchristie): do we need a name here?
-    name = models.CharField(max_length=200)
+    # Indexed on its own, as on PostgreSQL that also adds the pattern ops
+    # index used by the admin's prefix search
+    name = models.CharField(max_length=200, db_index=True)
     created = models.DateTimeField(auto_now_add=True)
     account = models.ForeignKey(CreditAccount, on_delete=models.DO_NOTHING)
     start = models.DateTimeField()
@@ -100,16 +104,27 @@ class CreditAllocationResource(models.Model):
 
 
 class Consumer(models.Model):
-    consumer_ref = models.CharField(max_length=200)
+    # Indexed for prefix searches in the admin
+    consumer_ref = models.CharField(max_length=200, db_index=True)
     consumer_uuid = models.UUIDField(unique=True)
     resource_provider_account = models.ForeignKey(
         ResourceProviderAccount, on_delete=models.SET_NULL, null=True
     )
     user_ref = models.UUIDField()
     created = models.DateTimeField(auto_now_add=True)
+    # Used to find the consumers changed since the usage rollups were updated
+    modified = models.DateTimeField(auto_now=True, db_index=True)
     start = models.DateTimeField()
     end = models.DateTimeField()
 
+    class Meta:
+        indexes = [
+            # Active consumer checks
+            models.Index(fields=["resource_provider_account", "end"]),
+            # Archival of expired consumers
+            models.Index(fields=["end"]),
+        ]
+
     def __str__(self) -> str:
         return (
             f"consumer ref:{self.consumer_ref} with "
@@ -135,3 +150,238 @@ class ResourceConsumptionRecord(models.Model):
 
     def __str__(self) -> str:
         return f"{self.resource_class}:{self.resource_hours} hours for {self.consumer}"
+
+
+class ArchivedConsumer(models.Model):
+    """A consumer that ended before the retention horizon."""
+
+    consumer_ref = models.CharField(max_length=200)
+    consumer_uuid = models.UUIDField(db_index=True)
+    resource_provider_account = models.ForeignKey(
+        ResourceProviderAccount, on_delete=models.SET_NULL, null=True
+    )
+    user_ref = models.UUIDField()
+    created = models.DateTimeField()
+    start = models.DateTimeField()
+    end = models.DateTimeField()
+    archived = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self) -> str:
+        return (
+            f"archived consumer ref:{self.consumer_ref} with "
+            f"id:{self.consumer_uuid}@{self.resource_provider_account}"
+        )
+
+
+class ArchivedResourceConsumptionRecord(models.Model):
+    consumer = models.ForeignKey(
+        ArchivedConsumer, on_delete=models.CASCADE, related_name="resources"
+    )
+    resource_class = models.ForeignKey(
+        ResourceClass, on_delete=models.DO_NOTHING, related_name="+"
+    )
+    resource_hours = models.IntegerField()
+
+    class Meta:
+        unique_together = (
+            "consumer",
+            "resource_class",
+        )
+
+    def __str__(self) -> str:
+        return f"{self.resource_class}:{self.resource_hours} hours for {self.consumer}"
+
+
+class ArchivedResourceHours(models.Model):
+    """Total resource hours of the archived consumers of an account."""
+
+    account = models.ForeignKey(CreditAccount, on_delete=models.CASCADE)
+    resource_class = models.ForeignKey(
+        ResourceClass, on_delete=models.DO_NOTHING, related_name="+"
+    )
+    resource_hours = models.BigIntegerField(default=0)
+
+    class Meta:
+        unique_together = (
+            "account",
+            "resource_class",
+        )
+
+    def __str__(self) -> str:
+        return (
+            f"{self.resource_hours} archived hours of {self.resource_class} "
+            f"for {self.account}"
+        )
+
+
+class UsageRollup(models.Model):
+    """Resource hours for a project in an hour or a day.
+
+    reserved_hours is the share of each reservation that falls in the period.
+    consumed_hours is the net resource hours charged during the period.
+    """
+
+    HOUR = "hour"
+    DAY = "day"
+    PERIOD_CHOICES = [(HOUR, "Hour"), (DAY, "Day")]
+
+    period = models.CharField(max_length=4, choices=PERIOD_CHOICES)
+    start = models.DateTimeField()
+    resource_provider_account = models.ForeignKey(
+        ResourceProviderAccount, on_delete=models.CASCADE, related_name="+"
+    )
+    resource_class = models.ForeignKey(
+        ResourceClass, on_delete=models.DO_NOTHING, related_name="+"
+    )
+    reserved_hours = models.FloatField(default=0)
+    consumed_hours = models.FloatField(default=0)
+
+    class Meta:
+        unique_together = (
+            "period",
+            "start",
+            "resource_provider_account",
+            "resource_class",
+        )
+        indexes = [
+            # Range queries across all projects
+            models.Index(fields=["period", "start"]),
+        ]
+
+    def __str__(self) -> str:
+        return (
+            f"{self.resource_class} for {self.resource_provider_account} in the "
+            f"{self.period} from {self.start}"
+        )
+
+
+class UsageRollupConsumer(models.Model):
+    """A consumer as it was when last added to the usage rollups.
+
+    The next time the consumer is rolled up, the difference from this is
+    applied to the rollups.
+    """
+
+    consumer = models.OneToOneField(
+        Consumer, on_delete=models.CASCADE, primary_key=True, related_name="+"
+    )
+    resource_provider_account = models.ForeignKey(
+        ResourceProviderAccount, on_delete=models.SET_NULL, null=True, related_name="+"
+    )
+    start = models.DateTimeField()
+    end = models.DateTimeField()
+    # resource class id -> resource hours
+    resources = models.JSONField(default=dict)
+    modified = models.DateTimeField(db_index=True)
+
+    def __str__(self) -> str:
+        return f"rolled up {self.consumer_id} at {self.modified}"
+
+
+class ConsumerCommitReplay(models.Model):
+    """The response to a consumer commit, returned again when it is retried.
+
+    key identifies the lease, the endpoint and the request payload.
+    """
+
+    key = models.CharField(max_length=64, unique=True)
+    # None while the commit is running
+    status_code = models.PositiveSmallIntegerField(null=True)
+    response = models.JSONField(null=True)
+    created = models.DateTimeField(db_index=True)
+
+    def __str__(self) -> str:
+        return f"{self.status_code} response for {self.key}"
+
+
+class CreditTransaction(models.Model):
+    """A change to the resource hours left in an account's allocations.
+
+    Rows are only ever added, each with the account's balance of the
+    resource class after the change. Transactions outlive the accounts they
+    belong to, so there's no foreign key constraint on account.
+    """
+
+    OPENING = "opening"
+    SPEND = "spend"
+    REFUND = "refund"
+    ALLOCATION = "allocation"
+    REPAIR = "repair"
+    KIND_CHOICES = [
+        (OPENING, "Opening balance"),
+        (SPEND, "Spend"),
+        (REFUND, "Refund"),
+        (ALLOCATION, "Allocation change"),
+        (REPAIR, "Ledger repair"),
+    ]
+
+    account = models.ForeignKey(
+        CreditAccount,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        related_name="+",
+    )
+    resource_class = models.ForeignKey(
+        ResourceClass, on_delete=models.DO_NOTHING, related_name="+"
+    )
+    created = models.DateTimeField(default=timezone.now)
+    kind = models.CharField(max_length=16, choices=KIND_CHOICES)
+    change = models.BigIntegerField()
+    balance = models.BigIntegerField()
+    # The lease that spent or was refunded the hours, if any
+    consumer_uuid = models.UUIDField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Balance at a point in time
+            models.Index(fields=["account", "resource_class", "created"]),
+        ]
+
+    def __str__(self) -> str:
+        return (
+            f"{self.kind} of {self.change:+d} {self.resource_class} hours for "
+            f"{self.account_id} at {self.created}"
+        )
+
+
+class Flavor(models.Model):
+    """A flavor in the pricing catalog.
+
+    resources maps resource class names to the amount of each reserved by
+    one instance of the flavor.
+    """
+
+    flavor_id = models.CharField(max_length=200, unique=True)
+    name = models.CharField(max_length=200, blank=True)
+    resources = models.JSONField(default=dict)
+
+    def __str__(self) -> str:
+        return f"{self.name or self.flavor_id}"
+
+
+class Host(models.Model):
+    """A host in the pricing catalog.
+
+    resources maps resource class names to the amount of each reserved by
+    a physical reservation of the host.
+    """
+
+    hypervisor_hostname = models.CharField(max_length=255, unique=True)
+    resources = models.JSONField(default=dict)
+
+    def __str__(self) -> str:
+        return f"{self.hypervisor_hostname}"
+
+
+class VersionCounter(models.Model):
+    """Counts changes to a set of rows, such as an account or a whole table.
+
+    Used to answer conditional requests without querying the rows themselves.
+    """
+
+    key = models.CharField(max_length=200, unique=True)
+    version = models.PositiveBigIntegerField(default=0)
+    modified = models.DateTimeField()
+
+    def __str__(self) -> str:
+        return f"{self.key} at version {self.version}"
@@ -0,0 +1,249 @@
+"""Pricing of lease reservations.
+
+Works out how much of each resource class the reservations of a lease
+reserve, so clients don't have to send resource_requests:
+
+- virtual:instance reservations reserve amount × vcpus, memory_mb and
+  disk_gb of VCPU, MEMORY_MB and DISK_GB.
+- flavor:instance reservations reserve amount × the resources of the flavor.
+- physical:host reservations reserve the resources of each allocated host.
+
+Flavors and hosts come from a catalog stored in the database, and cached in
+memory by each process. The cache is reloaded when the catalog's version
+counter changes, which refresh_catalog bumps.
+
+Leases that include resource_requests are charged for those, unless
+PRICING_ALWAYS is set, in which case their reservations are always priced.
+"""
+
+from collections import Counter
+import dataclasses
+import logging
+import numbers
+import threading
+
+from django.conf import settings
+from django.db import transaction
+
+from coral_credits import tracing
+from coral_credits.api import business_objects, db_exceptions, db_utils, models
+
+LOG = logging.getLogger(__name__)
+
+PRICING_ALWAYS = False
+CATALOG_VERSION = "pricing_catalog"
+
+VIRTUAL_RESOURCES = (
+    ("vcpus", "VCPU"),
+    ("memory_mb", "MEMORY_MB"),
+    ("disk_gb", "DISK_GB"),
+)
+
+
+class CatalogError(Exception):
+    """Raised when a catalog is invalid"""
+
+    def __init__(self, errors):
+        super().__init__("\n".join(errors))
+        self.errors = errors
+
+
+@dataclasses.dataclass(frozen=True, slots=True)
+class Catalog:
+    # The version counter and its modified time
+    version: tuple
+    # flavor id -> {resource class name: amount}
+    flavors: dict
+    # hypervisor hostname -> {resource class name: amount}
+    hosts: dict
+
+
+_catalog = None
+_catalog_lock = threading.Lock()
+
+
+def get_catalog():
+    """Returns the catalog, loading it if it changed since it was cached."""
+    global _catalog
+    version = db_utils.get_versions([CATALOG_VERSION])[CATALOG_VERSION]
+    catalog = _catalog
+    if catalog is not None and catalog.version == version:
+        return catalog
+    with _catalog_lock:
+        if _catalog is None or _catalog.version != version:
+            _catalog = Catalog(
+                version=version,
+                flavors=dict(
+                    models.Flavor.objects.values_list("flavor_id", "resources")
+                ),
+                hosts=dict(
+                    models.Host.objects.values_list("hypervisor_hostname", "resources")
+                ),
+            )
+            LOG.info(
+                f"Loaded pricing catalog version {version[0]} with "
+                f"{len(_catalog.flavors)} flavors and {len(_catalog.hosts)} hosts"
+            )
+        return _catalog
+
+
+def price_reservations(reservations, catalog):
+    """Returns a dictionary of the form:
+
+    {
+        "resource_class_name": "amount"
+    }
+
+    Reservations are first totalled by flavor and host, so each flavor and
+    host in the catalog is only looked up and multiplied out once.
+    """
+    totals = Counter()
+    flavor_amounts = Counter()
+    host_amounts = Counter()
+    for reservation in reservations:
+        if isinstance(reservation, business_objects.VirtualReservation):
+            for attr, resource_class in VIRTUAL_RESOURCES:
+                totals[resource_class] += reservation.amount * getattr(
+                    reservation, attr
+                )
+        elif isinstance(reservation, business_objects.FlavorReservation):
+            flavor_amounts[reservation.flavor_id] += reservation.amount
+        elif isinstance(reservation, business_objects.PhysicalReservation):
+            if not reservation.allocations:
+                raise db_exceptions.PricingError(
+                    "Physical reservations are priced from their allocated hosts, "
+                    "but none were given."
+                )
+            for allocation in reservation.allocations:
+                host_amounts[str(allocation.hypervisor_hostname)] += 1
+        else:
+            raise db_exceptions.PricingError(
+                f"Unable to price {reservation.resource_type} reservations."
+            )
+
+    for kind, specs, amounts in (
+        ("flavor", catalog.flavors, flavor_amounts),
+        ("host", catalog.hosts, host_amounts),
+    ):
+        for key, amount in amounts.items():
+            resources = specs.get(key)
+            if resources is None:
+                raise db_exceptions.PricingError(
+                    f"No {kind} '{key}' in the pricing catalog."
+                )
+            for resource_class, value in resources.items():
+                totals[resource_class] += amount * value
+
+    return {
+        resource_class: amount for resource_class, amount in totals.items() if amount
+    }
+
+
+@tracing.traced
+def price_lease(lease):
+    """Returns the lease with resource_requests priced from its reservations.
+
+    Leases that already have resource_requests are returned unchanged, unless
+    PRICING_ALWAYS is set.
+    """
+    pricing_always = getattr(settings, "PRICING_ALWAYS", PRICING_ALWAYS)
+    if lease.resource_requests is not None and not pricing_always:
+        return lease
+    resources = price_reservations(lease.reservations, get_catalog())
+    if lease.resource_requests is not None and (
+        lease.resource_requests.resources != resources
+    ):
+        LOG.info(
+            f"Charging lease {lease.id} for {resources} in place of the requested "
+            f"{lease.resource_requests.resources}"
+        )
+    return dataclasses.replace(
+        lease, resource_requests=business_objects.ResourceRequest(resources=resources)
+    )
+
+
+def _parse_resources(resources, resource_classes):
+    if not isinstance(resources, dict) or not resources:
+        raise ValueError("no resources given")
+    for resource_class, amount in resources.items():
+        if resource_class not in resource_classes:
+            raise ValueError(f"unknown resource class '{resource_class}'")
+        if (
+            isinstance(amount, bool)
+            or not isinstance(amount, numbers.Real)
+            or amount < 0
+        ):
+            raise ValueError(f"invalid amount '{amount}' of {resource_class}")
+    return resources
+
+
+def parse_catalog(raw_catalog):
+    """Returns the flavors and hosts of a catalog of the form:
+
+    {
+        "flavors": [{"id": "...", "name": "...", "resources": {...}}],
+        "hosts": [{"hypervisor_hostname": "...", "resources": {...}}]
+    }
+
+    Raises CatalogError describing every invalid flavor and host.
+    """
+    if not isinstance(raw_catalog, dict):
+        raise CatalogError(["Catalog must be a mapping of flavors and hosts"])
+    resource_classes = set(models.ResourceClass.objects.values_list("name", flat=True))
+    flavors = {}
+    hosts = {}
+    errors = []
+    for kind, key_field, parsed in (
+        ("flavors", "id", flavors),
+        ("hosts", "hypervisor_hostname", hosts),
+    ):
+        entries = raw_catalog.get(kind) or []
+        if not isinstance(entries, list):
+            errors.append(f"{kind} must be a list")
+            continue
+        for index, entry in enumerate(entries, start=1):
+            try:
+                if not isinstance(entry, dict) or not entry.get(key_field):
+                    raise ValueError(f"missing {key_field}")
+                key = str(entry[key_field])
+                if key in parsed:
+                    raise ValueError(f"duplicate {key_field} '{key}'")
+                parsed[key] = (
+                    str(entry.get("name") or ""),
+                    _parse_resources(entry.get("resources"), resource_classes),
+                )
+            except ValueError as e:
+                errors.append(f"{kind} {index}: {e}")
+    if errors:
+        raise CatalogError(errors)
+    return flavors, hosts
+
+
+@transaction.atomic
+def refresh_catalog(flavors, hosts):
+    """Replaces the catalog with the given flavors and hosts.
+
+    Takes the output of parse_catalog, and returns the new catalog version.
+    """
+    models.Flavor.objects.exclude(flavor_id__in=flavors.keys()).delete()
+    models.Flavor.objects.bulk_create(
+        [
+            models.Flavor(flavor_id=flavor_id, name=name, resources=resources)
+            for flavor_id, (name, resources) in flavors.items()
+        ],
+        update_conflicts=True,
+        unique_fields=["flavor_id"],
+        update_fields=["name", "resources"],
+    )
+    models.Host.objects.exclude(hypervisor_hostname__in=hosts.keys()).delete()
+    models.Host.objects.bulk_create(
+        [
+            models.Host(hypervisor_hostname=hostname, resources=resources)
+            for hostname, (_, resources) in hosts.items()
+        ],
+        update_conflicts=True,
+        unique_fields=["hypervisor_hostname"],
+        update_fields=["resources"],
+    )
+    db_utils.bump_versions(CATALOG_VERSION)
+    return db_utils.get_versions([CATALOG_VERSION])[CATALOG_VERSION][0]
@@ -0,0 +1,213 @@
+"""Reconciliation of the credit ledger.
+
+Consumption records aren't linked to the allocation they were charged to,
+so the ledger is checked for each account and resource class: the hours
+spent from the account's allocations (allocated_resource_hours less
+resource_hours) must equal the hours of its consumption records, including
+those that have been archived.
+
+Accounts are split into partitions of consecutive ids, which are checked
+by a pool of processes. Each partition takes a single pass over its
+consumption records.
+"""
+
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+import logging
+import multiprocessing
+
+from django.db import connections, transaction
+from django.db.models import Sum
+
+from coral_credits.api import history, models
+
+LOG = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True, slots=True)
+class Discrepancy:
+    account_id: int
+    account: str
+    resource_class_id: int
+    resource_class: str
+    allocated_hours: int
+    remaining_hours: int
+    consumed_hours: int
+
+    @property
+    def spent_hours(self):
+        return self.allocated_hours - self.remaining_hours
+
+    @property
+    def difference(self):
+        """Hours spent from the allocations that no consumer accounts for."""
+        return self.spent_hours - self.consumed_hours
+
+    def __str__(self) -> str:
+        return (
+            f"{self.resource_class} for account {self.account}: {self.spent_hours} "
+            f"hours spent from the allocations, but {self.consumed_hours} hours "
+            f"consumed ({self.difference:+d})"
+        )
+
+
+def ledger(first_account_id, last_account_id, resource_class_id=None):
+    """Returns the ledger of each account and resource class as Discrepancies.
+
+    Covers the accounts with ids in the given range, and each resource class
+    they have been allocated or have consumed. Makes one aggregate query over
+    the consumption records, two over the far smaller tables of allocation
+    resources and archived hours, and two for the names of the accounts and
+    resource classes.
+    """
+    bounds = (first_account_id, last_account_id)
+    filters = {}
+    if resource_class_id is not None:
+        filters["resource_class_id"] = resource_class_id
+    allocations = {
+        (account_id, resource_class_id): (allocated, remaining)
+        for account_id, resource_class_id, allocated, remaining in (
+            models.CreditAllocationResource.objects.filter(
+                allocation__account__pk__range=bounds,
+                **filters,
+            )
+            .order_by()
+            .values_list("allocation__account_id", "resource_class_id")
+            .annotate(Sum("allocated_resource_hours"), Sum("resource_hours"))
+        )
+    }
+    consumed = Counter()
+    records = (
+        models.ResourceConsumptionRecord.objects.filter(
+            consumer__resource_provider_account__account__pk__range=bounds, **filters
+        )
+        .order_by()
+        .values_list(
+            "consumer__resource_provider_account__account_id", "resource_class_id"
+        )
+        .annotate(Sum("resource_hours"))
+    )
+    archived = models.ArchivedResourceHours.objects.filter(
+        account__pk__range=bounds, **filters
+    ).values_list("account_id", "resource_class_id", "resource_hours")
+    for account_id, resource_class_id, hours in (*records, *archived):
+        consumed[(account_id, resource_class_id)] += hours
+
+    # Hours can be consumed from allocation resources that were since deleted
+    keys = allocations.keys() | consumed.keys()
+    if not keys:
+        return []
+    accounts = dict(
+        models.CreditAccount.objects.filter(pk__range=bounds).values_list("pk", "name")
+    )
+    resource_classes = dict(
+        models.ResourceClass.objects.filter(
+            pk__in={resource_class_id for _, resource_class_id in keys}
+        ).values_list("pk", "name")
+    )
+    entries = []
+    for account_id, resource_class_id in sorted(keys):
+        allocated, remaining = allocations.get((account_id, resource_class_id), (0, 0))
+        entries.append(
+            Discrepancy(
+                account_id=account_id,
+                account=accounts[account_id],
+                resource_class_id=resource_class_id,
+                resource_class=resource_classes[resource_class_id],
+                allocated_hours=allocated,
+                remaining_hours=remaining,
+                consumed_hours=consumed[(account_id, resource_class_id)],
+            )
+        )
+    return entries
+
+
+def partitions(count):
+    """Splits the accounts into up to count ranges of consecutive ids."""
+    account_ids = list(
+        models.CreditAccount.objects.order_by("pk").values_list("pk", flat=True)
+    )
+    size = -(-len(account_ids) // max(count, 1))
+    return [
+        (account_ids[i], account_ids[min(i + size, len(account_ids)) - 1])
+        for i in range(0, len(account_ids), size or 1)
+    ]
+
+
+def _find_discrepancies(bounds):
+    try:
+        return [entry for entry in ledger(*bounds) if entry.difference]
+    finally:
+        # Each worker has its own connection, so it closes it when done
+        connections.close_all()
+
+
+def find_discrepancies(processes=1, partition_count=None):
+    """Returns the accounts and resource classes whose ledgers don't balance.
+
+    With more than one process, the partitions are checked by a pool of
+    processes forked from this one.
+    """
+    bounds = partitions(partition_count or processes * 4)
+    if processes <= 1:
+        results = [
+            entry
+            for partition in bounds
+            for entry in ledger(*partition)
+            if entry.difference
+        ]
+    else:
+        # Forked workers must not share this process's database connections
+        connections.close_all()
+        with ProcessPoolExecutor(
+            processes, mp_context=multiprocessing.get_context("fork")
+        ) as pool:
+            results = [
+                entry
+                for partition in pool.map(_find_discrepancies, bounds)
+                for entry in partition
+            ]
+    LOG.info(
+        f"Reconciled {len(bounds)} partitions of accounts, "
+        f"finding {len(results)} discrepancies"
+    )
+    return sorted(results, key=lambda d: (d.account_id, d.resource_class_id))
+
+
+@transaction.atomic
+def repair(discrepancy):
+    """Adjusts the latest allocation so the ledger balances.
+
+    The ledger is checked again with the allocation resources locked, and
+    the number of hours added to the allocation is returned. An account with
+    no allocation of the resource class is left to be fixed by hand.
+    """
+    resources = list(
+        models.CreditAllocationResource.objects.select_for_update()
+        .filter(
+            allocation__account_id=discrepancy.account_id,
+            resource_class_id=discrepancy.resource_class_id,
+        )
+        .order_by("-allocation__start", "-pk")
+    )
+    (current,) = ledger(
+        discrepancy.account_id,
+        discrepancy.account_id,
+        discrepancy.resource_class_id,
+    ) or [None]
+    if current is None or not current.difference:
+        return 0
+    if not resources:
+        LOG.warning(f"Can't repair {current}, as there is no allocation to adjust")
+        return 0
+    latest = resources[0]
+    latest.resource_hours += current.difference
+    latest.save(update_fields=["resource_hours"])
+    history.record(
+        discrepancy.account_id,
+        {discrepancy.resource_class_id: current.difference},
+        models.CreditTransaction.REPAIR,
+    )
+    LOG.warning(f"Repaired {current} by adding {current.difference} hours")
+    return current.difference
@@ -0,0 +1,118 @@
+"""Replay of consumer commits retried by Blazar.
+
+Blazar retries enforcement calls that time out, even when the first call was
+committed. The response to each commit is recorded against a key made from
+the lease id, the endpoint and a hash of the payload, so a retry gets the
+same response without running the credit checks again.
+
+Only successful commits are recorded. A commit that was denied, e.g. for
+insufficient credits, is checked again when it is retried, in case the
+account has been topped up since.
+
+Records expire after CONSUMER_REPLAY_TTL seconds, and only the latest
+CONSUMER_REPLAY_MAX_RECORDS are kept. Both can be overridden in the Django
+settings.
+"""
+
+from datetime import timedelta
+import hashlib
+import json
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from coral_credits.api import models
+
+CONSUMER_REPLAY_TTL = 24 * 60 * 60
+CONSUMER_REPLAY_MAX_RECORDS = 10000
+
+
+def _ttl():
+    return timedelta(
+        seconds=getattr(settings, "CONSUMER_REPLAY_TTL", CONSUMER_REPLAY_TTL)
+    )
+
+
+def get_replay_key(endpoint, data):
+    """Returns the replay key for a request, or None if it has no lease id."""
+    try:
+        lease_id = data["lease"]["id"]
+    except (KeyError, TypeError):
+        return None
+    payload = json.dumps(data, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(
+        "\n".join((str(lease_id), endpoint, payload)).encode()
+    ).hexdigest()
+
+
+def claim_replay(key):
+    """Claims a key for a commit, returning any response recorded for it.
+
+    A pending record is inserted for the key, and locked, so identical
+    retries that arrive together wait for the first to finish rather than
+    running the commit twice. Must be called in a transaction, which the
+    caller ends with either record_replay or release_replay.
+
+    Returns the recorded (status code, response), or None if the commit
+    should run.
+    """
+    models.ConsumerCommitReplay.objects.bulk_create(
+        [models.ConsumerCommitReplay(key=key, created=timezone.now())],
+        ignore_conflicts=True,
+    )
+    claimed = models.ConsumerCommitReplay.objects.select_for_update().get(key=key)
+    if claimed.status_code is None or claimed.created < timezone.now() - _ttl():
+        return None
+    return claimed.status_code, claimed.response
+
+
+def get_replay(key):
+    """Returns the recorded (status code, response) for a key, or None."""
+    return (
+        models.ConsumerCommitReplay.objects.filter(
+            key=key, status_code__isnull=False, created__gte=timezone.now() - _ttl()
+        )
+        .values_list("status_code", "response")
+        .first()
+    )
+
+
+def record_replay(key, status_code, response):
+    """Records the response for a key, and removes old records.
+
+    Only a pending or expired record is replaced, so a response that has
+    already been recorded is never overwritten.
+    """
+    now = timezone.now()
+    replaced = models.ConsumerCommitReplay.objects.filter(
+        Q(status_code__isnull=True) | Q(created__lt=now - _ttl()), key=key
+    ).update(status_code=status_code, response=response, created=now)
+    if not replaced:
+        models.ConsumerCommitReplay.objects.bulk_create(
+            [
+                models.ConsumerCommitReplay(
+                    key=key, status_code=status_code, response=response, created=now
+                )
+            ],
+            ignore_conflicts=True,
+        )
+    max_records = getattr(
+        settings, "CONSUMER_REPLAY_MAX_RECORDS", CONSUMER_REPLAY_MAX_RECORDS
+    )
+    filters = Q(created__lt=now - _ttl())
+    pk = (
+        models.ConsumerCommitReplay.objects.filter(key=key)
+        .values_list("pk", flat=True)
+        .first()
+    )
+    if pk is not None:
+        filters |= Q(pk__lte=pk - max_records)
+    models.ConsumerCommitReplay.objects.filter(filters).delete()
+
+
+def release_replay(key):
+    """Removes the pending record for a commit that wasn't recorded."""
+    models.ConsumerCommitReplay.objects.filter(
+        key=key, status_code__isnull=True
+    ).delete()
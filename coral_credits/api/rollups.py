@@ -0,0 +1,257 @@
+"""Hourly and daily usage rollups for dashboards.
+
+Each run only looks at the consumers modified since the last run. The state
+of each consumer when it was last rolled up is kept in UsageRollupConsumer,
+so a change to a consumer is applied to the rollups as the difference between
+its old and new reservations. Archiving consumers leaves their rollups alone.
+"""
+
+from collections import defaultdict
+from datetime import timedelta
+from datetime import timezone as dt_timezone
+import functools
+import logging
+import operator
+
+from django.db import transaction
+from django.db.models import Max, Q
+
+from coral_credits.api import models
+
+LOG = logging.getLogger(__name__)
+
+PERIODS = {
+    models.UsageRollup.HOUR: timedelta(hours=1),
+    models.UsageRollup.DAY: timedelta(days=1),
+}
+
+# Consumers modified shortly before the last one rolled up are looked at
+# again, in case the transaction that modified them had not committed yet.
+# Rolling up an unchanged consumer changes nothing.
+WATERMARK_LAG = timedelta(minutes=10)
+
+# Smaller changes are float rounding from spreading hours over periods
+EPSILON = 1e-6
+
+# Number of rollups looked up and locked by each query
+LOCK_BATCH_SIZE = 500
+
+
+def period_start(when, period):
+    """Returns the start of the hour or day (in UTC) that contains when."""
+    when = when.astimezone(dt_timezone.utc).replace(minute=0, second=0, microsecond=0)
+    if period == models.UsageRollup.DAY:
+        when = when.replace(hour=0)
+    return when
+
+
+def _reserved_hours(snapshot):
+    """Spreads each resource class's hours over the periods the consumer spans."""
+    resource_provider_account_id, start, end, resources = snapshot
+    duration = (end - start).total_seconds()
+    if resource_provider_account_id is None or duration <= 0:
+        return
+    for period, length in PERIODS.items():
+        bucket = period_start(start, period)
+        while bucket < end:
+            share = (
+                min(end, bucket + length) - max(start, bucket)
+            ).total_seconds() / duration
+            for resource_class_id, resource_hours in resources.items():
+                yield (
+                    period,
+                    bucket,
+                    resource_provider_account_id,
+                    resource_class_id,
+                ), resource_hours * share
+            bucket += length
+
+
+def _consumed_hours(snapshot, charged_at):
+    """Puts each resource class's hours in the periods they were charged in."""
+    resource_provider_account_id, _, _, resources = snapshot
+    if resource_provider_account_id is None:
+        return
+    for period in PERIODS:
+        bucket = period_start(charged_at, period)
+        for resource_class_id, resource_hours in resources.items():
+            yield (
+                period,
+                bucket,
+                resource_provider_account_id,
+                resource_class_id,
+            ), resource_hours
+
+
+def rollup_usage(batch_size=1000):
+    """Adds the consumers changed since the last run to the usage rollups.
+
+    Returns the number of consumers whose changes were rolled up.
+    """
+    watermark = models.UsageRollupConsumer.objects.aggregate(Max("modified"))[
+        "modified__max"
+    ]
+    consumers = models.Consumer.objects.order_by("modified", "pk")
+    if watermark is not None:
+        consumers = consumers.filter(modified__gt=watermark - WATERMARK_LAG)
+
+    rolled_up = 0
+    # Walk the consumers in batches keyed on (modified, pk), so only one
+    # batch of ids is held at a time
+    batch = list(consumers.values_list("modified", "pk")[:batch_size])
+    while batch:
+        rolled_up += rollup_consumer_batch([pk for _, pk in batch])
+        if len(batch) < batch_size:
+            break
+        modified, pk = batch[-1]
+        batch = list(
+            consumers.filter(
+                Q(modified__gt=modified) | Q(modified=modified, pk__gt=pk)
+            ).values_list("modified", "pk")[:batch_size]
+        )
+    LOG.info(f"Rolled up changes to {rolled_up} consumers.")
+    return rolled_up
+
+
+@transaction.atomic
+def rollup_consumer_batch(consumer_ids):
+    """Applies changes to the given consumers to the usage rollups.
+
+    Returns the number of consumers that had changed.
+    """
+    marks = {
+        mark.consumer_id: mark
+        for mark in models.UsageRollupConsumer.objects.select_for_update().filter(
+            consumer_id__in=consumer_ids
+        )
+    }
+    deltas = defaultdict(lambda: [0.0, 0.0])
+    new_marks = []
+    rolled_up = 0
+    for consumer in models.Consumer.objects.filter(
+        pk__in=consumer_ids
+    ).prefetch_related("resources"):
+        new = (
+            consumer.resource_provider_account_id,
+            consumer.start,
+            consumer.end,
+            {
+                record.resource_class_id: record.resource_hours
+                for record in consumer.resources.all()
+            },
+        )
+        new_marks.append(
+            models.UsageRollupConsumer(
+                consumer=consumer,
+                resource_provider_account_id=new[0],
+                start=consumer.start,
+                end=consumer.end,
+                resources=new[3],
+                modified=consumer.modified,
+            )
+        )
+
+        mark = marks.get(consumer.pk)
+        if mark is None:
+            old = None
+            charged_at = consumer.created
+        else:
+            old = (
+                mark.resource_provider_account_id,
+                mark.start,
+                mark.end,
+                {int(pk): hours for pk, hours in mark.resources.items()},
+            )
+            charged_at = consumer.modified
+        if new == old:
+            continue
+        rolled_up += 1
+
+        for key, hours in _reserved_hours(new):
+            deltas[key][0] += hours
+        for key, hours in _consumed_hours(new, charged_at):
+            deltas[key][1] += hours
+        if old is not None:
+            for key, hours in _reserved_hours(old):
+                deltas[key][0] -= hours
+            for key, hours in _consumed_hours(old, charged_at):
+                deltas[key][1] -= hours
+
+    _apply_deltas(deltas)
+    models.UsageRollupConsumer.objects.bulk_create(
+        new_marks,
+        update_conflicts=True,
+        unique_fields=["consumer"],
+        update_fields=[
+            "resource_provider_account",
+            "start",
+            "end",
+            "resources",
+            "modified",
+        ],
+    )
+    return rolled_up
+
+
+def _apply_deltas(deltas):
+    """Adds to the reserved and consumed hours of each rollup."""
+    deltas = {
+        key: delta
+        for key, delta in deltas.items()
+        if abs(delta[0]) > EPSILON or abs(delta[1]) > EPSILON
+    }
+    if not deltas:
+        return
+    # Only the rollups being changed are locked
+    keys = list(deltas)
+    existing = {}
+    for start in range(0, len(keys), LOCK_BATCH_SIZE):
+        end = start + LOCK_BATCH_SIZE
+        query = functools.reduce(
+            operator.or_,
+            (
+                Q(
+                    period=period,
+                    start=bucket,
+                    resource_provider_account_id=resource_provider_account_id,
+                    resource_class_id=resource_class_id,
+                )
+                for period, bucket, resource_provider_account_id, resource_class_id in (
+                    keys[start:end]
+                )
+            ),
+        )
+        for rollup in models.UsageRollup.objects.select_for_update().filter(query):
+            existing[
+                (
+                    rollup.period,
+                    rollup.start,
+                    rollup.resource_provider_account_id,
+                    rollup.resource_class_id,
+                )
+            ] = rollup
+
+    updated = []
+    created = []
+    for key, (reserved_hours, consumed_hours) in deltas.items():
+        rollup = existing.get(key)
+        if rollup:
+            rollup.reserved_hours += reserved_hours
+            rollup.consumed_hours += consumed_hours
+            updated.append(rollup)
+        else:
+            period, start, resource_provider_account_id, resource_class_id = key
+            created.append(
+                models.UsageRollup(
+                    period=period,
+                    start=start,
+                    resource_provider_account_id=resource_provider_account_id,
+                    resource_class_id=resource_class_id,
+                    reserved_hours=reserved_hours,
+                    consumed_hours=consumed_hours,
+                )
+            )
+    models.UsageRollup.objects.bulk_update(
+        updated, ["reserved_hours", "consumed_hours"], batch_size=1000
+    )
+    models.UsageRollup.objects.bulk_create(created, batch_size=1000)
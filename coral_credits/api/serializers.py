@@ -2,18 +2,9 @@ from typing import Type
 
 from rest_framework import serializers
 
-from coral_credits.api import models
-from coral_credits.api.business_objects import (
-    Allocation,
-    BaseReservation,
-    ConsumerRequest,
-    Context,
-    FlavorReservation,
-    Lease,
-    PhysicalReservation,
-    ResourceRequest,
-    VirtualReservation,
-)
+from coral_credits.api import decoders, models
+from coral_credits.api.business_objects import ResourceRequest
+from coral_credits.api.rollups import PERIODS
 
 
 class ResourceClassSerializer(serializers.HyperlinkedModelSerializer):
@@ -58,6 +49,13 @@ class CreditAllocationResourceSerializer(serializers.ModelSerializer):
         return representation
 
 
+class BulkResourceAllocationSerializer(serializers.Serializer):
+    allocation = serializers.IntegerField()
+    resources = serializers.DictField(
+        child=serializers.IntegerField(min_value=0), allow_empty=False
+    )
+
+
 class CreditAllocationSerializer(serializers.HyperlinkedModelSerializer):
     class Meta:
         model = models.CreditAllocation
@@ -88,6 +86,73 @@ class Consumer(serializers.ModelSerializer):
         ]
 
 
+class UsageRollupSerializer(serializers.ModelSerializer):
+    project_id = serializers.UUIDField(source="resource_provider_account.project_id")
+    provider = serializers.CharField(source="resource_provider_account.provider.name")
+    resource_class = serializers.CharField(source="resource_class.name")
+
+    class Meta:
+        model = models.UsageRollup
+        fields = [
+            "start",
+            "project_id",
+            "provider",
+            "resource_class",
+            "reserved_hours",
+            "consumed_hours",
+        ]
+
+
+class UsageQuerySerializer(serializers.Serializer):
+    MAX_PERIODS = 1000
+
+    period = serializers.ChoiceField(
+        choices=models.UsageRollup.PERIOD_CHOICES, default=models.UsageRollup.HOUR
+    )
+    start = serializers.DateTimeField()
+    end = serializers.DateTimeField()
+    account = serializers.IntegerField(required=False)
+    project_id = serializers.UUIDField(required=False)
+    resource_class = serializers.CharField(required=False)
+
+    def validate(self, data):
+        if data["start"] >= data["end"]:
+            raise serializers.ValidationError("start must be before end")
+        if data["end"] - data["start"] > self.MAX_PERIODS * PERIODS[data["period"]]:
+            raise serializers.ValidationError(
+                f"Cannot query more than {self.MAX_PERIODS} {data['period']}s at once"
+            )
+        return data
+
+
+class BalancesQuerySerializer(serializers.Serializer):
+    MAX_ACCOUNTS = 1000
+
+    accounts = serializers.ListField(
+        child=serializers.IntegerField(),
+        required=False,
+        max_length=MAX_ACCOUNTS,
+    )
+    project_ids = serializers.ListField(
+        child=serializers.UUIDField(),
+        required=False,
+        max_length=MAX_ACCOUNTS,
+    )
+
+    def validate(self, data):
+        if not data.get("accounts") and not data.get("project_ids"):
+            raise serializers.ValidationError("No accounts or project_ids given")
+        return data
+
+
+class BalanceQuerySerializer(serializers.Serializer):
+    at = serializers.DateTimeField(required=False)
+
+
+class CapacityQuerySerializer(UsageQuerySerializer):
+    provider = serializers.CharField(required=False)
+
+
 class ResourceRequestSerializer(serializers.Serializer):
     def to_representation(self, instance):
         return instance.resources
@@ -104,28 +169,11 @@ class AllocationSerializer(serializers.Serializer):
     hypervisor_hostname = serializers.CharField()
     extra = serializers.DictField(required=False, allow_null=True)
 
-    def create(self, validated_data):
-        return Allocation(
-            id=validated_data["id"],
-            hypervisor_hostname=validated_data["hypervisor_hostname"],
-            extra=validated_data.get("extra", {}),
-        )
-
 
 class BaseReservationSerializer(serializers.Serializer):
     resource_type = serializers.CharField()
     allocations = serializers.ListField(child=AllocationSerializer(), required=False)
 
-    def create(self, validated_data):
-        allocations = [
-            AllocationSerializer().create(alloc)
-            for alloc in validated_data.pop("allocations", [])
-        ]
-        return ReservationFactory.get_instance(
-            **validated_data,
-            allocations=allocations,
-        )
-
 
 class PhysicalReservationSerializer(BaseReservationSerializer):
     min = serializers.IntegerField()
@@ -162,22 +210,6 @@ class ReservationFactory:
             raise serializers.ValidationError(f"Unknown resource_type: {resource_type}")
         return serializer
 
-    @staticmethod
-    def get_instance(**kwargs) -> BaseReservation:
-        resource_type = kwargs.get("resource_type")
-
-        reservation_classes = {
-            "physical:host": PhysicalReservation,
-            "flavor:instance": FlavorReservation,
-            "virtual:instance": VirtualReservation,
-        }
-
-        reservation_class = reservation_classes.get(resource_type)
-        if not reservation_class:
-            raise ValueError(f"Unknown resource_type: {resource_type}")
-
-        return reservation_class(**kwargs)
-
 
 class ReservationField(serializers.Field):
     def to_internal_value(self, data):
@@ -211,30 +243,7 @@ class LeaseSerializer(serializers.Serializer):
     end_date = serializers.DateTimeField()
     before_end_date = serializers.DateTimeField(required=False, allow_null=True)
     reservations = serializers.ListField(child=ReservationField())
-    resource_requests = ResourceRequestSerializer()
-
-    def create(self, validated_data):
-        reservations = []
-        for res_data in validated_data.pop("reservations"):
-            resource_type = res_data.get("resource_type")
-            serializer_class = ReservationFactory.get_serializer(resource_type)
-            serializer = serializer_class(data=res_data)
-            if serializer.is_valid():
-                reservations.append(serializer.create(serializer.validated_data))
-            else:
-                raise serializers.ValidationError(serializer.errors)
-
-        resource_requests = ResourceRequestSerializer().create(
-            validated_data.pop("resource_requests")
-        )
-        return Lease(
-            id=validated_data["id"],
-            name=validated_data["name"],
-            start_date=validated_data["start_date"],
-            end_date=validated_data["end_date"],
-            reservations=reservations,
-            resource_requests=resource_requests,
-        )
+    resource_requests = ResourceRequestSerializer(required=False)
 
 
 class ContextSerializer(serializers.Serializer):
@@ -243,18 +252,17 @@ class ContextSerializer(serializers.Serializer):
     auth_url = serializers.URLField()
     region_name = serializers.CharField(required=False, allow_null=True)
 
-    def create(self, validated_data):
-        return Context(
-            user_id=validated_data["user_id"],
-            project_id=validated_data["project_id"],
-            auth_url=validated_data["auth_url"],
-            region_name=validated_data["region_name"],
-        )
-
 
 class ConsumerRequestSerializer(serializers.Serializer):
+    """Describes a Blazar enforcement request.
+
+    The nested serializers document the request format, while validation is
+    done in a single pass by decoders.decode_consumer_request.
+    """
+
     def __init__(self, *args, current_lease_required=False, **kwargs):
         super().__init__(*args, **kwargs)
+        self.current_lease_required = current_lease_required
         # Optional field current_lease
         self.fields["current_lease"] = LeaseSerializer(
             required=current_lease_required, allow_null=(not current_lease_required)
@@ -264,21 +272,9 @@ class ConsumerRequestSerializer(serializers.Serializer):
     lease = LeaseSerializer()
 
     def create(self, validated_data):
-        context = ContextSerializer().create(validated_data["context"])
-        lease = LeaseSerializer().create(validated_data["lease"])
-        current_lease = (
-            LeaseSerializer().create(validated_data["current_lease"])
-            if "current_lease" in validated_data
-            else None
-        )
-        return ConsumerRequest(
-            context=context, lease=lease, current_lease=current_lease
-        )
+        return validated_data
 
     def to_internal_value(self, data):
-        # Custom validation or processing can be added here if needed
-        return super().to_internal_value(data)
-
-    def to_representation(self, instance):
-        # Custom representation logic can be added here if needed
-        return super().to_representation(instance)
+        return decoders.decode_consumer_request(
+            data, current_lease_required=self.current_lease_required
+        )
@@ -0,0 +1,109 @@
+"""Keeps the version counters up to date as models change.
+
+Also records the allocation resources that are deleted in the history of
+their account's balances, and marks consumers as modified when their
+consumption records change, so usage rollups pick up the change.
+
+Bulk operations don't send signals, so code using them must call
+db_utils.bump_versions itself.
+"""
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from coral_credits.api import db_utils, history, models
+
+version_bumps_disabled = ContextVar("version_bumps_disabled", default=False)
+
+
+@contextmanager
+def disable_version_bumps():
+    """Stops signals bumping version counters.
+
+    Used by callers that bump the counters once for a whole batch of changes.
+    """
+    token = version_bumps_disabled.set(True)
+    try:
+        yield
+    finally:
+        version_bumps_disabled.reset(token)
+
+
+def _bump(*keys):
+    if not version_bumps_disabled.get():
+        db_utils.bump_versions(*keys)
+
+
+def _bump_account(account_id):
+    if account_id is not None:
+        _bump(db_utils.account_version_key(account_id))
+
+
+@receiver(post_save, sender=models.ResourceClass)
+@receiver(post_delete, sender=models.ResourceClass)
+def resource_class_changed(sender, instance, **kwargs):
+    _bump(db_utils.RESOURCE_CLASS_VERSION)
+
+
+@receiver(post_save, sender=models.ResourceProvider)
+@receiver(post_delete, sender=models.ResourceProvider)
+def resource_provider_changed(sender, instance, **kwargs):
+    _bump(db_utils.RESOURCE_PROVIDER_VERSION)
+
+
+@receiver(post_save, sender=models.CreditAccount)
+@receiver(post_delete, sender=models.CreditAccount)
+def credit_account_changed(sender, instance, **kwargs):
+    _bump_account(instance.pk)
+
+
+@receiver(post_save, sender=models.ResourceProviderAccount)
+@receiver(post_delete, sender=models.ResourceProviderAccount)
+@receiver(post_save, sender=models.CreditAllocation)
+@receiver(post_delete, sender=models.CreditAllocation)
+def account_member_changed(sender, instance, **kwargs):
+    _bump_account(instance.account_id)
+
+
+@receiver(post_save, sender=models.CreditAllocationResource)
+@receiver(post_delete, sender=models.CreditAllocationResource)
+def credit_allocation_resource_changed(sender, instance, **kwargs):
+    if version_bumps_disabled.get():
+        return
+    _bump_account(instance.allocation.account_id)
+
+
+@receiver(post_delete, sender=models.CreditAllocationResource)
+def credit_allocation_resource_deleted(sender, instance, **kwargs):
+    history.record(
+        instance.allocation.account_id,
+        {instance.resource_class_id: -instance.resource_hours},
+        models.CreditTransaction.ALLOCATION,
+    )
+
+
+@receiver(post_save, sender=models.Consumer)
+@receiver(post_delete, sender=models.Consumer)
+def consumer_changed(sender, instance, **kwargs):
+    if version_bumps_disabled.get():
+        return
+    if instance.resource_provider_account_id is not None:
+        _bump_account(instance.resource_provider_account.account_id)
+
+
+@receiver(post_save, sender=models.ResourceConsumptionRecord)
+@receiver(post_delete, sender=models.ResourceConsumptionRecord)
+def resource_consumption_record_changed(sender, instance, **kwargs):
+    if version_bumps_disabled.get():
+        return
+    # Usage rollups only look at the consumers modified since they last ran
+    models.Consumer.objects.filter(pk=instance.consumer_id).update(
+        modified=timezone.now()
+    )
+    consumer = instance.consumer
+    if consumer.resource_provider_account_id is not None:
+        _bump_account(consumer.resource_provider_account.account_id)
@@ -0,0 +1,220 @@
+from datetime import timedelta
+import json
+import tracemalloc
+import uuid
+
+from django.urls import reverse
+import pytest
+from rest_framework import status
+
+import coral_credits.api.models as models
+from coral_credits.api.tests.consumer_tests import consumer_create_request
+
+
+@pytest.fixture
+def account_summary_url(
+    resource_classes,
+    credit_allocation,
+    create_credit_allocation_resources,
+):
+    create_credit_allocation_resources(
+        credit_allocation,
+        resource_classes,
+        {"VCPU": 96000, "MEMORY_MB": 240000, "DISK_GB": 84000},
+    )
+    return reverse("creditaccount-detail", kwargs={"pk": credit_allocation.account.pk})
+
+
+@pytest.fixture
+def create_consumers(resource_provider_account, resource_classes, request):
+    def _create_consumers(count):
+        start = request.config.START_DATE
+        consumers = models.Consumer.objects.bulk_create(
+            models.Consumer(
+                consumer_ref=f"lease {i}",
+                consumer_uuid=uuid.uuid4(),
+                resource_provider_account=resource_provider_account,
+                user_ref=request.config.USER_REF,
+                start=start,
+                end=start + timedelta(hours=1 + i),
+            )
+            for i in range(count)
+        )
+        models.ResourceConsumptionRecord.objects.bulk_create(
+            models.ResourceConsumptionRecord(
+                consumer=consumer,
+                resource_class=resource_class,
+                resource_hours=1 + i,
+            )
+            for i, consumer in enumerate(consumers)
+            for resource_class in resource_classes
+        )
+
+    return _create_consumers
+
+
+def get_streamed(api_client, url):
+    response = api_client.get(url, secure=True)
+    assert response.status_code == status.HTTP_200_OK
+    assert response.streaming
+    return response, b"".join(response.streaming_content)
+
+
+@pytest.mark.django_db
+def test_streamed_account_summary(
+    settings, api_client, account_summary_url, create_consumers
+):
+    create_consumers(5)
+    response = api_client.get(account_summary_url, secure=True)
+    assert not response.streaming
+    summary = response.json()
+    assert len(summary["consumers"]) == 5
+    vcpu = summary["allocations"][0]["resources"][0]
+    assert vcpu["resource_hours_remaining"] == 96000 - (1 + 2 + 3 + 4 + 5)
+
+    settings.ACCOUNT_SUMMARY_STREAM_THRESHOLD = 0
+    for chunk_size in (2, 5):
+        settings.ACCOUNT_SUMMARY_CHUNK_SIZE = chunk_size
+        streamed, content = get_streamed(api_client, account_summary_url)
+        assert json.loads(content) == summary
+        assert streamed["ETag"] == response["ETag"]
+
+
+@pytest.mark.django_db
+def test_streamed_account_summary_no_consumers(
+    settings, api_client, account_summary_url
+):
+    settings.ACCOUNT_SUMMARY_STREAM_THRESHOLD = -1
+
+    _, content = get_streamed(api_client, account_summary_url)
+
+    assert json.loads(content)["consumers"] == []
+
+
+def peak_memory(api_client, url):
+    tracemalloc.start()
+    try:
+        response = api_client.get(url, secure=True)
+        for _ in response.streaming_content:
+            pass
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+@pytest.mark.django_db
+def test_streamed_account_summary_memory(
+    settings, api_client, account_summary_url, create_consumers
+):
+    settings.ACCOUNT_SUMMARY_STREAM_THRESHOLD = 0
+    settings.ACCOUNT_SUMMARY_CHUNK_SIZE = 50
+    create_consumers(100)
+    get_streamed(api_client, account_summary_url)
+    small = peak_memory(api_client, account_summary_url)
+
+    create_consumers(300)
+    large = peak_memory(api_client, account_summary_url)
+
+    # Four times the consumers in about the same memory
+    assert large < small * 1.5, (small, large)
+
+
+@pytest.mark.django_db
+def test_account_balances(
+    account_summary_url, create_consumers, resource_provider_account, api_client
+):
+    create_consumers(2)
+    # Consumers that have ended are no longer reserved
+    ended = models.Consumer.objects.first()
+    ended.end = ended.start - timedelta(hours=1)
+    ended.save()
+    other = models.CreditAccount.objects.create(email="other@case.com", name="other")
+    url = reverse("creditaccount-balances")
+
+    response = api_client.post(
+        url,
+        {
+            "accounts": [other.pk],
+            "project_ids": [str(resource_provider_account.project_id)],
+        },
+        format="json",
+        secure=True,
+    )
+
+    assert response.status_code == status.HTTP_200_OK, response.content
+    account, unallocated = response.json()
+    assert account["id"] == resource_provider_account.account_id
+    assert account["project_ids"] == [str(resource_provider_account.project_id)]
+    assert account["resources"]["VCPU"] == {
+        "allocated": 96000,
+        "remaining": 96000,
+        "reserved": 2,
+    }
+    assert unallocated == {
+        "id": other.pk,
+        "name": "other",
+        "project_ids": [],
+        "resources": {},
+    }
+
+    response = api_client.get(url, {"accounts": [other.pk]}, secure=True)
+    assert [a["id"] for a in response.json()] == [other.pk]
+
+    response = api_client.post(url, {}, format="json", secure=True)
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+@pytest.mark.django_db
+def test_account_balances_queries_constant(
+    account_summary_url, create_consumers, api_client, django_assert_num_queries
+):
+    create_consumers(5)
+    accounts = [
+        models.CreditAccount.objects.create(email=f"{i}@case.com", name=str(i))
+        for i in range(10)
+    ]
+    url = reverse("creditaccount-balances")
+
+    for count in (1, len(accounts)):
+        # Authentication, then the accounts, projects, allocations and consumers
+        with django_assert_num_queries(5):
+            response = api_client.post(
+                url,
+                {"accounts": [a.pk for a in accounts[:count]]},
+                format="json",
+                secure=True,
+            )
+        assert len(response.json()) == count
+
+
+@pytest.mark.django_db
+def test_account_balances_after_spending(
+    account_summary_url, resource_provider_account, api_client, flavor_request_data
+):
+    consumer_create_request(api_client, flavor_request_data, status.HTTP_204_NO_CONTENT)
+    account_id = resource_provider_account.account_id
+    consumed = dict(
+        models.ResourceConsumptionRecord.objects.values_list(
+            "resource_class__name", "resource_hours"
+        )
+    )
+
+    (balances,) = api_client.get(
+        reverse("creditaccount-balances"), {"accounts": [account_id]}, secure=True
+    ).json()
+    balance = api_client.get(
+        reverse("creditaccount-balance", kwargs={"pk": account_id}), secure=True
+    ).json()
+
+    # Each resource class is charged once
+    assert {
+        name: resources["remaining"]
+        for name, resources in balances["resources"].items()
+    } == {
+        name: resources["allocated"] - consumed[name]
+        for name, resources in balances["resources"].items()
+    }
+    assert {
+        name: resources["remaining"]
+        for name, resources in balances["resources"].items()
+    } == balance["resources"]
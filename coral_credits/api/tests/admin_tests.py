@@ -0,0 +1,174 @@
+from datetime import timedelta
+import uuid
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+import pytest
+
+from coral_credits.api import admin, history
+import coral_credits.api.models as models
+
+CHANGELISTS = [
+    "admin:api_consumer_changelist",
+    "admin:api_resourceconsumptionrecord_changelist",
+    "admin:api_creditallocationresource_changelist",
+    "admin:api_creditallocation_changelist",
+    "admin:api_resourceprovideraccount_changelist",
+]
+
+
+@pytest.fixture
+def create_consumers(resource_provider_account, resource_classes, request):
+    def _create_consumers(count):
+        start = request.config.START_DATE
+        consumers = models.Consumer.objects.bulk_create(
+            models.Consumer(
+                consumer_ref=f"lease {i}",
+                consumer_uuid=uuid.uuid4(),
+                resource_provider_account=resource_provider_account,
+                user_ref=request.config.USER_REF,
+                start=start,
+                end=start + timedelta(hours=1 + i),
+            )
+            for i in range(count)
+        )
+        models.ResourceConsumptionRecord.objects.bulk_create(
+            models.ResourceConsumptionRecord(
+                consumer=consumer, resource_class=resource_class, resource_hours=1
+            )
+            for consumer in consumers
+            for resource_class in resource_classes
+        )
+        return consumers
+
+    return _create_consumers
+
+
+def changelist_queries(admin_client, url_name, **params):
+    with CaptureQueriesContext(connection) as queries:
+        response = admin_client.get(reverse(url_name), params)
+    assert response.status_code == 200
+    return len(queries)
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("url_name", CHANGELISTS)
+def test_changelist_queries_constant(
+    admin_client,
+    create_consumers,
+    credit_allocation,
+    create_credit_allocation_resources,
+    resource_classes,
+    url_name,
+):
+    create_credit_allocation_resources(
+        credit_allocation, resource_classes, {"VCPU": 1, "MEMORY_MB": 1, "DISK_GB": 1}
+    )
+    create_consumers(2)
+    small = changelist_queries(admin_client, url_name)
+
+    create_consumers(10)
+    large = changelist_queries(admin_client, url_name)
+
+    assert large == small
+
+
+def search(admin_client, url_name, term):
+    response = admin_client.get(reverse(url_name), {"q": term})
+    assert response.status_code == 200
+    return list(response.context["cl"].result_list)
+
+
+@pytest.mark.django_db
+def test_consumer_search(admin_client, create_consumers, resource_provider_account):
+    consumers = create_consumers(12)
+    url_name = "admin:api_consumer_changelist"
+
+    assert search(admin_client, url_name, str(consumers[3].consumer_uuid)) == [
+        consumers[3]
+    ]
+    assert len(search(admin_client, url_name, "lease 1")) == 3
+    assert search(admin_client, url_name, "other") == []
+    assert len(
+        search(admin_client, url_name, str(resource_provider_account.project_id))
+    ) == len(consumers)
+
+
+@pytest.mark.django_db
+def test_record_search(admin_client, create_consumers, resource_classes):
+    consumers = create_consumers(3)
+
+    records = search(
+        admin_client,
+        "admin:api_resourceconsumptionrecord_changelist",
+        str(consumers[0].consumer_uuid),
+    )
+
+    assert {r.consumer for r in records} == {consumers[0]}
+    assert len(records) == len(resource_classes)
+
+
+@pytest.mark.django_db
+def test_estimated_count(monkeypatch, create_consumers):
+    create_consumers(3)
+    monkeypatch.setattr(admin, "estimated_row_count", lambda model, using: 5000000)
+    consumers = models.Consumer.objects.order_by("pk")
+
+    assert admin.EstimatedCountPaginator(consumers, 50).count == 5000000
+    # Filtered tables are counted
+    filtered = consumers.filter(consumer_ref__startswith="lease")
+    assert admin.EstimatedCountPaginator(filtered, 50).count == 3
+    # As are small tables
+    monkeypatch.setattr(admin, "estimated_row_count", lambda model, using: 10)
+    assert admin.EstimatedCountPaginator(consumers, 50).count == 3
+
+
+@pytest.mark.django_db
+def test_estimated_count_without_statistics(create_consumers):
+    create_consumers(3)
+
+    assert admin.estimated_row_count(models.Consumer, "default") is None
+    paginator = admin.EstimatedCountPaginator(models.Consumer.objects.order_by("pk"), 2)
+    assert paginator.count == 3
+
+
+@pytest.mark.django_db
+def test_consumer_change_page(admin_client, create_consumers):
+    (consumer,) = create_consumers(1)
+
+    response = admin_client.get(
+        reverse("admin:api_consumer_change", args=[consumer.pk])
+    )
+
+    assert response.status_code == 200
+    assert len(response.context["inline_admin_formsets"][0].formset.forms) == 3
+
+
+@pytest.mark.django_db
+def test_allocation_resource_edits_recorded(
+    admin_client, account, credit_allocation, resource_classes
+):
+    vcpu = resource_classes[0]
+    add_url = reverse("admin:api_creditallocationresource_add")
+    data = {
+        "allocation": credit_allocation.pk,
+        "resource_class": vcpu.pk,
+        "resource_hours": 10,
+        "allocated_resource_hours": 10,
+    }
+
+    response = admin_client.post(add_url, data)
+    assert response.status_code == 302
+    resource = models.CreditAllocationResource.objects.get()
+    response = admin_client.post(
+        reverse("admin:api_creditallocationresource_change", args=[resource.pk]),
+        {**data, "resource_hours": 4},
+    )
+    assert response.status_code == 302
+
+    assert list(
+        models.CreditTransaction.objects.order_by("pk").values_list("change", "balance")
+    ) == [(10, 10), (-6, 4)]
+    assert history.balance_at(account.pk, timezone.now()) == {"VCPU": 4}
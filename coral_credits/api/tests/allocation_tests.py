@@ -43,3 +43,93 @@ def test_credit_allocation_resource_create_success(
         allocation=credit_allocation
     )
     assert len(total_cars) == len(request_data)
+
+
+@pytest.fixture
+def second_credit_allocation(account, request):
+    return models.CreditAllocation.objects.create(
+        account=account,
+        name="second",
+        start=request.config.END_DATE,
+        end=request.config.END_LATE_DATE,
+    )
+
+
+@pytest.mark.django_db
+def test_credit_allocation_bulk_resources(
+    credit_allocation,
+    second_credit_allocation,
+    resource_classes,
+    api_client,
+    request_data,
+    django_assert_max_num_queries,
+):
+    url = reverse("creditallocation-bulk-resources")
+    bulk_request_data = [
+        {"allocation": credit_allocation.id, "resources": request_data},
+        {"allocation": second_credit_allocation.id, "resources": {"VCPU": 10}},
+    ]
+
+    # The number of queries doesn't depend on the number of items
+    with django_assert_max_num_queries(12):
+        response = api_client.post(url, bulk_request_data, format="json", secure=True)
+
+    assert response.status_code == status.HTTP_201_CREATED, response.content
+    assert [len(item["resources"]) for item in response.json()] == [3, 1]
+    assert models.CreditAllocationResource.objects.count() == 4
+
+
+@pytest.mark.django_db
+def test_credit_allocation_bulk_resources_errors(
+    credit_allocation,
+    second_credit_allocation,
+    create_credit_allocation_resources,
+    resource_classes,
+    api_client,
+    request_data,
+):
+    vcpu, _, _ = create_credit_allocation_resources(
+        credit_allocation, resource_classes, request_data
+    )
+    # Consume some credits
+    vcpu.resource_hours = 20
+    vcpu.save()
+
+    url = reverse("creditallocation-bulk-resources")
+    response = api_client.post(
+        url,
+        [
+            {"allocation": second_credit_allocation.id, "resources": {"VCPU": 10}},
+            {"allocation": 1000, "resources": {"NOT_A_CLASS": 10}},
+        ],
+        format="json",
+        secure=True,
+    )
+
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    errors = response.json()
+    assert errors[0] == {}
+    assert set(errors[1]) == {"allocation", "resources"}
+
+    # Can't allocate fewer hours than have been consumed
+    response = api_client.post(
+        url,
+        [
+            {"allocation": second_credit_allocation.id, "resources": {"VCPU": 10}},
+            {"allocation": credit_allocation.id, "resources": {"VCPU": 10}},
+        ],
+        format="json",
+        secure=True,
+    )
+
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    errors = response.json()
+    assert errors[0] == {}
+    assert list(errors[1]["resources"]) == ["VCPU"]
+
+    # Nothing is changed
+    vcpu.refresh_from_db()
+    assert vcpu.allocated_resource_hours == request_data["VCPU"]
+    assert not models.CreditAllocationResource.objects.filter(
+        allocation=second_credit_allocation
+    ).exists()
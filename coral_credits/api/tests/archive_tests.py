@@ -0,0 +1,94 @@
+from datetime import timedelta
+import uuid
+
+from django.core.management import call_command
+from django.urls import reverse
+from django.utils import timezone
+import pytest
+from rest_framework import status
+
+import coral_credits.api.models as models
+
+
+@pytest.fixture
+def create_consumer(resource_provider_account, resource_classes, request):
+    def _create_consumer(end, resource_hours=24):
+        consumer = models.Consumer.objects.create(
+            consumer_ref="lease",
+            consumer_uuid=uuid.uuid4(),
+            resource_provider_account=resource_provider_account,
+            user_ref=request.config.USER_REF,
+            start=end - timedelta(days=1),
+            end=end,
+        )
+        for resource_class in resource_classes:
+            models.ResourceConsumptionRecord.objects.create(
+                consumer=consumer,
+                resource_class=resource_class,
+                resource_hours=resource_hours,
+            )
+        return consumer
+
+    return _create_consumer
+
+
+def remaining_hours(api_client, account):
+    url = reverse("creditaccount-detail", kwargs={"pk": account.pk})
+    response = api_client.get(url, secure=True)
+    assert response.status_code == status.HTTP_200_OK
+    return {
+        resource["resource_class"]["name"]: resource["resource_hours_remaining"]
+        for allocation in response.json()["allocations"]
+        for resource in allocation["resources"]
+    }
+
+
+@pytest.mark.django_db
+def test_archive_expired_consumers(
+    resource_classes,
+    credit_allocation,
+    create_credit_allocation_resources,
+    create_consumer,
+    api_client,
+):
+    create_credit_allocation_resources(
+        credit_allocation,
+        resource_classes,
+        {"VCPU": 960, "MEMORY_MB": 2400, "DISK_GB": 840},
+    )
+    now = timezone.now()
+    expired = [create_consumer(now - timedelta(days=100)) for _ in range(3)]
+    recent = create_consumer(now - timedelta(days=10))
+    active = create_consumer(now + timedelta(days=1))
+    remaining = remaining_hours(api_client, credit_allocation.account)
+
+    call_command("archive_consumers", retention_days=30, batch_size=2)
+
+    assert set(models.Consumer.objects.values_list("pk", flat=True)) == {
+        recent.pk,
+        active.pk,
+    }
+    assert set(
+        models.ArchivedConsumer.objects.values_list("consumer_uuid", flat=True)
+    ) == {consumer.consumer_uuid for consumer in expired}
+    assert models.ArchivedResourceConsumptionRecord.objects.count() == 9
+    assert models.ResourceConsumptionRecord.objects.count() == 6
+    for total in models.ArchivedResourceHours.objects.all():
+        assert total.account == credit_allocation.account
+        assert total.resource_hours == 3 * 24
+
+    # The account summary is unaffected by archival
+    assert remaining_hours(api_client, credit_allocation.account) == remaining
+
+
+@pytest.mark.django_db
+def test_destroy_allocation_with_active_consumer(
+    credit_allocation, create_consumer, api_client
+):
+    create_consumer(timezone.now() + timedelta(days=1))
+    url = reverse("creditallocation-detail", kwargs={"pk": credit_allocation.pk})
+
+    response = api_client.delete(url, secure=True)
+
+    assert response.status_code == status.HTTP_403_FORBIDDEN
+    assert models.CreditAllocation.objects.filter(pk=credit_allocation.pk).exists()
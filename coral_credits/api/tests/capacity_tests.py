@@ -0,0 +1,110 @@
+from datetime import datetime, timedelta
+from datetime import timezone as dt_timezone
+import uuid
+
+from django.urls import reverse
+import pytest
+from rest_framework import status
+
+from coral_credits.api import capacity
+import coral_credits.api.models as models
+
+START = datetime(2026, 1, 1, tzinfo=dt_timezone.utc)
+
+
+@pytest.fixture
+def create_consumer(resource_provider_account, resource_classes, request):
+    def _create_consumer(start, hours, resource_hours, resource_class=0):
+        consumer = models.Consumer.objects.create(
+            consumer_ref="lease",
+            consumer_uuid=uuid.uuid4(),
+            resource_provider_account=resource_provider_account,
+            user_ref=request.config.USER_REF,
+            start=start,
+            end=start + timedelta(hours=hours),
+        )
+        models.ResourceConsumptionRecord.objects.create(
+            consumer=consumer,
+            resource_class=resource_classes[resource_class],
+            resource_hours=resource_hours,
+        )
+        return consumer
+
+    return _create_consumer
+
+
+def buckets(series, key):
+    return [bucket[key] for bucket in series["buckets"]]
+
+
+@pytest.mark.django_db
+def test_timeline(create_consumer, django_assert_num_queries):
+    # 4 VCPUs from 01:30 to 03:30, and 2 from 02:00 to 06:00
+    create_consumer(START + timedelta(hours=1, minutes=30), 2, 8)
+    create_consumer(START + timedelta(hours=2), 4, 8)
+    # Outside the range
+    create_consumer(START + timedelta(days=1), 1, 100)
+
+    with django_assert_num_queries(1):
+        (series,) = capacity.timeline(
+            START + timedelta(hours=1),
+            START + timedelta(hours=5),
+            models.UsageRollup.HOUR,
+        )
+
+    assert series["provider"] == "Test Provider"
+    assert series["resource_class"] == "VCPU"
+    assert [b.hour for b in buckets(series, "start")] == [1, 2, 3, 4]
+    assert buckets(series, "committed_hours") == [2, 6, 4, 2]
+    assert buckets(series, "peak") == [4, 6, 6, 2]
+
+
+@pytest.mark.django_db
+def test_timeline_clips_windows_to_range(create_consumer):
+    # 1 VCPU for 10 days, of which 2 fall in the range
+    create_consumer(START - timedelta(days=4), 240, 240)
+    create_consumer(START, 24, 48, resource_class=1)
+
+    memory, vcpu = capacity.timeline(
+        START, START + timedelta(days=2), models.UsageRollup.DAY
+    )
+
+    assert vcpu["resource_class"] == "VCPU"
+    assert buckets(vcpu, "committed_hours") == [24, 24]
+    assert memory["resource_class"] == "MEMORY_MB"
+    assert buckets(memory, "committed_hours") == [48, 0]
+    assert buckets(memory, "peak") == [2, 0]
+
+
+@pytest.mark.django_db
+def test_capacity_list(create_consumer, api_client):
+    create_consumer(START, 2, 20)
+    create_consumer(START, 2, 20, resource_class=1)
+
+    url = reverse("capacity-list")
+    response = api_client.get(
+        url,
+        {
+            "period": "hour",
+            "start": START.isoformat(),
+            "end": (START + timedelta(hours=3)).isoformat(),
+            "resource_class": "VCPU",
+            "provider": "Test Provider",
+        },
+        secure=True,
+    )
+
+    assert response.status_code == status.HTTP_200_OK, response.content
+    (series,) = response.json()
+    assert series["resource_class"] == "VCPU"
+    assert [b["start"][11:16] for b in series["buckets"]] == [
+        "00:00",
+        "01:00",
+        "02:00",
+    ]
+    assert buckets(series, "committed_hours") == [10, 10, 0]
+
+    response = api_client.get(
+        url, {"start": START.isoformat(), "end": START.isoformat()}, secure=True
+    )
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
@@ -0,0 +1,68 @@
+from django.urls import reverse
+import pytest
+from rest_framework import status
+
+import coral_credits.api.models as models
+from coral_credits.api.tests.consumer_tests import consumer_create_request
+
+
+def conditional_get(api_client, url, etag, expected_response):
+    response = api_client.get(url, HTTP_IF_NONE_MATCH=etag, secure=True)
+    assert response.status_code == expected_response, (
+        f"Expected {expected_response}. "
+        f"Actual status {response.status_code}. "
+        f"Response text {response.content}"
+    )
+    return response
+
+
+@pytest.mark.django_db
+def test_resource_class_list_not_modified(
+    resource_classes, api_client, django_assert_max_num_queries
+):
+    url = reverse("resourceclass-list")
+    response = api_client.get(url, secure=True)
+    assert response.status_code == status.HTTP_200_OK
+    etag = response["ETag"]
+    assert response["Last-Modified"]
+
+    # Only the token and version counter lookups are needed for a 304
+    with django_assert_max_num_queries(2):
+        conditional_get(api_client, url, etag, status.HTTP_304_NOT_MODIFIED)
+
+    models.ResourceClass.objects.create(name="PCPU")
+
+    response = conditional_get(api_client, url, etag, status.HTTP_200_OK)
+    assert response["ETag"] != etag
+    assert len(response.json()) == 4
+
+
+@pytest.mark.django_db
+def test_account_summary_not_modified(
+    resource_classes,
+    credit_allocation,
+    create_credit_allocation_resources,
+    resource_provider_account,
+    api_client,
+    flavor_request_data,
+):
+    create_credit_allocation_resources(
+        credit_allocation,
+        resource_classes,
+        {"VCPU": 96.0, "MEMORY_MB": 24000.0, "DISK_GB": 840.0},
+    )
+    url = reverse("creditaccount-detail", kwargs={"pk": credit_allocation.account.pk})
+    etag = api_client.get(url, secure=True)["ETag"]
+
+    conditional_get(api_client, url, etag, status.HTTP_304_NOT_MODIFIED)
+
+    # A different account has its own version
+    other = models.CreditAccount.objects.create(email="other@case.com", name="other")
+    conditional_get(api_client, url, etag, status.HTTP_304_NOT_MODIFIED)
+    other_url = reverse("creditaccount-detail", kwargs={"pk": other.pk})
+    conditional_get(api_client, other_url, etag, status.HTTP_200_OK)
+
+    # Spending credits changes the summary
+    consumer_create_request(api_client, flavor_request_data, status.HTTP_204_NO_CONTENT)
+    response = conditional_get(api_client, url, etag, status.HTTP_200_OK)
+    assert len(response.json()["consumers"]) == 1
@@ -8,6 +8,7 @@ import pytest
 from rest_framework.authtoken.models import Token
 from rest_framework.test import APIClient
 
+from coral_credits.api import dry_runs
 import coral_credits.api.models as models
 
 
@@ -16,6 +17,10 @@ def pytest_configure(config):
     config.LEASE_ID = "e96b5a17-ada0-4034-a5ea-34db024b8e04"
     config.PROJECT_ID = "20354d7a-e4fe-47af-8ff6-187bca92f3f9"
     config.USER_REF = "caa8b54a-eb5e-4134-8ae2-a3946a428ec7"
+    set_lease_dates(config)
+
+
+def set_lease_dates(config):
     config.START_DATE = make_aware(datetime.now())
     config.END_DATE = config.START_DATE + timedelta(days=1)
     config.END_EARLY_DATE = config.START_DATE + timedelta(days=0.75)
@@ -24,6 +29,19 @@ def pytest_configure(config):
     config.UPCOMING_START_DATE = config.START_DATE + timedelta(days=0.5)
 
 
+@pytest.fixture(autouse=True)
+def lease_dates(request):
+    """Dates are relative to the start of each test, as some tests expect
+    leases that started at START_DATE to have just started."""
+    set_lease_dates(request.config)
+
+
+@pytest.fixture(autouse=True)
+def clear_dry_runs():
+    """Decisions cached by one test can't be used by the next."""
+    dry_runs.clear()
+
+
 # Get auth token
 @pytest.fixture
 def token():
@@ -1,11 +1,14 @@
+import copy
 import json
 import uuid
 
+from django.db import transaction
 from django.urls import reverse
 import pytest
 from pytest_lazy_fixtures import lf as lazy_fixture
 from rest_framework import status
 
+from coral_credits.api import replay
 import coral_credits.api.models as models
 
 # TODO(tylerchristie): check and commit tests
@@ -340,6 +343,93 @@ def test_flavor_extend_currently_active_request(
         assert rcr.resource_hours == allocation_hours[resource_class.name]
 
 
+@pytest.mark.parametrize(
+    "allocation_hours,request_data,shorten_request_data",
+    [
+        (
+            {"VCPU": 96.0, "MEMORY_MB": 24000.0, "DISK_GB": 840.0},
+            lazy_fixture("flavor_request_data"),
+            lazy_fixture("flavor_shorten_current_request_data"),
+        ),
+    ],
+)
+@pytest.mark.django_db
+def test_flavor_update_request_in_place(
+    resource_classes,
+    credit_allocation,
+    create_credit_allocation_resources,
+    resource_provider_account,
+    api_client,
+    request_data,
+    shorten_request_data,
+    allocation_hours,
+    request,  # contains pytest global vars
+):
+    create_credit_allocation_resources(
+        credit_allocation, resource_classes, allocation_hours
+    )
+    consumer_create_request(api_client, request_data, status.HTTP_204_NO_CONTENT)
+    consumer = models.Consumer.objects.get(consumer_uuid=request.config.LEASE_ID)
+    record_ids = set(
+        models.ResourceConsumptionRecord.objects.values_list("id", flat=True)
+    )
+
+    consumer_update_request(
+        api_client, shorten_request_data, status.HTTP_204_NO_CONTENT
+    )
+
+    # The existing consumer and its records are updated rather than replaced
+    updated_consumer = models.Consumer.objects.get()
+    assert updated_consumer.pk == consumer.pk
+    assert updated_consumer.end == request.config.END_EARLY_DATE
+    assert (
+        set(models.ResourceConsumptionRecord.objects.values_list("id", flat=True))
+        == record_ids
+    )
+
+
+@pytest.mark.django_db
+def test_update_request_drops_resource_class(
+    resource_classes,
+    credit_allocation,
+    create_credit_allocation_resources,
+    resource_provider_account,
+    api_client,
+    flavor_request_data,
+):
+    create_credit_allocation_resources(
+        credit_allocation,
+        resource_classes,
+        {"VCPU": 96.0, "MEMORY_MB": 24000.0, "DISK_GB": 1000.0},
+    )
+    consumer_create_request(api_client, flavor_request_data, status.HTTP_204_NO_CONTENT)
+    disk = models.ResourceConsumptionRecord.objects.get(resource_class__name="DISK_GB")
+    disk_allocation = models.CreditAllocationResource.objects.get(
+        resource_class__name="DISK_GB"
+    )
+    assert disk_allocation.resource_hours == 1000.0 - disk.resource_hours > 0
+    update_request_data = copy.deepcopy(flavor_request_data)
+    update_request_data["current_lease"] = copy.deepcopy(flavor_request_data["lease"])
+    del update_request_data["lease"]["resource_requests"]["DISK_GB"]
+
+    consumer_update_request(api_client, update_request_data, status.HTTP_204_NO_CONTENT)
+
+    # The hours of the dropped resource class are refunded
+    disk_allocation.refresh_from_db()
+    assert disk_allocation.resource_hours == 1000.0
+    assert not models.ResourceConsumptionRecord.objects.filter(pk=disk.pk).exists()
+    refund = models.CreditTransaction.objects.get(
+        kind=models.CreditTransaction.REFUND, resource_class__name="DISK_GB"
+    )
+    assert refund.change == disk.resource_hours
+    assert refund.balance == 1000.0
+    assert set(
+        models.ResourceConsumptionRecord.objects.values_list(
+            "resource_class__name", flat=True
+        )
+    ) == {"VCPU", "MEMORY_MB"}
+
+
 @pytest.mark.parametrize(
     "allocation_hours, request_data",
     [
@@ -376,18 +466,22 @@ def test_insufficient_credits_create_request(
 
 
 @pytest.mark.parametrize(
-    "request_data",
+    "request_data,expected_status",
     [
-        (lazy_fixture("physical_request_data")),
-        (lazy_fixture("virtual_request_data")),
+        # Valid, but without allocated hosts it can't be priced
+        (lazy_fixture("physical_request_data"), status.HTTP_403_FORBIDDEN),
+        (lazy_fixture("virtual_request_data"), status.HTTP_400_BAD_REQUEST),
     ],
 )
 @pytest.mark.django_db
 def test_invalid_blazar_resource_type_create_request(
+    resource_provider_account,
+    credit_allocation,
     api_client,
     request_data,
+    expected_status,
 ):
-    consumer_create_request(api_client, request_data, status.HTTP_400_BAD_REQUEST)
+    consumer_create_request(api_client, request_data, expected_status)
 
 
 @pytest.mark.parametrize(
@@ -422,3 +516,107 @@ def test_invalid_duration_create_request(
     )
 
     print(response.content)
+
+
+@pytest.mark.parametrize(
+    "allocation_hours,request_data",
+    [
+        (
+            {"VCPU": 96.0, "MEMORY_MB": 24000.0, "DISK_GB": 840.0},
+            lazy_fixture("flavor_request_data"),
+        ),
+    ],
+)
+@pytest.mark.django_db
+def test_flavor_create_request_retried(
+    resource_classes,
+    credit_allocation,
+    create_credit_allocation_resources,
+    resource_provider_account,
+    api_client,
+    request_data,
+    allocation_hours,
+    settings,
+    django_assert_max_num_queries,
+):
+    create_credit_allocation_resources(
+        credit_allocation, resource_classes, allocation_hours
+    )
+    response = consumer_create_request(
+        api_client, request_data, status.HTTP_204_NO_CONTENT
+    )
+    assert "Idempotent-Replayed" not in response
+
+    # A retry gets the same response, without spending credits again, only
+    # claiming and locking the replay record
+    with django_assert_max_num_queries(5):
+        response = consumer_create_request(
+            api_client, request_data, status.HTTP_204_NO_CONTENT
+        )
+    assert response["Idempotent-Replayed"] == "true"
+    assert models.Consumer.objects.count() == 1
+
+    # Ending the lease is a different commit, and can also be retried
+    consumer_delete_request(api_client, request_data, status.HTTP_204_NO_CONTENT)
+    response = consumer_delete_request(
+        api_client, request_data, status.HTTP_204_NO_CONTENT
+    )
+    assert response["Idempotent-Replayed"] == "true"
+
+    # Once the recorded response expires, the request is processed again
+    settings.CONSUMER_REPLAY_TTL = 0
+    consumer_create_request(api_client, request_data, status.HTTP_403_FORBIDDEN)
+
+
+@pytest.mark.django_db
+def test_replay_records_bounded(settings):
+    settings.CONSUMER_REPLAY_MAX_RECORDS = 2
+    keys = [
+        replay.get_replay_key("create_consumer", {"lease": {"id": str(uuid.uuid4())}})
+        for _ in range(3)
+    ]
+    for key in keys:
+        replay.record_replay(key, status.HTTP_204_NO_CONTENT, None)
+
+    assert replay.get_replay(keys[0]) is None
+    assert replay.get_replay(keys[2]) == (status.HTTP_204_NO_CONTENT, None)
+    assert models.ConsumerCommitReplay.objects.count() == 2
+
+
+@pytest.mark.django_db
+def test_denied_create_request_not_replayed(
+    resource_classes,
+    credit_allocation,
+    create_credit_allocation_resources,
+    resource_provider_account,
+    api_client,
+    flavor_request_data,
+):
+    consumer_create_request(api_client, flavor_request_data, status.HTTP_403_FORBIDDEN)
+    assert not models.ConsumerCommitReplay.objects.exists()
+
+    # A retry after the account is topped up is checked again
+    create_credit_allocation_resources(
+        credit_allocation,
+        resource_classes,
+        {"VCPU": 96.0, "MEMORY_MB": 24000.0, "DISK_GB": 840.0},
+    )
+    response = consumer_create_request(
+        api_client, flavor_request_data, status.HTTP_204_NO_CONTENT
+    )
+    assert "Idempotent-Replayed" not in response
+
+
+@pytest.mark.django_db
+def test_replay_never_overwritten():
+    key = replay.get_replay_key("create_consumer", {"lease": {"id": "lease"}})
+    with transaction.atomic():
+        assert replay.claim_replay(key) is None
+        # Pending claims aren't replayed
+        assert replay.get_replay(key) is None
+        replay.record_replay(key, status.HTTP_204_NO_CONTENT, None)
+
+    # A commit that raced the first one can't replace its response
+    replay.record_replay(key, status.HTTP_403_FORBIDDEN, "duplicate lease")
+    with transaction.atomic():
+        assert replay.claim_replay(key) == (status.HTTP_204_NO_CONTENT, None)
@@ -0,0 +1,229 @@
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connections, router
+from django.http import HttpResponse
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+import pytest
+from rest_framework import status
+
+from coral_credits import db_router, metrics, prom_exporter
+import coral_credits.api.models as models
+
+
+@pytest.fixture
+def replica(settings):
+    settings.REPLICA_DATABASE = "replica"
+    yield
+    cache.clear()
+
+
+def authenticated(request):
+    request.user = User(username="test")
+    return request
+
+
+def read_database(request):
+    response = HttpResponse()
+    response.database = router.db_for_read(models.Consumer)
+    return response
+
+
+def write_then_read_database(request):
+    router.db_for_write(models.Consumer)
+    return read_database(request)
+
+
+def write_then_fail(request):
+    router.db_for_write(models.Consumer)
+    return HttpResponse(status=400)
+
+
+@pytest.mark.django_db
+def test_safe_requests_read_from_replica(replica):
+    middleware = db_router.ReplicaMiddleware(read_database)
+
+    response = middleware(RequestFactory().get("/allocation"))
+
+    assert response.database == "replica"
+    assert db_router.PRIMARY_PIN_COOKIE not in response.cookies
+    # Only inside the request
+    assert router.db_for_read(models.Consumer) == "default"
+
+
+@pytest.mark.django_db
+def test_writes_read_from_primary(replica):
+    middleware = db_router.ReplicaMiddleware(write_then_read_database)
+    factory = RequestFactory()
+
+    response = middleware(authenticated(factory.post("/consumer")))
+    assert response.database == "default"
+    pin = response.cookies[db_router.PRIMARY_PIN_COOKIE]
+    assert pin["max-age"] == db_router.PRIMARY_PIN_SECONDS
+
+    # The client reads its own writes until the pin expires
+    middleware = db_router.ReplicaMiddleware(read_database)
+    factory.cookies[db_router.PRIMARY_PIN_COOKIE] = pin.value
+    assert middleware(factory.get("/allocation")).database == "default"
+    factory.cookies[db_router.PRIMARY_PIN_COOKIE] = "0"
+    assert middleware(factory.get("/allocation")).database == "replica"
+
+    # Reads after a write in the same request use the primary
+    middleware = db_router.ReplicaMiddleware(write_then_read_database)
+    assert middleware(RequestFactory().get("/allocation")).database == "default"
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize(
+    "view, authenticate",
+    [
+        # Requests that write nothing, fail or aren't authenticated
+        (read_database, True),
+        (write_then_fail, True),
+        (write_then_read_database, False),
+    ],
+)
+def test_writes_not_pinned(replica, view, authenticate):
+    middleware = db_router.ReplicaMiddleware(view)
+    request = RequestFactory().post("/consumer", HTTP_AUTHORIZATION="Bearer junk")
+    if authenticate:
+        authenticated(request)
+
+    response = middleware(request)
+
+    assert db_router.PRIMARY_PIN_COOKIE not in response.cookies
+    assert middleware._credential_key(request) not in cache
+
+
+@pytest.mark.django_db
+def test_no_replica():
+    assert db_router.replica_alias() is None
+    middleware = db_router.ReplicaMiddleware(read_database)
+
+    response = middleware(RequestFactory().post("/consumer"))
+
+    assert response.database == "default"
+    assert db_router.PRIMARY_PIN_COOKIE not in response.cookies
+    with db_router.replica_reads():
+        assert router.db_for_read(models.Consumer) == "default"
+
+
+@pytest.mark.django_db
+def test_collector_reads_from_replica(replica, monkeypatch):
+    databases = []
+
+    class Collector:
+        def collect(self):
+            databases.append(router.db_for_read(models.CreditAllocation))
+            return iter(())
+
+    monkeypatch.setattr(prom_exporter, "CustomCollector", Collector)
+
+    assert list(metrics.AllocationCollector().collect()) == []
+    assert databases == ["replica"]
+
+
+def queried_tables(queries):
+    return {
+        table
+        for query in queries
+        for table in ("api_creditallocation", "api_creditaccount")
+        if table in query["sql"]
+    }
+
+
+def request_databases(api_client, method, url, data=None):
+    """Returns the tables queried on the primary and the replica."""
+    with CaptureQueriesContext(connections["default"]) as primary:
+        with CaptureQueriesContext(connections["replica"]) as replica:
+            response = getattr(api_client, method)(
+                url, data, format="json", secure=True
+            )
+    assert status.is_success(response.status_code), response.content
+    return queried_tables(primary), queried_tables(replica)
+
+
+# The replica is a separate connection, which only sees committed data
+@pytest.mark.django_db(transaction=True, databases=["default", "replica"])
+def test_replica_database(replica, account, api_client, settings):
+    url = reverse("creditallocation-list")
+    assert request_databases(api_client, "get", url) == (
+        set(),
+        {"api_creditallocation"},
+    )
+
+    # Writes stay on the primary
+    primary, replica_tables = request_databases(
+        api_client,
+        "post",
+        url,
+        {
+            "name": "new",
+            "account": reverse("creditaccount-detail", kwargs={"pk": account.pk}),
+            "start": "2026-01-01T00:00:00Z",
+            "end": "2026-02-01T00:00:00Z",
+        },
+    )
+    assert "api_creditallocation" in primary
+    assert replica_tables == set()
+
+    # API clients don't keep cookies, but read their own writes by token
+    api_client.cookies.clear()
+    primary, replica_tables = request_databases(api_client, "get", url)
+    assert primary == {"api_creditallocation"}
+    assert replica_tables == set()
+
+    # Until the pin expires
+    settings.PRIMARY_PIN_SECONDS = 0
+    assert request_databases(api_client, "get", url) == (
+        set(),
+        {"api_creditallocation"},
+    )
+
+
+@pytest.mark.django_db(transaction=True, databases=["default", "replica"])
+def test_dry_runs_not_pinned(
+    replica,
+    api_client,
+    resource_provider_account,
+    credit_allocation,
+    resource_classes,
+    create_credit_allocation_resources,
+    flavor_request_data,
+):
+    create_credit_allocation_resources(
+        credit_allocation,
+        resource_classes,
+        {"VCPU": 96, "MEMORY_MB": 24000, "DISK_GB": 840},
+    )
+    url = reverse("resource-request-check-create")
+
+    response = api_client.post(url, flavor_request_data, format="json", secure=True)
+    assert response.status_code == status.HTTP_204_NO_CONTENT, response.content
+    assert db_router.PRIMARY_PIN_COOKIE not in response.cookies
+
+    # Nor are clients that fail to authenticate
+    api_client.credentials(HTTP_AUTHORIZATION="Bearer junk")
+    response = api_client.post(url, flavor_request_data, format="json", secure=True)
+    assert response.status_code == status.HTTP_401_UNAUTHORIZED
+    assert db_router.PRIMARY_PIN_COOKIE not in response.cookies
+    request = RequestFactory().post(url, HTTP_AUTHORIZATION="Bearer junk")
+    assert db_router.ReplicaMiddleware(None)._credential_key(request) not in cache
+
+
+@pytest.mark.django_db(transaction=True, databases=["default", "replica"])
+def test_streamed_reads_from_replica(
+    replica, settings, account, resource_provider_account, api_client
+):
+    settings.ACCOUNT_SUMMARY_STREAM_THRESHOLD = -1
+    url = reverse("creditaccount-detail", kwargs={"pk": account.pk})
+
+    with CaptureQueriesContext(connections["default"]) as primary:
+        with CaptureQueriesContext(connections["replica"]) as replica_queries:
+            response = api_client.get(url, secure=True)
+            assert response.streaming
+            b"".join(response.streaming_content)
+
+    assert not any("api_consumer" in query["sql"] for query in primary)
+    assert any("api_consumer" in query["sql"] for query in replica_queries)
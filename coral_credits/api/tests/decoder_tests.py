@@ -0,0 +1,61 @@
+import dataclasses
+
+import pytest
+from rest_framework import serializers
+
+from coral_credits.api import business_objects, decoders
+
+
+@pytest.mark.django_db
+def test_decode_flavor_request(flavor_request_data, request):
+    consumer_request = decoders.decode_consumer_request(flavor_request_data)
+
+    lease = consumer_request.lease
+    assert str(lease.id) == request.config.LEASE_ID
+    assert lease.start_date == request.config.START_DATE
+    assert lease.resource_requests.resources == {
+        "DISK_GB": 35,
+        "MEMORY_MB": 1000,
+        "VCPU": 4,
+    }
+    assert len(lease.reservations) == 1
+    assert isinstance(lease.reservations[0], business_objects.FlavorReservation)
+    assert consumer_request.current_lease is None
+
+    # Decoded objects are immutable
+    with pytest.raises(dataclasses.FrozenInstanceError):
+        lease.name = "changed"
+
+
+@pytest.mark.django_db
+def test_decode_shared_current_lease(flavor_request_data):
+    flavor_request_data["current_lease"] = flavor_request_data["lease"]
+
+    consumer_request = decoders.decode_consumer_request(
+        flavor_request_data, current_lease_required=True
+    )
+
+    assert consumer_request.current_lease is consumer_request.lease
+
+
+@pytest.mark.django_db
+def test_decode_current_lease_required(flavor_request_data):
+    with pytest.raises(serializers.ValidationError) as e:
+        decoders.decode_consumer_request(
+            flavor_request_data, current_lease_required=True
+        )
+
+    assert "current_lease" in e.value.detail
+
+
+@pytest.mark.django_db
+def test_decode_reports_nested_errors(flavor_request_data):
+    flavor_request_data["lease"]["reservations"][0]["amount"] = "lots"
+    flavor_request_data["lease"]["reservations"].append({"resource_type": "unknown"})
+
+    with pytest.raises(serializers.ValidationError) as e:
+        decoders.decode_consumer_request(flavor_request_data)
+
+    reservation_errors = e.value.detail["lease"]["reservations"]
+    assert "amount" in reservation_errors[0]
+    assert "resource_type" in reservation_errors[1]
@@ -0,0 +1,128 @@
+import copy
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+import pytest
+from rest_framework import status
+
+from coral_credits.api import dry_runs
+import coral_credits.api.models as models
+from coral_credits.api.tests.consumer_tests import (
+    consumer_create_request,
+    consumer_request,
+)
+
+
+@pytest.fixture
+def allocation_resources(
+    resource_provider_account,
+    credit_allocation,
+    resource_classes,
+    create_credit_allocation_resources,
+):
+    create_credit_allocation_resources(
+        credit_allocation,
+        resource_classes,
+        {"VCPU": 96, "MEMORY_MB": 24000, "DISK_GB": 840},
+    )
+    return models.CreditAllocationResource.objects.all()
+
+
+def check_create(api_client, request_data, expected_status):
+    with CaptureQueriesContext(connection) as queries:
+        consumer_request(
+            reverse("resource-request-check-create"),
+            api_client,
+            request_data,
+            expected_status,
+        )
+    return [q["sql"] for q in queries]
+
+
+def touches_allocations(queries):
+    return any("api_creditallocation" in sql for sql in queries)
+
+
+@pytest.mark.django_db
+def test_repeated_check_cached(allocation_resources, api_client, flavor_request_data):
+    assert touches_allocations(
+        check_create(api_client, flavor_request_data, status.HTTP_204_NO_CONTENT)
+    )
+
+    # The same resources, written differently
+    request_data = copy.deepcopy(flavor_request_data)
+    request_data["lease"]["resource_requests"]["VCPU"] = "4.0"
+    queries = check_create(api_client, request_data, status.HTTP_204_NO_CONTENT)
+
+    assert not touches_allocations(queries)
+
+
+@pytest.mark.django_db
+def test_balance_change_invalidates(
+    allocation_resources, api_client, flavor_request_data
+):
+    check_create(api_client, flavor_request_data, status.HTTP_204_NO_CONTENT)
+
+    consumer_create_request(api_client, flavor_request_data, status.HTTP_204_NO_CONTENT)
+
+    # The whole allocation was spent by the commit
+    queries = check_create(api_client, flavor_request_data, status.HTTP_403_FORBIDDEN)
+    assert touches_allocations(queries)
+
+    for resource in allocation_resources:
+        resource.resource_hours = 100000
+        resource.save()
+    check_create(api_client, flavor_request_data, status.HTTP_204_NO_CONTENT)
+
+
+@pytest.mark.django_db
+def test_other_lease_window_not_cached(
+    allocation_resources, api_client, flavor_request_data, flavor_upcoming_data
+):
+    check_create(api_client, flavor_request_data, status.HTTP_204_NO_CONTENT)
+
+    queries = check_create(api_client, flavor_upcoming_data, status.HTTP_204_NO_CONTENT)
+
+    assert touches_allocations(queries)
+
+
+@pytest.mark.django_db
+def test_decisions_expire(
+    settings, monkeypatch, allocation_resources, api_client, flavor_request_data
+):
+    settings.DRY_RUN_CACHE_SECONDS = 10
+    check_create(api_client, flavor_request_data, status.HTTP_204_NO_CONTENT)
+
+    now = dry_runs.time.monotonic()
+    monkeypatch.setattr(dry_runs.time, "monotonic", lambda: now + 11)
+    queries = check_create(api_client, flavor_request_data, status.HTTP_204_NO_CONTENT)
+
+    assert touches_allocations(queries)
+
+
+@pytest.mark.django_db
+def test_cache_disabled(
+    settings, allocation_resources, api_client, flavor_request_data
+):
+    settings.DRY_RUN_CACHE_SECONDS = 0
+    check_create(api_client, flavor_request_data, status.HTTP_204_NO_CONTENT)
+
+    queries = check_create(api_client, flavor_request_data, status.HTTP_204_NO_CONTENT)
+
+    assert touches_allocations(queries)
+
+
+@pytest.mark.django_db
+def test_least_recently_used_evicted(settings):
+    settings.DRY_RUN_CACHE_SIZE = 2
+    responses = {key: dry_runs.Response({"key": key}) for key in "abc"}
+
+    dry_runs.remember("a", responses["a"])
+    dry_runs.remember("b", responses["b"])
+    assert dry_runs.get("a").data == {"key": "a"}
+    dry_runs.remember("c", responses["c"])
+
+    assert dry_runs.get("b") is None
+    assert dry_runs.get("a").data == {"key": "a"}
+    assert dry_runs.get("c").data == {"key": "c"}
@@ -0,0 +1,112 @@
+from django.urls import reverse
+from django.utils import timezone
+import pytest
+from rest_framework import status
+
+from coral_credits.api import db_utils, history
+import coral_credits.api.models as models
+from coral_credits.api.tests.consumer_tests import consumer_create_request
+
+ALLOCATED = {"VCPU": 96, "MEMORY_MB": 24000, "DISK_GB": 840}
+
+
+@pytest.fixture
+def allocate(credit_allocation, resource_classes):
+    resource_classes = {rc.name: rc for rc in resource_classes}
+
+    def _allocate(hours=ALLOCATED):
+        db_utils.create_credit_resource_allocations(
+            credit_allocation,
+            {resource_classes[name]: amount for name, amount in hours.items()},
+        )
+        return timezone.now()
+
+    return _allocate
+
+
+def kinds(account):
+    return list(
+        models.CreditTransaction.objects.filter(account=account)
+        .order_by("pk")
+        .values_list("kind", "resource_class__name", "change", "balance")
+    )
+
+
+@pytest.mark.django_db
+def test_balance_history(
+    account, resource_provider_account, allocate, api_client, flavor_request_data
+):
+    before = timezone.now()
+    allocated = allocate()
+    # The whole allocation is spent
+    consumer_create_request(api_client, flavor_request_data, status.HTTP_204_NO_CONTENT)
+    spent = timezone.now()
+    increased = allocate({"VCPU": 100})
+
+    assert history.balance_at(account.pk, before) == {}
+    assert history.balance_at(account.pk, allocated) == ALLOCATED
+    assert history.balance_at(account.pk, spent) == {
+        "VCPU": 0,
+        "MEMORY_MB": 0,
+        "DISK_GB": 0,
+    }
+    assert history.balance_at(account.pk, increased) == {
+        "VCPU": 4,
+        "MEMORY_MB": 0,
+        "DISK_GB": 0,
+    }
+    spends = models.CreditTransaction.objects.filter(
+        kind=models.CreditTransaction.SPEND
+    )
+    assert {str(t.consumer_uuid) for t in spends} == {
+        flavor_request_data["lease"]["id"]
+    }
+    assert kinds(account)[-1] == ("allocation", "VCPU", 4, 4)
+
+
+@pytest.mark.django_db
+def test_balance_at_single_query(account, allocate, django_assert_num_queries):
+    for _ in range(5):
+        allocate()
+    now = timezone.now()
+
+    with django_assert_num_queries(1):
+        assert history.balance_at(account.pk, now) == ALLOCATED
+
+
+@pytest.mark.django_db
+def test_bulk_set_and_delete_recorded(account, credit_allocation, resource_classes):
+    vcpu = resource_classes[0]
+    db_utils.set_credit_allocation_resources({(credit_allocation.pk, vcpu.pk): 10})
+    db_utils.set_credit_allocation_resources({(credit_allocation.pk, vcpu.pk): 25})
+    models.CreditAllocationResource.objects.get().delete()
+
+    assert kinds(account) == [
+        ("allocation", "VCPU", 10, 10),
+        ("allocation", "VCPU", 15, 25),
+        ("allocation", "VCPU", -25, 0),
+    ]
+
+
+@pytest.mark.django_db
+def test_account_balance(account, credit_allocation, allocate, api_client):
+    before = timezone.now()
+    allocated = allocate()
+    url = reverse("creditaccount-balance", kwargs={"pk": account.pk})
+
+    response = api_client.get(url, {"at": allocated.isoformat()}, secure=True)
+    assert response.status_code == status.HTTP_200_OK, response.content
+    assert response.json()["resources"] == ALLOCATED
+
+    response = api_client.get(url, {"at": before.isoformat()}, secure=True)
+    assert response.json()["resources"] == {}
+
+    # Balances outlive their account
+    credit_allocation.delete()
+    account.delete()
+    response = api_client.get(url, secure=True)
+    assert response.json()["resources"] == {
+        "VCPU": 0,
+        "MEMORY_MB": 0,
+        "DISK_GB": 0,
+    }
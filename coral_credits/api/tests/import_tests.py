@@ -0,0 +1,109 @@
+import json
+
+from django.core.management import CommandError, call_command
+import pytest
+
+import coral_credits.api.models as models
+
+PROJECT_IDS = [
+    "20354d7a-e4fe-47af-8ff6-187bca92f3f9",
+    "3a1f7a2c-6c1b-4ef1-9a4e-2d1f9b3c8e11",
+]
+
+
+@pytest.fixture
+def manifest_rows(provider):
+    return [
+        {
+            "account": f"account-{index}",
+            "email": f"pi{index}@example.com",
+            "provider": provider.name,
+            "project_id": project_id,
+            "allocation": "2026-spring",
+            "start": "2026-01-01T00:00:00Z",
+            "end": "2026-07-01T00:00:00Z",
+            "resources": {"VCPU": 1000, "MEMORY_MB": 20000},
+        }
+        for index, project_id in enumerate(PROJECT_IDS)
+    ]
+
+
+def write_json_manifest(tmp_path, rows):
+    path = tmp_path / "manifest.json"
+    path.write_text(json.dumps(rows))
+    return str(path)
+
+
+@pytest.mark.django_db
+def test_import_allocations(resource_classes, manifest_rows, tmp_path):
+    call_command("import_allocations", write_json_manifest(tmp_path, manifest_rows))
+
+    assert models.CreditAccount.objects.count() == 2
+    assert set(
+        str(project_id)
+        for project_id in models.ResourceProviderAccount.objects.values_list(
+            "project_id", flat=True
+        )
+    ) == set(PROJECT_IDS)
+    assert models.CreditAllocation.objects.count() == 2
+    for car in models.CreditAllocationResource.objects.all():
+        assert car.resource_hours == car.allocated_resource_hours
+    assert models.CreditAllocationResource.objects.count() == 4
+
+
+@pytest.mark.django_db
+def test_import_allocations_csv(resource_classes, provider, tmp_path):
+    path = tmp_path / "manifest.csv"
+    path.write_text(
+        "account,email,provider,project_id,allocation,start,end,VCPU,DISK_GB\n"
+        f"csv,pi@example.com,{provider.name},{PROJECT_IDS[0]},2026-spring,"
+        "2026-01-01T00:00:00Z,2026-07-01T00:00:00Z,100,\n"
+    )
+
+    call_command("import_allocations", str(path))
+
+    car = models.CreditAllocationResource.objects.get()
+    assert car.resource_class.name == "VCPU"
+    assert car.allocated_resource_hours == 100
+
+
+@pytest.mark.django_db
+def test_import_allocations_update(resource_classes, manifest_rows, tmp_path):
+    call_command("import_allocations", write_json_manifest(tmp_path, manifest_rows))
+    vcpu = models.CreditAllocationResource.objects.get(
+        allocation__account__name="account-0", resource_class__name="VCPU"
+    )
+    # Consume some credits
+    vcpu.resource_hours -= 400
+    vcpu.save()
+
+    manifest_rows[0]["resources"]["VCPU"] = 1500
+    manifest_rows[0]["end"] = "2026-08-01T00:00:00Z"
+    call_command("import_allocations", write_json_manifest(tmp_path, manifest_rows))
+
+    vcpu.refresh_from_db()
+    assert vcpu.allocated_resource_hours == 1500
+    assert vcpu.resource_hours == 1100
+    assert models.CreditAllocation.objects.count() == 2
+    assert vcpu.allocation.end.month == 8
+
+    # Can't allocate fewer hours than have been consumed
+    manifest_rows[0]["resources"]["VCPU"] = 300
+    with pytest.raises(CommandError, match="fewer hours than currently consumed"):
+        call_command("import_allocations", write_json_manifest(tmp_path, manifest_rows))
+
+
+@pytest.mark.django_db
+def test_import_allocations_invalid(resource_classes, manifest_rows, tmp_path):
+    manifest_rows[0]["project_id"] = "not-a-uuid"
+    manifest_rows[1]["resources"] = {"GPU": 10}
+
+    with pytest.raises(CommandError) as e:
+        call_command("import_allocations", write_json_manifest(tmp_path, manifest_rows))
+
+    assert "Row 1: invalid project_id" in str(e.value)
+    assert not models.CreditAccount.objects.exists()
+
+    manifest_rows[0]["project_id"] = PROJECT_IDS[0]
+    with pytest.raises(CommandError, match="Resource class 'GPU' does not exist"):
+        call_command("import_allocations", write_json_manifest(tmp_path, manifest_rows))
@@ -0,0 +1,87 @@
+import multiprocessing
+
+from django.urls import reverse
+from prometheus_client import REGISTRY, generate_latest
+import pytest
+from rest_framework import status
+
+from coral_credits import metrics
+
+ALLOCATION_METRIC = "coral_credits_allocation_hours_free_per_project"
+
+
+def _serve_status_requests(count):
+    # Runs in a new process, as a gunicorn worker would
+    import django
+    from django.test import Client
+
+    django.setup()
+    client = Client()
+    for _ in range(count):
+        assert client.get("/_status/").status_code == status.HTTP_204_NO_CONTENT
+
+
+def _requests_total(registry, view):
+    return registry.get_sample_value(
+        "coral_credits_http_requests_total",
+        {"method": "GET", "view": view, "status": "204"},
+    )
+
+
+@pytest.mark.django_db
+def test_request_metrics(api_client):
+    before = _requests_total(REGISTRY, "status") or 0
+
+    api_client.get("/_status/")
+
+    assert _requests_total(REGISTRY, "status") == before + 1
+
+
+@pytest.fixture
+def allocated_project(
+    resource_provider_account,
+    credit_allocation,
+    resource_classes,
+    create_credit_allocation_resources,
+):
+    create_credit_allocation_resources(
+        credit_allocation,
+        resource_classes,
+        {"VCPU": 50, "MEMORY_MB": 2000, "DISK_GB": 1000},
+    )
+    return resource_provider_account
+
+
+@pytest.mark.django_db
+def test_metrics_endpoint_excludes_allocations(api_client, allocated_project):
+    response = api_client.get(reverse(metrics.METRICS_VIEW_NAME))
+
+    assert response.status_code == status.HTTP_200_OK
+    assert b"coral_credits_http_requests_total" in response.content
+    assert ALLOCATION_METRIC.encode() not in response.content
+
+
+@pytest.mark.django_db
+def test_metrics_server_includes_allocations(allocated_project):
+    output = generate_latest(metrics.get_registry(include_allocations=True))
+
+    assert str(allocated_project.project_id).encode() in output
+    assert ALLOCATION_METRIC.encode() in output
+
+
+@pytest.mark.django_db
+def test_multiprocess_workers(tmp_path, monkeypatch):
+    monkeypatch.setenv("PROMETHEUS_MULTIPROC_DIR", str(tmp_path))
+    context = multiprocessing.get_context("spawn")
+    workers = [
+        context.Process(target=_serve_status_requests, args=(count,))
+        for count in (1, 2, 3)
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+        assert worker.exitcode == 0
+
+    # Every worker's requests are counted, whichever process is scraped
+    assert _requests_total(metrics.get_registry(), "status") == 6
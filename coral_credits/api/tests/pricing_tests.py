@@ -0,0 +1,189 @@
+import copy
+import json
+
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+import pytest
+from rest_framework import status
+
+from coral_credits.api import business_objects, db_exceptions, pricing
+import coral_credits.api.models as models
+from coral_credits.api.tests.consumer_tests import consumer_create_request
+
+FLAVOR_ID = "e26a4241-b83d-4516-8e0e-8ce2665d1966"
+FLAVOR_RESOURCES = {"VCPU": 2, "MEMORY_MB": 500, "DISK_GB": 17.5}
+CATALOG = {
+    "flavors": [{"id": FLAVOR_ID, "name": "small", "resources": FLAVOR_RESOURCES}],
+    "hosts": [
+        {"hypervisor_hostname": "node-1", "resources": {"VCPU": 64}},
+        {"hypervisor_hostname": "node-2", "resources": {"VCPU": 32, "DISK_GB": 1}},
+    ],
+}
+
+
+@pytest.fixture
+def catalog(resource_classes):
+    flavors, hosts = pricing.parse_catalog(CATALOG)
+    pricing.refresh_catalog(flavors, hosts)
+    return pricing.get_catalog()
+
+
+def flavor(amount, flavor_id=FLAVOR_ID):
+    return business_objects.FlavorReservation(
+        resource_type="flavor:instance", amount=amount, flavor_id=flavor_id
+    )
+
+
+def hosts(*hostnames):
+    return business_objects.PhysicalReservation(
+        resource_type="physical:host",
+        min=len(hostnames),
+        max=len(hostnames),
+        allocations=tuple(
+            business_objects.Allocation(id=str(i), hypervisor_hostname=hostname)
+            for i, hostname in enumerate(hostnames)
+        ),
+    )
+
+
+@pytest.mark.django_db
+def test_price_reservations(catalog):
+    virtual = business_objects.VirtualReservation(
+        resource_type="virtual:instance",
+        amount=3,
+        vcpus=4,
+        memory_mb=1024,
+        disk_gb=0,
+    )
+
+    resources = pricing.price_reservations(
+        [virtual, flavor(2), flavor(1), hosts("node-1", "node-2")], catalog
+    )
+
+    assert resources == {
+        "VCPU": 3 * 4 + 3 * 2 + 64 + 32,
+        "MEMORY_MB": 3 * 1024 + 3 * 500,
+        "DISK_GB": 3 * 17.5 + 1,
+    }
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize(
+    "reservation",
+    [flavor(1, flavor_id="unknown"), hosts("unknown"), hosts()],
+)
+def test_price_unknown_reservations(catalog, reservation):
+    with pytest.raises(db_exceptions.PricingError):
+        pricing.price_reservations([reservation], catalog)
+
+
+@pytest.mark.django_db
+def test_catalog_cached(catalog):
+    with CaptureQueriesContext(connection) as queries:
+        assert pricing.get_catalog() is catalog
+    # Only the version is checked
+    assert len(queries) == 1
+
+    flavors, hosts = pricing.parse_catalog({"flavors": CATALOG["flavors"]})
+    pricing.refresh_catalog(flavors, hosts)
+
+    refreshed = pricing.get_catalog()
+    assert refreshed.flavors == {FLAVOR_ID: FLAVOR_RESOURCES}
+    assert refreshed.hosts == {}
+    assert not models.Host.objects.exists()
+
+
+@pytest.mark.django_db
+def test_invalid_catalog(resource_classes):
+    with pytest.raises(pricing.CatalogError) as e:
+        pricing.parse_catalog(
+            {
+                "flavors": [
+                    {"id": "a", "resources": {"GPU": 1}},
+                    {"id": "b", "resources": {"VCPU": -1}},
+                    {"name": "c", "resources": {"VCPU": 1}},
+                ],
+                "hosts": [{"hypervisor_hostname": "node-1"}],
+            }
+        )
+
+    assert e.value.errors == [
+        "flavors 1: unknown resource class 'GPU'",
+        "flavors 2: invalid amount '-1' of VCPU",
+        "flavors 3: missing id",
+        "hosts 1: no resources given",
+    ]
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("pricing_always", [False, True])
+def test_consumer_create_priced(
+    settings,
+    catalog,
+    resource_provider_account,
+    credit_allocation,
+    resource_classes,
+    create_credit_allocation_resources,
+    api_client,
+    flavor_request_data,
+    pricing_always,
+):
+    settings.PRICING_ALWAYS = pricing_always
+    allocation_hours = {"VCPU": 96, "MEMORY_MB": 24000, "DISK_GB": 840}
+    create_credit_allocation_resources(
+        credit_allocation, resource_classes, allocation_hours
+    )
+    request_data = copy.deepcopy(flavor_request_data)
+    if pricing_always:
+        # Ignored in favour of the priced reservations
+        request_data["lease"]["resource_requests"] = {"VCPU": 1}
+    else:
+        del request_data["lease"]["resource_requests"]
+
+    consumer_create_request(api_client, request_data, status.HTTP_204_NO_CONTENT)
+
+    records = models.ResourceConsumptionRecord.objects.values_list(
+        "resource_class__name", "resource_hours"
+    )
+    # Two instances of the flavor for 24 hours
+    assert dict(records) == allocation_hours
+
+
+@pytest.mark.django_db
+def test_consumer_create_unknown_flavor(
+    catalog, resource_provider_account, credit_allocation, api_client, request
+):
+    request_data = {
+        "context": {
+            "user_id": request.config.USER_REF,
+            "project_id": request.config.PROJECT_ID,
+            "auth_url": "https://api.example.com:5000/v3",
+        },
+        "lease": {
+            "id": request.config.LEASE_ID,
+            "name": request.config.LEASE_NAME,
+            "start_date": request.config.START_DATE.isoformat(),
+            "end_date": request.config.END_DATE.isoformat(),
+            "reservations": [
+                {"resource_type": "flavor:instance", "amount": 1, "flavor_id": "x"}
+            ],
+        },
+    }
+
+    response = consumer_create_request(
+        api_client, request_data, status.HTTP_403_FORBIDDEN
+    )
+
+    assert "No flavor 'x' in the pricing catalog." in response.json()["error"]
+
+
+@pytest.mark.django_db
+def test_refresh_catalog_command(resource_classes, tmp_path, capsys):
+    path = tmp_path / "catalog.json"
+    path.write_text(json.dumps(CATALOG))
+
+    call_command("refresh_catalog", str(path))
+
+    assert "Loaded 1 flavors and 2 hosts" in capsys.readouterr().out
+    assert pricing.get_catalog().hosts["node-2"] == {"VCPU": 32, "DISK_GB": 1}
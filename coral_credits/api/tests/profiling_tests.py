@@ -0,0 +1,71 @@
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import HttpResponse
+from django.test import RequestFactory
+from django.urls import reverse
+import pytest
+from rest_framework import status
+
+from coral_credits import profiling
+import coral_credits.api.models as models
+
+
+@pytest.fixture
+def profiling_settings(settings, tmp_path):
+    settings.PROFILING_ENABLED = True
+    settings.PROFILING_TOKEN = "secret"
+    settings.PROFILING_DIR = str(tmp_path)
+    return settings
+
+
+def count_resource_classes(request):
+    return HttpResponse(str(models.ResourceClass.objects.count()))
+
+
+@pytest.mark.django_db
+def test_disabled_by_default():
+    with pytest.raises(MiddlewareNotUsed):
+        profiling.ProfilingMiddleware(count_resource_classes)
+
+
+@pytest.mark.django_db
+def test_profile_requested(profiling_settings, tmp_path, api_client, account):
+    url = reverse("creditaccount-detail", kwargs={"pk": account.pk})
+
+    response = api_client.get(url, HTTP_X_PROFILE="secret", secure=True)
+
+    assert response.status_code == status.HTTP_200_OK
+    summary = dict(
+        item.split("=") for item in response[profiling.PROFILE_HEADER].split("; ")
+    )
+    assert int(summary["queries"]) > 0
+    report = (tmp_path / summary["report"]).read_text()
+    assert report.startswith(f"GET {url}\nstatus=200")
+    assert 'FROM "api_creditaccount"' in report
+    assert "retrieve" in report
+
+
+@pytest.mark.django_db
+def test_profile_wrong_token(profiling_settings, tmp_path):
+    middleware = profiling.ProfilingMiddleware(count_resource_classes)
+
+    response = middleware(RequestFactory().get("/", HTTP_X_PROFILE="wrong"))
+
+    assert profiling.PROFILE_HEADER not in response
+    assert not list(tmp_path.iterdir())
+
+
+@pytest.mark.django_db
+def test_profile_sampled(profiling_settings, tmp_path):
+    profiling_settings.PROFILING_TOKEN = None
+    profiling_settings.PROFILING_SAMPLE_RATE = 1.0
+    middleware = profiling.ProfilingMiddleware(count_resource_classes)
+
+    response = middleware(RequestFactory().get("/resource_class"))
+
+    # Only requests that ask for a profile get the summary
+    assert profiling.PROFILE_HEADER not in response
+    (report,) = tmp_path.iterdir()
+    assert "-get-resource-class-" in report.name
+    assert 'SELECT COUNT(*) AS "__count" FROM "api_resourceclass"' in (
+        report.read_text()
+    )
@@ -0,0 +1,126 @@
+from datetime import timedelta
+import uuid
+
+from django.utils import timezone
+import pytest
+
+from coral_credits import prom_exporter
+import coral_credits.api.models as models
+
+
+@pytest.fixture
+def create_consumer(resource_provider_account, resource_classes, request):
+    def _create_consumer(
+        start,
+        end,
+        resource_hours=20,
+        resource_provider_account=resource_provider_account,
+    ):
+        consumer = models.Consumer.objects.create(
+            consumer_ref="lease",
+            consumer_uuid=uuid.uuid4(),
+            resource_provider_account=resource_provider_account,
+            user_ref=request.config.USER_REF,
+            start=start,
+            end=end,
+        )
+        models.ResourceConsumptionRecord.objects.create(
+            consumer=consumer,
+            resource_class=resource_classes[0],
+            resource_hours=resource_hours,
+        )
+        return consumer
+
+    return _create_consumer
+
+
+@pytest.mark.django_db
+def test_reclaimable_hours(resource_provider_account, create_consumer):
+    now = timezone.now()
+    # Half way through
+    create_consumer(now - timedelta(hours=1), now + timedelta(hours=1))
+    # Not started
+    create_consumer(now + timedelta(hours=1), now + timedelta(hours=3))
+    # Ended
+    create_consumer(now - timedelta(hours=3), now - timedelta(hours=1))
+
+    reclaimable = list(prom_exporter.get_reclaimable_hours())
+
+    assert reclaimable == [
+        (
+            str(resource_provider_account.project_id),
+            "VCPU",
+            resource_provider_account.provider.name,
+            pytest.approx(10 + 20, abs=0.01),
+        )
+    ]
+
+
+@pytest.mark.django_db
+def test_reserved_hours_per_consumer(
+    resource_provider_account, create_consumer, settings, request
+):
+    settings.PROMETHEUS_CONSUMER_TOP_N = 2
+    now = timezone.now()
+    consumers = [
+        create_consumer(now, now + timedelta(hours=1), resource_hours=hours)
+        for hours in (10, 40, 20, 30)
+    ]
+    # Ended
+    create_consumer(now - timedelta(hours=2), now - timedelta(hours=1), 100)
+
+    series = list(prom_exporter.get_reserved_hours_per_consumer())
+
+    user_id = request.config.USER_REF
+    project_id = str(resource_provider_account.project_id)
+    provider = resource_provider_account.provider.name
+    assert series == [
+        (str(consumers[1].consumer_uuid), user_id, project_id, "VCPU", provider, 40),
+        (str(consumers[3].consumer_uuid), user_id, project_id, "VCPU", provider, 30),
+        ("other", "", project_id, "VCPU", provider, 30),
+    ]
+
+    # Leaves room for the other series
+    settings.PROMETHEUS_CONSUMER_MAX_SERIES = 2
+    series = list(prom_exporter.get_reserved_hours_per_consumer())
+
+    assert [(s[0], s[5]) for s in series] == [
+        (str(consumers[1].consumer_uuid), 40),
+        ("other", 60),
+    ]
+
+
+@pytest.mark.django_db
+def test_reserved_hours_per_consumer_max_series(
+    provider, resource_classes, create_consumer, settings
+):
+    settings.PROMETHEUS_CONSUMER_MAX_SERIES = 3
+    now = timezone.now()
+    for hours in (10, 20, 30, 40):
+        account = models.CreditAccount.objects.create(
+            email=f"{hours}@test.com", name=str(hours)
+        )
+        create_consumer(
+            now,
+            now + timedelta(hours=1),
+            resource_hours=hours,
+            resource_provider_account=models.ResourceProviderAccount.objects.create(
+                account=account, provider=provider, project_id=uuid.uuid4()
+            ),
+        )
+
+    series = list(prom_exporter.get_reserved_hours_per_consumer())
+
+    # The two largest projects keep their other series, and the rest are
+    # added up, leaving no room for any consumers
+    assert [(s[0], s[2] == "other", s[5]) for s in series] == [
+        ("other", False, 40),
+        ("other", False, 30),
+        ("other", True, 30),
+    ]
+
+    settings.PROMETHEUS_CONSUMER_MAX_SERIES = 5
+    series = list(prom_exporter.get_reserved_hours_per_consumer())
+
+    assert len(series) == 4
+    assert series[0][0] != "other" and series[0][5] == 40
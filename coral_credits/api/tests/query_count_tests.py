@@ -0,0 +1,470 @@
+"""Checks that the number of queries made by each endpoint is independent of
+the amount of data in the database.
+
+Each route registered in coral_credits.urls is requested with a small and a
+large database. When the number of queries grows, the test fails listing the
+statements that were repeated, which is usually an N+1 query.
+"""
+
+from collections import Counter
+from datetime import timedelta
+import json
+import re
+from types import SimpleNamespace
+import uuid
+
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+import pytest
+
+from coral_credits import urls
+from coral_credits.api import rollups
+import coral_credits.api.models as models
+from coral_credits.api.tests.consumer_tests import consumer_create_request
+
+SIZES = (2, 6)
+
+
+def url(name, **kwargs):
+    return reverse(name, kwargs=kwargs)
+
+
+def create_lease(world):
+    consumer_create_request(world.api_client, world.lease_request, 204)
+
+
+# Each (route name, method) maps to a function that is given the world and
+# returns the URL and request data
+ROUTES = {
+    ("resourceclass-list", "get"): lambda w: (url("resourceclass-list"), None),
+    ("resourceclass-list", "post"): lambda w: (
+        url("resourceclass-list"),
+        {"name": "PCPU"},
+    ),
+    ("resourceclass-detail", "get"): lambda w: (
+        url("resourceclass-detail", pk=w.vcpu.pk),
+        None,
+    ),
+    ("resourceclass-detail", "put"): lambda w: (
+        url("resourceclass-detail", pk=w.vcpu.pk),
+        {"name": "PCPU"},
+    ),
+    ("resourceclass-detail", "patch"): lambda w: (
+        url("resourceclass-detail", pk=w.vcpu.pk),
+        {"name": "PCPU"},
+    ),
+    ("resourceclass-detail", "delete"): lambda w: (
+        url("resourceclass-detail", pk=w.unused_resource_class.pk),
+        None,
+    ),
+    ("resourceprovider-list", "get"): lambda w: (url("resourceprovider-list"), None),
+    ("resourceprovider-list", "post"): lambda w: (
+        url("resourceprovider-list"),
+        {
+            "name": "New Provider",
+            "email": "new@test.com",
+            "info_url": "https://new.test.com",
+        },
+    ),
+    ("resourceprovider-detail", "get"): lambda w: (
+        url("resourceprovider-detail", pk=w.provider.pk),
+        None,
+    ),
+    ("resourceprovider-detail", "put"): lambda w: (
+        url("resourceprovider-detail", pk=w.provider.pk),
+        {
+            "name": "Renamed",
+            "email": "new@test.com",
+            "info_url": "https://new.test.com",
+        },
+    ),
+    ("resourceprovider-detail", "patch"): lambda w: (
+        url("resourceprovider-detail", pk=w.provider.pk),
+        {"name": "Renamed"},
+    ),
+    ("resourceprovider-detail", "delete"): lambda w: (
+        url("resourceprovider-detail", pk=w.provider.pk),
+        None,
+    ),
+    ("resourceprovideraccount-list", "get"): lambda w: (
+        url("resourceprovideraccount-list"),
+        None,
+    ),
+    ("resourceprovideraccount-list", "post"): lambda w: (
+        url("resourceprovideraccount-list"),
+        {
+            "account": url("creditaccount-detail", pk=w.unused_account.pk),
+            "provider": url("resourceprovider-detail", pk=w.provider.pk),
+            "project_id": str(uuid.uuid4()),
+        },
+    ),
+    ("resourceprovideraccount-detail", "get"): lambda w: (
+        url("resourceprovideraccount-detail", pk=w.resource_provider_account.pk),
+        None,
+    ),
+    ("resourceprovideraccount-detail", "put"): lambda w: (
+        url("resourceprovideraccount-detail", pk=w.resource_provider_account.pk),
+        {
+            "account": url("creditaccount-detail", pk=w.account.pk),
+            "provider": url("resourceprovider-detail", pk=w.provider.pk),
+            "project_id": str(w.resource_provider_account.project_id),
+        },
+    ),
+    ("resourceprovideraccount-detail", "patch"): lambda w: (
+        url("resourceprovideraccount-detail", pk=w.resource_provider_account.pk),
+        {"project_id": str(w.resource_provider_account.project_id)},
+    ),
+    ("resourceprovideraccount-detail", "delete"): lambda w: (
+        url("resourceprovideraccount-detail", pk=w.resource_provider_account.pk),
+        None,
+    ),
+    ("creditallocation-list", "get"): lambda w: (url("creditallocation-list"), None),
+    ("creditallocation-list", "post"): lambda w: (
+        url("creditallocation-list"),
+        {
+            "name": "new",
+            "account": url("creditaccount-detail", pk=w.account.pk),
+            "start": (w.now + timedelta(days=10)).isoformat(),
+            "end": (w.now + timedelta(days=20)).isoformat(),
+        },
+    ),
+    ("creditallocation-bulk-resources", "post"): lambda w: (
+        url("creditallocation-bulk-resources"),
+        [
+            {"allocation": allocation.pk, "resources": {"VCPU": 100}}
+            for allocation in w.allocations
+        ],
+    ),
+    ("creditallocation-detail", "get"): lambda w: (
+        url("creditallocation-detail", pk=w.credit_allocation.pk),
+        None,
+    ),
+    ("creditallocation-detail", "put"): lambda w: (
+        url("creditallocation-detail", pk=w.credit_allocation.pk),
+        {
+            "name": "renamed",
+            "account": url("creditaccount-detail", pk=w.account.pk),
+            "start": w.credit_allocation.start.isoformat(),
+            "end": w.credit_allocation.end.isoformat(),
+        },
+    ),
+    ("creditallocation-detail", "patch"): lambda w: (
+        url("creditallocation-detail", pk=w.credit_allocation.pk),
+        {"name": "renamed"},
+    ),
+    ("creditallocation-detail", "delete"): lambda w: (
+        url("creditallocation-detail", pk=w.unused_allocation.pk),
+        None,
+    ),
+    ("allocation-resource-list", "get"): lambda w: (
+        url("allocation-resource-list", allocation_pk=w.credit_allocation.pk),
+        None,
+    ),
+    ("allocation-resource-list", "post"): lambda w: (
+        url("allocation-resource-list", allocation_pk=w.credit_allocation.pk),
+        {"VCPU": 100, "MEMORY_MB": 100},
+    ),
+    ("allocation-resource-detail", "get"): lambda w: (
+        url(
+            "allocation-resource-detail",
+            allocation_pk=w.credit_allocation.pk,
+            pk=w.vcpu_allocation.pk,
+        ),
+        None,
+    ),
+    ("allocation-resource-detail", "put"): lambda w: (
+        url(
+            "allocation-resource-detail",
+            allocation_pk=w.credit_allocation.pk,
+            pk=w.vcpu_allocation.pk,
+        ),
+        {"VCPU": 100},
+    ),
+    ("allocation-resource-detail", "patch"): lambda w: (
+        url(
+            "allocation-resource-detail",
+            allocation_pk=w.credit_allocation.pk,
+            pk=w.vcpu_allocation.pk,
+        ),
+        {"VCPU": 100},
+    ),
+    ("allocation-resource-detail", "delete"): lambda w: (
+        url(
+            "allocation-resource-detail",
+            allocation_pk=w.unused_allocation.pk,
+            pk=w.unused_allocation.resources.first().pk,
+        ),
+        None,
+    ),
+    ("creditaccount-list", "get"): lambda w: (url("creditaccount-list"), None),
+    ("creditaccount-list", "post"): lambda w: (
+        url("creditaccount-list"),
+        {"name": "new", "email": "new@test.com"},
+    ),
+    ("creditaccount-detail", "get"): lambda w: (
+        url("creditaccount-detail", pk=w.account.pk),
+        None,
+    ),
+    ("creditaccount-detail", "put"): lambda w: (
+        url("creditaccount-detail", pk=w.account.pk),
+        {"name": "renamed", "email": "new@test.com"},
+    ),
+    ("creditaccount-detail", "patch"): lambda w: (
+        url("creditaccount-detail", pk=w.account.pk),
+        {"name": "renamed"},
+    ),
+    ("creditaccount-detail", "delete"): lambda w: (
+        url("creditaccount-detail", pk=w.unused_account.pk),
+        None,
+    ),
+    ("creditaccount-balances", "get"): lambda w: (
+        url("creditaccount-balances") + f"?accounts={w.account.pk}",
+        None,
+    ),
+    ("creditaccount-balances", "post"): lambda w: (
+        url("creditaccount-balances"),
+        {
+            "accounts": [w.account.pk, w.unused_account.pk],
+            "project_ids": [str(w.resource_provider_account.project_id)],
+        },
+    ),
+    ("creditaccount-balance", "get"): lambda w: (
+        url("creditaccount-balance", pk=w.account.pk),
+        None,
+    ),
+    ("usage-list", "get"): lambda w: (
+        url("usage-list")
+        + "?"
+        + "&".join(
+            [
+                "period=day",
+                f"start={(w.now - timedelta(days=30)).date()}T00:00:00Z",
+                f"end={(w.now + timedelta(days=1)).date()}T00:00:00Z",
+            ]
+        ),
+        None,
+    ),
+    ("capacity-list", "get"): lambda w: (
+        url("capacity-list")
+        + "?"
+        + "&".join(
+            [
+                "period=day",
+                f"start={(w.now - timedelta(days=30)).date()}T00:00:00Z",
+                f"end={(w.now + timedelta(days=30)).date()}T00:00:00Z",
+            ]
+        ),
+        None,
+    ),
+    ("resource-request-list", "get"): lambda w: (url("resource-request-list"), None),
+    ("resource-request-detail", "get"): lambda w: (
+        url("resource-request-detail", pk=w.consumer.pk),
+        None,
+    ),
+    ("resource-request-detail", "delete"): lambda w: (
+        url("resource-request-detail", pk=w.consumer.pk),
+        None,
+    ),
+    ("resource-request-create-consumer", "post"): lambda w: (
+        url("resource-request-create-consumer"),
+        w.lease_request,
+    ),
+    ("resource-request-check-create", "post"): lambda w: (
+        url("resource-request-check-create"),
+        w.lease_request,
+    ),
+    ("resource-request-update-consumer", "post"): lambda w: (
+        url("resource-request-update-consumer"),
+        w.extend_request,
+    ),
+    ("resource-request-check-update", "post"): lambda w: (
+        url("resource-request-check-update"),
+        w.extend_request,
+    ),
+    ("resource-request-on-end", "post"): lambda w: (
+        url("resource-request-on-end"),
+        w.lease_request,
+    ),
+}
+
+# Setup for requests that need more than the world, run before the queries
+# are counted
+SETUP = {
+    ("resource-request-update-consumer", "post"): create_lease,
+    ("resource-request-check-update", "post"): create_lease,
+    ("resource-request-on-end", "post"): create_lease,
+}
+
+# The status each method responds with, unless the route is listed below
+METHOD_STATUS = {"get": 200, "post": 201, "put": 200, "patch": 200, "delete": 204}
+
+EXPECTED_STATUS = {
+    # Setting resources on an allocation creates them
+    ("allocation-resource-detail", "put"): 201,
+    ("allocation-resource-detail", "patch"): 201,
+    ("creditaccount-balances", "post"): 200,
+    ("resource-request-create-consumer", "post"): 204,
+    ("resource-request-check-create", "post"): 204,
+    ("resource-request-update-consumer", "post"): 204,
+    ("resource-request-check-update", "post"): 204,
+    ("resource-request-on-end", "post"): 204,
+}
+
+# Routes that have no implementation behind them, so are not checked.
+# ConsumerViewSet only supports the Blazar enforcement actions above.
+UNSUPPORTED_ROUTES = {
+    ("resource-request-list", "post"),
+    ("resource-request-detail", "put"),
+    ("resource-request-detail", "patch"),
+}
+
+
+def registered_routes():
+    """Returns the (route name, method) pairs registered with the routers.
+
+    The duplicate routes with a trailing slash are left out.
+    """
+    routes = set()
+    for router in (urls.router, urls.allocation_router):
+        for pattern in router.urls:
+            actions = getattr(pattern.callback, "actions", None)
+            if actions is None or "slash" in pattern.name:
+                continue
+            routes.update(
+                (pattern.name, method) for method in actions if method != "head"
+            )
+    return routes
+
+
+@pytest.fixture
+def world(
+    resource_classes,
+    credit_allocation,
+    create_credit_allocation_resources,
+    resource_provider_account,
+    api_client,
+    flavor_request_data,
+    flavor_extend_current_request_data,
+):
+    vcpu_allocation, _, _ = create_credit_allocation_resources(
+        credit_allocation,
+        resource_classes,
+        {"VCPU": 100000.0, "MEMORY_MB": 10000000.0, "DISK_GB": 100000.0},
+    )
+    return SimpleNamespace(
+        now=timezone.now(),
+        api_client=api_client,
+        vcpu=resource_classes[0],
+        resource_classes=resource_classes,
+        account=resource_provider_account.account,
+        provider=resource_provider_account.provider,
+        resource_provider_account=resource_provider_account,
+        credit_allocation=credit_allocation,
+        vcpu_allocation=vcpu_allocation,
+        lease_request=flavor_request_data,
+        extend_request=flavor_extend_current_request_data,
+    )
+
+
+def populate(world, size):
+    """Adds size objects of each type, related to the world's objects."""
+    now = world.now
+    world.allocations = [world.credit_allocation]
+    for i in range(size):
+        provider = models.ResourceProvider.objects.create(
+            name=f"provider {i}", email=f"provider{i}@test.com"
+        )
+        account = models.CreditAccount.objects.create(
+            name=f"account {i}", email=f"account{i}@test.com"
+        )
+        models.ResourceProviderAccount.objects.create(
+            account=account, provider=provider, project_id=uuid.uuid4()
+        )
+        resource_class = models.ResourceClass.objects.create(name=f"CUSTOM_{i}")
+        # Allocations that have ended, so aren't used by new consumers
+        allocation = models.CreditAllocation.objects.create(
+            account=world.account,
+            name=f"allocation {i}",
+            start=now - timedelta(days=60 + i),
+            end=now - timedelta(days=30),
+        )
+        for rc in (*world.resource_classes, resource_class):
+            models.CreditAllocationResource.objects.create(
+                allocation=allocation,
+                resource_class=rc,
+                resource_hours=1000,
+                allocated_resource_hours=1000,
+            )
+        models.CreditAllocationResource.objects.create(
+            allocation=world.credit_allocation,
+            resource_class=resource_class,
+            resource_hours=1000,
+            allocated_resource_hours=1000,
+        )
+        world.allocations.append(allocation)
+        consumer = models.Consumer.objects.create(
+            consumer_ref=f"lease {i}",
+            consumer_uuid=uuid.uuid4(),
+            resource_provider_account=world.resource_provider_account,
+            user_ref=uuid.uuid4(),
+            start=now - timedelta(days=2, hours=i),
+            end=now - timedelta(days=1),
+        )
+        for rc in world.resource_classes:
+            models.ResourceConsumptionRecord.objects.create(
+                consumer=consumer, resource_class=rc, resource_hours=10
+            )
+    rollups.rollup_usage()
+
+    world.consumer = consumer
+    world.unused_account = account
+    world.unused_allocation = allocation
+    world.unused_resource_class = models.ResourceClass.objects.create(name="UNUSED")
+
+
+def normalise(sql):
+    return re.sub(r"'[^']*'|\b\d+(\.\d+)?\b", "?", sql)
+
+
+def request_queries(world, route, size):
+    """Returns the queries made by a request, checking it succeeded, then
+    undoes any changes.
+    """
+    _, method = route
+    with transaction.atomic():
+        populate(world, size)
+        if route in SETUP:
+            SETUP[route](world)
+        path, data = ROUTES[route](world)
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(world.api_client, method)(
+                path,
+                data=json.dumps(data) if data is not None else None,
+                content_type="application/json",
+                secure=True,
+            )
+        expected = EXPECTED_STATUS.get(route, METHOD_STATUS[method])
+        assert response.status_code == expected, response.content
+        transaction.set_rollback(True)
+    return [query["sql"] for query in queries]
+
+
+@pytest.mark.django_db
+def test_every_route_is_checked():
+    assert registered_routes() == ROUTES.keys() | UNSUPPORTED_ROUTES
+
+
+@pytest.mark.parametrize("route", sorted(ROUTES), ids="{0[0]}-{0[1]}".format)
+@pytest.mark.django_db
+def test_query_count(world, route):
+    small = request_queries(world, route, SIZES[0])
+    large = request_queries(world, route, SIZES[1])
+
+    repeated = Counter(map(normalise, large)) - Counter(map(normalise, small))
+    assert len(large) == len(small), (
+        f"{route} made {len(small)} queries with {SIZES[0]} of each object, "
+        f"but {len(large)} with {SIZES[1]}. Repeated queries:\n"
+        + "\n".join(f"{count} x {sql}" for sql, count in repeated.items())
+    )
@@ -0,0 +1,138 @@
+from datetime import timedelta
+
+from django.core.management import CommandError, call_command
+import pytest
+from rest_framework import status
+
+from coral_credits.api import archive, reconcile
+import coral_credits.api.models as models
+from coral_credits.api.tests.consumer_tests import consumer_create_request
+
+ALLOCATION_HOURS = {"VCPU": 96, "MEMORY_MB": 24000, "DISK_GB": 840}
+
+
+@pytest.fixture
+def spent_account(
+    resource_provider_account,
+    credit_allocation,
+    resource_classes,
+    create_credit_allocation_resources,
+    api_client,
+    flavor_request_data,
+):
+    create_credit_allocation_resources(
+        credit_allocation,
+        resource_classes,
+        {name: hours * 2 for name, hours in ALLOCATION_HOURS.items()},
+    )
+    consumer_create_request(api_client, flavor_request_data, status.HTTP_204_NO_CONTENT)
+    return resource_provider_account.account
+
+
+def drift(resource_class_name, hours):
+    resource = models.CreditAllocationResource.objects.get(
+        resource_class__name=resource_class_name
+    )
+    resource.resource_hours += hours
+    resource.save()
+
+
+@pytest.mark.django_db
+def test_ledger_balances(spent_account):
+    (bounds,) = reconcile.partitions(1)
+    entries = reconcile.ledger(*bounds)
+
+    assert {e.resource_class: e.consumed_hours for e in entries} == ALLOCATION_HOURS
+    assert not [e for e in entries if e.difference]
+    assert reconcile.find_discrepancies() == []
+
+
+@pytest.mark.django_db
+def test_archived_hours_balance(spent_account, request):
+    archive.archive_consumers(request.config.END_DATE + timedelta(days=1))
+
+    assert not models.Consumer.objects.exists()
+    assert reconcile.find_discrepancies() == []
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("partition_count", [1, 3])
+def test_discrepancies_found(spent_account, partition_count):
+    drift("VCPU", -5)
+
+    (discrepancy,) = reconcile.find_discrepancies(partition_count=partition_count)
+
+    assert discrepancy.account == spent_account.name
+    assert discrepancy.resource_class == "VCPU"
+    assert discrepancy.spent_hours == ALLOCATION_HOURS["VCPU"] + 5
+    assert discrepancy.difference == 5
+
+
+@pytest.mark.django_db
+def test_discrepancies_found_by_processes(spent_account):
+    for i in range(3):
+        models.CreditAccount.objects.create(name=f"other {i}", email="o@example.com")
+    drift("VCPU", -5)
+
+    # Two partitions of two accounts, checked by forked processes
+    discrepancies = reconcile.find_discrepancies(processes=2, partition_count=2)
+
+    assert [(d.account, d.resource_class, d.difference) for d in discrepancies] == [
+        (spent_account.name, "VCPU", 5)
+    ]
+
+
+@pytest.mark.django_db
+def test_consumed_without_allocation(spent_account):
+    models.CreditAllocationResource.objects.filter(
+        resource_class__name="DISK_GB"
+    ).delete()
+
+    (discrepancy,) = reconcile.find_discrepancies()
+
+    assert discrepancy.resource_class == "DISK_GB"
+    assert discrepancy.allocated_hours == 0
+    assert discrepancy.consumed_hours == ALLOCATION_HOURS["DISK_GB"]
+    # There is no allocation to adjust
+    assert reconcile.repair(discrepancy) == 0
+    assert reconcile.find_discrepancies() == [discrepancy]
+
+
+@pytest.mark.django_db
+def test_partitions(account):
+    for name in ("other", "another"):
+        models.CreditAccount.objects.create(name=name, email="other@example.com")
+    account_ids = sorted(models.CreditAccount.objects.values_list("pk", flat=True))
+
+    assert reconcile.partitions(2) == [
+        (account_ids[0], account_ids[1]),
+        (account_ids[2], account_ids[2]),
+    ]
+    assert reconcile.partitions(10) == [(pk, pk) for pk in account_ids]
+
+
+@pytest.mark.django_db
+def test_repair(spent_account):
+    drift("MEMORY_MB", 7)
+    (discrepancy,) = reconcile.find_discrepancies()
+
+    assert reconcile.repair(discrepancy) == -7
+
+    assert reconcile.find_discrepancies() == []
+    # Already repaired
+    assert reconcile.repair(discrepancy) == 0
+
+
+@pytest.mark.django_db
+def test_reconcile_command(spent_account, capsys):
+    call_command("reconcile_ledger", processes=1)
+    drift("DISK_GB", -1)
+
+    with pytest.raises(CommandError, match="Found 1 discrepancies"):
+        call_command("reconcile_ledger", processes=1)
+    call_command("reconcile_ledger", processes=1, repair=True)
+
+    out = capsys.readouterr().out
+    assert "DISK_GB for account" in out
+    assert "repairing 1 discrepancies" in out
+    assert reconcile.find_discrepancies() == []
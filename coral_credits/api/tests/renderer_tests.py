@@ -0,0 +1,65 @@
+from datetime import datetime, timezone
+from decimal import Decimal
+import io
+import json
+import uuid
+
+import pytest
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from coral_credits import parsers, renderers
+
+
+@pytest.fixture
+def payload():
+    return {
+        "id": uuid.UUID("e96b5a17-ada0-4034-a5ea-34db024b8e04"),
+        "created": datetime(2026, 3, 1, 12, 30, 15, 123456, tzinfo=timezone.utc),
+        "resource_hours": Decimal("12.5"),
+        "errors": {0: ["This field is required."]},
+        "name": "line\u2028separator",
+    }
+
+
+@pytest.mark.django_db
+def test_orjson_renderer_matches_drf(payload):
+    rendered = renderers.ORJSONRenderer().render(payload)
+
+    assert json.loads(rendered) == json.loads(JSONRenderer().render(payload))
+    assert b'"created":"2026-03-01T12:30:15.123456Z"' in rendered
+    assert b"\\u2028" in rendered
+
+
+@pytest.mark.django_db
+def test_orjson_renderer_fallback(payload, monkeypatch):
+    monkeypatch.setattr(renderers, "orjson", None)
+
+    assert renderers.ORJSONRenderer().render(payload) == JSONRenderer().render(payload)
+
+
+@pytest.mark.django_db
+def test_orjson_renderer_indent(payload):
+    rendered = renderers.ORJSONRenderer().render(
+        payload, accepted_media_type="application/json; indent=4"
+    )
+
+    assert rendered == JSONRenderer().render(
+        payload, accepted_media_type="application/json; indent=4"
+    )
+
+
+@pytest.mark.django_db
+def test_orjson_parser():
+    body = b'{"lease": {"id": "e96b5a17", "reservations": [], "amount": 1.5}}'
+
+    parsed = parsers.ORJSONParser().parse(io.BytesIO(body))
+
+    assert parsed == JSONParser().parse(io.BytesIO(body))
+
+
+@pytest.mark.django_db
+def test_orjson_parser_invalid():
+    with pytest.raises(ParseError):
+        parsers.ORJSONParser().parse(io.BytesIO(b'{"lease": NaN}'))
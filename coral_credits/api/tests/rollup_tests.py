@@ -0,0 +1,176 @@
+from datetime import datetime, timedelta
+from datetime import timezone as dt_timezone
+import uuid
+
+from django.core.management import call_command
+from django.db.models import F
+from django.urls import reverse
+import pytest
+from rest_framework import status
+
+from coral_credits.api import archive, rollups
+import coral_credits.api.models as models
+
+START = datetime(2026, 1, 1, 0, 30, tzinfo=dt_timezone.utc)
+
+
+@pytest.fixture
+def create_consumer(resource_provider_account, resource_classes, request):
+    def _create_consumer(start=START, hours=2, resource_hours=20):
+        consumer = models.Consumer.objects.create(
+            consumer_ref="lease",
+            consumer_uuid=uuid.uuid4(),
+            resource_provider_account=resource_provider_account,
+            user_ref=request.config.USER_REF,
+            start=start,
+            end=start + timedelta(hours=hours),
+        )
+        models.ResourceConsumptionRecord.objects.create(
+            consumer=consumer,
+            resource_class=resource_classes[0],
+            resource_hours=resource_hours,
+        )
+        return consumer
+
+    return _create_consumer
+
+
+def reserved_hours(period):
+    return {
+        rollup.start.hour if period == models.UsageRollup.HOUR else rollup.start.day: (
+            pytest.approx(rollup.reserved_hours)
+        )
+        for rollup in models.UsageRollup.objects.filter(
+            period=period, start__lt=START + timedelta(days=1)
+        )
+    }
+
+
+def consumed_hours(period):
+    return sum(
+        models.UsageRollup.objects.filter(period=period).values_list(
+            "consumed_hours", flat=True
+        )
+    )
+
+
+@pytest.mark.django_db
+def test_rollup_usage(create_consumer):
+    consumer = create_consumer()
+
+    assert rollups.rollup_usage() == 1
+
+    # 20 hours spread over 00:30 to 02:30
+    assert reserved_hours(models.UsageRollup.HOUR) == {0: 5, 1: 10, 2: 5}
+    assert reserved_hours(models.UsageRollup.DAY) == {1: 20}
+    # Charged when the consumer was created
+    created = rollups.period_start(consumer.created, models.UsageRollup.HOUR)
+    assert models.UsageRollup.objects.get(
+        period=models.UsageRollup.HOUR, start=created
+    ).consumed_hours == pytest.approx(20)
+    assert consumed_hours(models.UsageRollup.DAY) == pytest.approx(20)
+
+
+@pytest.mark.django_db
+def test_rollup_usage_incremental(create_consumer, django_assert_max_num_queries):
+    consumers = [create_consumer(START + timedelta(hours=i)) for i in range(10)]
+    with django_assert_max_num_queries(10):
+        assert rollups.rollup_usage() == 10
+
+    # Unchanged consumers aren't rolled up again
+    assert rollups.rollup_usage() == 0
+
+    # Shorten a consumer to an hour, refunding half its hours
+    consumer = consumers[0]
+    consumer.end = consumer.start + timedelta(hours=1)
+    consumer.save()
+    consumer.resources.update(resource_hours=10)
+    assert rollups.rollup_usage() == 1
+
+    assert reserved_hours(models.UsageRollup.HOUR)[0] == pytest.approx(5)
+    assert reserved_hours(models.UsageRollup.HOUR)[1] == pytest.approx(5 + 5)
+    assert reserved_hours(models.UsageRollup.DAY) == {1: pytest.approx(190)}
+    assert consumed_hours(models.UsageRollup.DAY) == pytest.approx(190)
+
+
+@pytest.mark.django_db
+def test_rollup_usage_record_changed(create_consumer, resource_classes):
+    consumer = create_consumer()
+    rollups.rollup_usage()
+    # Last saved long enough before the watermark to be behind its lag
+    models.Consumer.objects.update(modified=F("modified") - timedelta(hours=1))
+    assert rollups.rollup_usage() == 0
+
+    # Records edited on their own, as in the admin
+    record = models.ResourceConsumptionRecord.objects.get()
+    record.resource_hours = 40
+    record.save()
+    assert rollups.rollup_usage() == 1
+    assert reserved_hours(models.UsageRollup.HOUR) == {0: 10, 1: 20, 2: 10}
+
+    models.ResourceConsumptionRecord.objects.create(
+        consumer=consumer, resource_class=resource_classes[1], resource_hours=8
+    )
+    record.delete()
+    assert rollups.rollup_usage() == 1
+    assert dict(
+        models.UsageRollup.objects.filter(period=models.UsageRollup.DAY)
+        .exclude(reserved_hours=0)
+        .values_list("resource_class__name", "reserved_hours")
+    ) == {"MEMORY_MB": pytest.approx(8)}
+
+
+@pytest.mark.django_db
+def test_rollup_usage_batches(create_consumer):
+    for i in range(7):
+        create_consumer(START + timedelta(hours=i))
+    # Consumers modified at the same time are split across batches by pk
+    models.Consumer.objects.update(modified=START)
+
+    assert rollups.rollup_usage(batch_size=3) == 7
+    assert models.UsageRollupConsumer.objects.count() == 7
+    assert reserved_hours(models.UsageRollup.DAY) == {1: pytest.approx(140)}
+
+
+@pytest.mark.django_db
+def test_rollup_usage_kept_after_archival(create_consumer):
+    create_consumer()
+    call_command("rollup_usage")
+
+    assert archive.archive_consumers(START + timedelta(days=1)) == 1
+    assert not models.UsageRollupConsumer.objects.exists()
+    assert rollups.rollup_usage() == 0
+    assert reserved_hours(models.UsageRollup.DAY) == {1: 20}
+
+
+@pytest.mark.django_db
+def test_usage_list(create_consumer, resource_provider_account, api_client):
+    create_consumer()
+    rollups.rollup_usage()
+
+    url = reverse("usage-list")
+    response = api_client.get(
+        url,
+        {
+            "period": "hour",
+            "start": START.isoformat(),
+            "end": (START + timedelta(hours=2)).isoformat(),
+            "project_id": str(resource_provider_account.project_id),
+        },
+        secure=True,
+    )
+
+    assert response.status_code == status.HTTP_200_OK, response.content
+    usage = response.json()
+    # Every hour that overlaps start to end
+    assert [u["start"][11:16] for u in usage] == ["00:00", "01:00", "02:00"]
+    assert usage[0]["resource_class"] == "VCPU"
+    assert usage[0]["provider"] == resource_provider_account.provider.name
+    assert usage[1]["reserved_hours"] == pytest.approx(10)
+
+    response = api_client.get(
+        url,
+        {"start": START.isoformat(), "end": (START + timedelta(days=365)).isoformat()},
+        secure=True,
+    )
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
@@ -20,13 +20,26 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 # Database
 # https://docs.djangoproject.com/en/5.0/ref/settings/#databases
 
+# Used by processes started by the tests, which don't share the test database
+DATABASE_NAME = os.environ.get("CORAL_CREDITS_TEST_DATABASE", "db.sqlite3")
+
 DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
-        "NAME": "db.sqlite3",
-    }
+        "NAME": DATABASE_NAME,
+    },
+    # A second connection to the test database, standing in for a replica
+    "replica": {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": DATABASE_NAME,
+        "TEST": {"MIRROR": "default"},
+    },
 }
 
+DATABASE_ROUTERS = ["coral_credits.db_router.ReplicaRouter"]
+# Only the router tests read from the replica
+REPLICA_DATABASE = None
+
 # Application definition
 
 INSTALLED_APPS = [
@@ -45,8 +58,17 @@ INSTALLED_APPS = [
 ]
 
 AUDITLOG_INCLUDE_ALL_MODELS = True
+AUDITLOG_EXCLUDE_TRACKING_MODELS = (
+    "api.ConsumerCommitReplay",
+    "api.VersionCounter",
+    "api.UsageRollup",
+    "api.UsageRollupConsumer",
+)
 
 MIDDLEWARE = [
+    "coral_credits.metrics.PrometheusMiddleware",
+    "coral_credits.profiling.ProfilingMiddleware",
+    "coral_credits.db_router.ReplicaMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -61,6 +83,15 @@ REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": [
         "coral_credits.auth.BearerTokenAuthentication",
     ],
+    "DEFAULT_RENDERER_CLASSES": [
+        "coral_credits.renderers.ORJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ],
+    "DEFAULT_PARSER_CLASSES": [
+        "coral_credits.parsers.ORJSONParser",
+        "rest_framework.parsers.FormParser",
+        "rest_framework.parsers.MultiPartParser",
+    ],
 }
 
 ROOT_URLCONF = "coral_credits.urls"
@@ -169,6 +200,9 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# The test users don't need a slow password hash
+PASSWORD_HASHERS = ["django.contrib.auth.hashers.MD5PasswordHasher"]
+
 # Internationalization
 # https://docs.djangoproject.com/en/5.0/topics/i18n/
 
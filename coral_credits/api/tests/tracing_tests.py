@@ -0,0 +1,97 @@
+import json
+
+import pytest
+from rest_framework import status
+
+from coral_credits import tracing
+import coral_credits.api.models as models
+from coral_credits.api.tests.consumer_tests import consumer_create_request
+
+CREDIT_CHECKS = {
+    "get_current_lease",
+    "get_resource_provider_account",
+    "get_all_credit_allocations",
+    "get_resource_requests",
+    "check_credit_allocations",
+    "spend_credits",
+    "check_credit_balance",
+}
+
+
+@pytest.fixture
+def allocated_project(
+    resource_provider_account,
+    credit_allocation,
+    resource_classes,
+    create_credit_allocation_resources,
+):
+    create_credit_allocation_resources(
+        credit_allocation,
+        resource_classes,
+        {"VCPU": 96.0, "MEMORY_MB": 24000.0, "DISK_GB": 840.0},
+    )
+    return resource_provider_account
+
+
+@pytest.mark.django_db
+def test_consumer_create_traced(
+    settings, tmp_path, allocated_project, api_client, flavor_request_data, request
+):
+    trace_file = tmp_path / "traces.jsonl"
+    settings.TRACING_ENABLED = True
+    settings.TRACING_FILE = str(trace_file)
+
+    consumer_create_request(api_client, flavor_request_data, status.HTTP_204_NO_CONTENT)
+
+    spans = [json.loads(line) for line in trace_file.read_text().splitlines()]
+    assert len({s["trace_id"] for s in spans}) == 1
+    # The root span ends last
+    root = spans[-1]
+    assert root["name"] == "ConsumerViewSet.create_consumer"
+    assert root["parent_id"] is None
+    assert root["attributes"] == {
+        "coral.lease_id": request.config.LEASE_ID,
+        "coral.project_id": request.config.PROJECT_ID,
+    }
+    checks = {s["name"]: s for s in spans if s["name"] in CREDIT_CHECKS}
+    assert checks.keys() == CREDIT_CHECKS
+    assert {s["parent_id"] for s in checks.values()} == {root["span_id"]}
+
+    queries = [s for s in spans if s["name"] == "db.query"]
+    spend_credits_queries = [
+        s["attributes"]["db.statement"]
+        for s in queries
+        if s["parent_id"] == checks["spend_credits"]["span_id"]
+    ]
+    assert any(
+        sql.startswith('INSERT INTO "api_consumer"') for sql in spend_credits_queries
+    )
+    assert root["duration_ms"] >= sum(s["duration_ms"] for s in checks.values())
+
+
+@pytest.mark.django_db
+def test_failed_span(settings, capsys):
+    settings.TRACING_ENABLED = True
+
+    with pytest.raises(models.Consumer.DoesNotExist):
+        with tracing.span("lookup", key="value"):
+            models.Consumer.objects.get(pk=1)
+
+    query, lookup = map(json.loads, capsys.readouterr().out.splitlines())
+    assert query["parent_id"] == lookup["span_id"]
+    assert query["attributes"]["db.system"] == "sqlite"
+    assert lookup["status"] == "ERROR"
+    assert lookup["attributes"] == {"key": "value", "exception.type": "DoesNotExist"}
+
+
+@pytest.mark.django_db
+def test_disabled(settings, tmp_path, capsys):
+    settings.TRACING_FILE = str(tmp_path / "traces.jsonl")
+
+    with tracing.span("lookup") as span:
+        span.set_attribute("key", "value")
+        models.Consumer.objects.count()
+
+    assert tracing.current_span() is tracing.NOOP_SPAN
+    assert not list(tmp_path.iterdir())
+    assert capsys.readouterr().out == ""
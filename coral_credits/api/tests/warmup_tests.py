@@ -0,0 +1,47 @@
+from django.core.management import call_command
+from django.core.wsgi import get_wsgi_application
+import pytest
+
+from coral_credits import metrics, warmup
+
+
+def request_count():
+    return sum(
+        sample.value
+        for metric in metrics.REQUESTS.collect()
+        for sample in metric.samples
+        if sample.name.endswith("_total")
+    )
+
+
+@pytest.mark.django_db
+def test_warm_up(resource_provider_account):
+    requests = request_count()
+
+    timings = warmup.warm_up(get_wsgi_application())
+
+    assert timings.keys() == {"url_patterns", "orm", "requests"}
+    # Warm-up requests aren't counted as served
+    assert request_count() == requests
+
+
+@pytest.mark.django_db
+def test_request():
+    application = get_wsgi_application()
+
+    assert warmup.request(application, "/_status/") == "204 No Content"
+    assert warmup.request(application, "/resource_class").startswith("401")
+
+
+@pytest.mark.django_db
+def test_measure_startup(capsys, monkeypatch, tmp_path):
+    # The processes measured get a database of their own
+    monkeypatch.setenv("CORAL_CREDITS_TEST_DATABASE", str(tmp_path / "db.sqlite3"))
+    call_command("measure_startup", runs=1, slowest_imports=3)
+
+    lines = capsys.readouterr().out.splitlines()
+    timings = {line.split()[0]: line.split()[1:] for line in lines[1:5]}
+    assert timings["warm_up"][0] == "-"
+    assert timings.keys() == {"import", "warm_up", "first_request", "second_request"}
+    assert lines[6] == "Slowest imports:"
+    assert len(lines[7:10]) == 3
@@ -1,29 +1,166 @@
-import copy
 from datetime import datetime
+import functools
+import hashlib
 import logging
 import uuid
 
+from django.conf import settings
 from django.db import transaction
 from django.db.utils import IntegrityError
+from django.http import Http404, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
+from django.utils.cache import get_conditional_response
+from django.utils import timezone
+from django.utils.http import http_date
 from django.utils.timezone import make_aware
 from rest_framework import permissions, status, viewsets
 from rest_framework.decorators import action
 from rest_framework.response import Response
 
-from coral_credits.api import db_exceptions, db_utils, models, serializers
+from coral_credits import tracing
+from coral_credits.api import (
+    archive,
+    capacity,
+    db_exceptions,
+    db_utils,
+    decoders,
+    dry_runs,
+    history,
+    models,
+    pricing,
+    replay,
+    rollups,
+    serializers,
+)
 
 LOG = logging.getLogger(__name__)
 
+# Account summaries with more consumers than this are streamed
+ACCOUNT_SUMMARY_STREAM_THRESHOLD = 1000
+# Number of consumers fetched and rendered at a time when streaming
+ACCOUNT_SUMMARY_CHUNK_SIZE = 500
+
 
 def destroy_if_no_active_consumers(linked_consumers_queryset, request, destroy_super):
 
     current_time = make_aware(datetime.now())
-    for consumer in linked_consumers_queryset:
-        if current_time < consumer.end:
-            return _http_403_forbidden(repr(db_exceptions.ActiveConsumersInAllocation))
-    else:
-        return destroy_super.destroy(request)
+    if linked_consumers_queryset.filter(end__gt=current_time).exists():
+        return _http_403_forbidden(repr(db_exceptions.ActiveConsumersInAllocation))
+    return destroy_super.destroy(request)
+
+
+def conditional_on_versions(*keys):
+    """Answers conditional GETs from version counters before running the view.
+
+    Each key is either a version counter key, or a callable that is given the
+    view kwargs and returns one. The ETag also covers the request URL and the
+    negotiated media type, as both change the rendered response.
+    """
+
+    def decorator(view_method):
+        @functools.wraps(view_method)
+        def wrapper(self, request, *args, **kwargs):
+            version_keys = [key(**kwargs) if callable(key) else key for key in keys]
+            versions = db_utils.get_versions(version_keys)
+            etag = '"{}"'.format(
+                hashlib.sha256(
+                    repr(
+                        (
+                            request.build_absolute_uri(),
+                            request.accepted_media_type,
+                            sorted(versions.items()),
+                        )
+                    ).encode()
+                ).hexdigest()
+            )
+            modified = [m for _, m in versions.values() if m is not None]
+            last_modified = int(max(modified).timestamp()) if modified else None
+
+            not_modified = get_conditional_response(
+                request, etag=etag, last_modified=last_modified
+            )
+            if not_modified is not None:
+                return not_modified
+
+            response = view_method(self, request, *args, **kwargs)
+            if response.status_code == status.HTTP_200_OK:
+                response["ETag"] = etag
+                if last_modified is not None:
+                    response["Last-Modified"] = http_date(last_modified)
+            return response
+
+        return wrapper
+
+    return decorator
+
+
+def _stream_account_summary(request, account_summary, consumers_query):
+    """Renders an account summary, a chunk of consumers at a time."""
+    chunk_size = getattr(
+        settings, "ACCOUNT_SUMMARY_CHUNK_SIZE", ACCOUNT_SUMMARY_CHUNK_SIZE
+    )
+    renderer = request.accepted_renderer
+
+    def render(value):
+        # The JSON renderer renders None as an empty body
+        return b"null" if value is None else renderer.render(value)
+
+    # Serializers and prefetched records refer back to their consumer, and
+    # these reference cycles would keep every consumer in memory until the
+    # garbage collector next runs. So a single serializer is used, and the
+    # records are dropped once each consumer is rendered.
+    serializer = serializers.Consumer(context={"request": request})
+    # The fields of the summary, followed by the consumers
+    yield b"{" + b"".join(
+        render(name) + b":" + render(value) + b","
+        for name, value in account_summary.items()
+    ) + render("consumers") + b":["
+    separator = b""
+    chunk = []
+    for consumer in consumers_query.iterator(chunk_size=chunk_size):
+        chunk.append(render(serializer.to_representation(consumer)))
+        del consumer._prefetched_objects_cache
+        if len(chunk) == chunk_size:
+            yield separator + b",".join(chunk)
+            separator = b","
+            chunk = []
+    if chunk:
+        yield separator + b",".join(chunk)
+    yield b"]}"
+
+
+def replay_consumer_commits(view_method):
+    """Returns the recorded response when a consumer commit is retried.
+
+    Successful responses are recorded, in the same transaction as the commit
+    itself. The key is claimed before the commit runs, so a retry that
+    arrives while the commit is still running waits for its response.
+    """
+
+    @functools.wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        # The key must be worked out before the view changes request.data
+        key = replay.get_replay_key(view_method.__name__, request.data)
+        if key is None:
+            return view_method(self, request, *args, **kwargs)
+
+        with transaction.atomic():
+            replayed = replay.claim_replay(key)
+            if replayed is not None:
+                status_code, data = replayed
+                LOG.info(f"Replaying {status_code} response to {view_method.__name__}")
+                response = Response(data, status=status_code)
+                response["Idempotent-Replayed"] = "true"
+                return response
+
+            response = view_method(self, request, *args, **kwargs)
+            if status.is_success(response.status_code):
+                replay.record_replay(key, response.status_code, response.data)
+            else:
+                replay.release_replay(key)
+        return response
+
+    return wrapper
 
 
 class CreditAllocationViewSet(viewsets.ModelViewSet):
@@ -31,6 +168,90 @@ class CreditAllocationViewSet(viewsets.ModelViewSet):
     serializer_class = serializers.CreditAllocationSerializer
     permission_classes = [permissions.IsAuthenticated]
 
+    @action(detail=False, methods=["post"], url_path="bulk-resources")
+    @transaction.atomic
+    def bulk_resources(self, request):
+        """Allocate credits to many credit allocations at once.
+
+        Nothing is changed unless every item is valid. Otherwise the response
+        lists the errors for each item, in request order.
+
+        Example Request:
+        [
+            {"allocation": 1, "resources": {"VCPU": 50, "MEMORY_MB": 2000}},
+            {"allocation": 2, "resources": {"VCPU": 10}},
+        ]
+        """
+        items = serializers.BulkResourceAllocationSerializer(
+            data=request.data, many=True
+        )
+        items.is_valid(raise_exception=True)
+        items = items.validated_data
+
+        allocation_ids = {item["allocation"] for item in items}
+        existing_allocation_ids = set(
+            models.CreditAllocation.objects.filter(pk__in=allocation_ids).values_list(
+                "pk", flat=True
+            )
+        )
+        resource_classes = {
+            resource_class.name: resource_class
+            for resource_class in models.ResourceClass.objects.filter(
+                name__in={name for item in items for name in item["resources"]}
+            )
+        }
+        resource_classes_by_id = {rc.id: rc for rc in resource_classes.values()}
+
+        errors = [{} for _ in items]
+        seen_allocation_ids = set()
+        resource_hours = {}
+        item_indexes = {}
+        for index, item in enumerate(items):
+            allocation_id = item["allocation"]
+            if allocation_id not in existing_allocation_ids:
+                errors[index]["allocation"] = ["Invalid allocation_id"]
+            elif allocation_id in seen_allocation_ids:
+                errors[index]["allocation"] = ["Duplicate allocation_id"]
+            seen_allocation_ids.add(allocation_id)
+            for name, hours in item["resources"].items():
+                resource_class = resource_classes.get(name)
+                if resource_class is None:
+                    errors[index].setdefault("resources", {})[name] = [
+                        f"Resource class '{name}' does not exist."
+                    ]
+                    continue
+                resource_hours[(allocation_id, resource_class.id)] = hours
+                item_indexes[(allocation_id, resource_class.id)] = index
+
+        if not any(errors):
+            cars, car_errors = db_utils.set_credit_allocation_resources(resource_hours)
+            for (allocation_id, resource_class_id), error in car_errors.items():
+                index = item_indexes[(allocation_id, resource_class_id)]
+                name = resource_classes_by_id[resource_class_id].name
+                errors[index].setdefault("resources", {})[name] = [error]
+
+        if any(errors):
+            return Response(errors, status=status.HTTP_400_BAD_REQUEST)
+
+        resources_by_allocation = {}
+        for car in cars:
+            car.resource_class = resource_classes_by_id[car.resource_class_id]
+            resources_by_allocation.setdefault(car.allocation_id, []).append(car)
+        return Response(
+            [
+                {
+                    "allocation": item["allocation"],
+                    "resources": serializers.CreditAllocationResourceSerializer(
+                        resources_by_allocation.get(item["allocation"], []),
+                        many=True,
+                        context={"request": request},
+                    ).data,
+                }
+                for item in items
+            ],
+            status=status.HTTP_201_CREATED,
+        )
+
     def destroy(self, request, pk=None):
         allocation = get_object_or_404(self.queryset, pk=pk)
         linked_consumers = models.Consumer.objects.filter(
@@ -46,7 +267,7 @@ class CreditAllocationResourceViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         return models.CreditAllocationResource.objects.filter(
             allocation__pk=self.kwargs["allocation_pk"]
-        )
+        ).select_related("resource_class")
 
     def _create_update_credit_allocations(self, request, allocation_pk):
         """Allocate credits to a dictionary of resource classes.
@@ -94,7 +315,7 @@ class CreditAllocationResourceViewSet(viewsets.ModelViewSet):
     def create(self, request, allocation_pk=None):
         return self._create_update_credit_allocations(request, allocation_pk)
 
-    def update(self, request, allocation_pk=None, pk=None):
+    def update(self, request, allocation_pk=None, pk=None, partial=False):
         return self._create_update_credit_allocations(request, allocation_pk)
 
     def destroy(self, request, allocation_pk=None, pk=None):
@@ -120,12 +341,28 @@ class ResourceClassViewSet(viewsets.ModelViewSet):
     serializer_class = serializers.ResourceClassSerializer
     permission_classes = [permissions.IsAuthenticated]
 
+    @conditional_on_versions(db_utils.RESOURCE_CLASS_VERSION)
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @conditional_on_versions(db_utils.RESOURCE_CLASS_VERSION)
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
 
 class ResourceProviderViewSet(viewsets.ModelViewSet):
     queryset = models.ResourceProvider.objects.all()
     serializer_class = serializers.ResourceProviderSerializer
     permission_classes = [permissions.IsAuthenticated]
 
+    @conditional_on_versions(db_utils.RESOURCE_PROVIDER_VERSION)
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @conditional_on_versions(db_utils.RESOURCE_PROVIDER_VERSION)
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
     def destroy(self, request, pk=None):
         rpa = get_object_or_404(self.queryset, pk=pk)
         linked_consumers = models.Consumer.objects.filter(
@@ -152,9 +389,16 @@ class AccountViewSet(viewsets.ModelViewSet):
     serializer_class = serializers.CreditAccountSerializer
     permission_classes = [permissions.IsAuthenticated]
 
+    @conditional_on_versions(
+        lambda pk=None, **kwargs: db_utils.account_version_key(pk),
+        db_utils.RESOURCE_CLASS_VERSION,
+    )
     def retrieve(self, request, pk=None):
-        """Retreives a Credit Account Summary"""
-        # TODO(tylerchristie): refactor
+        """Retreives a Credit Account Summary
+
+        The consumers of large accounts are streamed, a chunk at a time, so
+        the whole summary is never held in memory.
+        """
         queryset = models.CreditAccount.objects.all()
         account = get_object_or_404(queryset, pk=pk)
         serializer = serializers.CreditAccountSerializer(
@@ -166,49 +410,112 @@ class AccountViewSet(viewsets.ModelViewSet):
         allocations = serializers.CreditAllocationSerializer(
             all_allocations_query, many=True, context={"request": request}
         )
-
-        # TODO(johngarbutt) look for any during the above allocations
-        consumers_query = models.Consumer.objects.filter(
-            resource_provider_account__account__pk=pk
-        )
-        consumers = serializers.Consumer(
-            consumers_query, many=True, context={"request": request}
-        )
-
         account_summary["allocations"] = allocations.data
-        account_summary["consumers"] = consumers.data
 
-        all_allocation_resources_query = models.CreditAllocationResource.objects.filter(
+        resources_by_allocation = {}
+        for resource in models.CreditAllocationResource.objects.filter(
             allocation__account__pk=pk
-        )
-        # add resource_hours_remaining... must be a better way!
+        ).select_related("resource_class"):
+            resources_by_allocation.setdefault(resource.allocation_id, []).append(
+                resource
+            )
+        # Consumers that have been archived are no longer listed,
+        # but still count towards the hours used.
+        archived_resource_hours = archive.get_archived_resource_hours(pk)
+        consumed_resource_hours = db_utils.get_consumed_resource_hours(pk)
         # TODO(johngarbut) we don't check the dates line up!!
         for allocation in account_summary["allocations"]:
-            resources_for_allocation_query = all_allocation_resources_query.filter(
-                allocation__id=allocation["id"]
-            )
             resources_for_allocation = serializers.CreditAllocationResourceSerializer(
-                resources_for_allocation_query, many=True, context={"request": request}
+                resources_by_allocation.get(allocation["id"], []),
+                many=True,
+                context={"request": request},
             )
             allocation["resources"] = resources_for_allocation.data
             for resource_allocation in allocation["resources"]:
-                if "resource_hours_remaining" not in resource_allocation:
-                    resource_allocation["resource_hours_remaining"] = (
-                        resource_allocation["resource_hours"]
-                    )
-                for consumer in account_summary["consumers"]:
-                    for resource_consumer in consumer["resources"]:
-                        consume_resource = resource_consumer["resource_class"]["name"]
-                        if (
-                            resource_allocation["resource_class"]["name"]
-                            == consume_resource  # noqa: W503
-                        ):
-                            resource_allocation["resource_hours_remaining"] -= float(
-                                resource_consumer["resource_hours"]
-                            )
+                name = resource_allocation["resource_class"]["name"]
+                resource_allocation["resource_hours_remaining"] = (
+                    resource_allocation["resource_hours"]
+                    - archived_resource_hours.get(name, 0)
+                    - consumed_resource_hours.get(name, 0)
+                )
 
+        # TODO(johngarbutt) look for any during the above allocations
+        consumers_query = (
+            models.Consumer.objects.filter(resource_provider_account__account__pk=pk)
+            .select_related("resource_provider_account")
+            .prefetch_related("resources__resource_class")
+            .order_by("pk")
+        )
+        threshold = getattr(
+            settings,
+            "ACCOUNT_SUMMARY_STREAM_THRESHOLD",
+            ACCOUNT_SUMMARY_STREAM_THRESHOLD,
+        )
+        if (
+            request.accepted_renderer.format == "json"
+            and consumers_query.count() > threshold
+        ):
+            # The consumers are read after the view has returned, outside the
+            # replica middleware, so keep them on the database chosen for the
+            # request
+            consumers_query = consumers_query.using(consumers_query.db)
+            response = StreamingHttpResponse(
+                _stream_account_summary(request, account_summary, consumers_query),
+                content_type=request.accepted_renderer.media_type,
+            )
+            response["Vary"] = "Accept"
+            return response
+
+        consumers = serializers.Consumer(
+            consumers_query, many=True, context={"request": request}
+        )
+        account_summary["consumers"] = consumers.data
         return Response(account_summary)
 
+    @action(detail=False, methods=["get", "post"], url_path="balances")
+    def balances(self, request):
+        """Allocated, remaining and reserved hours of many accounts at once.
+
+        Example Request:
+        POST /account/balances
+        {
+            "accounts": [1, 2],
+            "project_ids": ["20354d7a-e4fe-47af-8ff6-187bca92f3f9"]
+        }
+
+        Or GET /account/balances?accounts=1&project_ids=..., repeating each
+        parameter as needed.
+        """
+        data = request.query_params if request.method == "GET" else request.data
+        query = serializers.BalancesQuerySerializer(data=data)
+        query.is_valid(raise_exception=True)
+        return Response(
+            db_utils.get_account_balances(
+                query.validated_data.get("accounts", []),
+                query.validated_data.get("project_ids", []),
+                timezone.now(),
+            )
+        )
+
+    @action(detail=True, methods=["get"], url_path="balance")
+    def balance(self, request, pk=None):
+        """Resource hours left in the account's allocations at a point in time.
+
+        Example Request:
+        GET /account/1/balance?at=2026-03-01T00:00:00Z
+
+        Defaults to the current balance. Balances are kept after an account
+        is deleted, so can still be queried.
+        """
+        if not pk.isdigit():
+            raise Http404
+        query = serializers.BalanceQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        at = query.validated_data.get("at") or timezone.now()
+        return Response(
+            {"account": int(pk), "at": at, "resources": history.balance_at(pk, at)}
+        )
+
     def destroy(self, request, pk=None):
         account = get_object_or_404(self.queryset, pk=pk)
         linked_consumers = models.Consumer.objects.filter(
@@ -217,14 +524,94 @@ class AccountViewSet(viewsets.ModelViewSet):
         return destroy_if_no_active_consumers(linked_consumers, request, super())
 
 
+class UsageViewSet(viewsets.GenericViewSet):
+    serializer_class = serializers.UsageRollupSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def list(self, request):
+        """Hourly or daily resource hours for each project and resource class.
+
+        Example Request:
+        GET /usage?period=day&start=2026-01-01T00:00:00Z&end=2026-02-01T00:00:00Z
+
+        Results can be filtered by account, project_id and resource_class.
+        """
+        query = serializers.UsageQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        query = query.validated_data
+
+        usage = models.UsageRollup.objects.filter(
+            period=query["period"],
+            start__gte=rollups.period_start(query["start"], query["period"]),
+            start__lt=query["end"],
+        )
+        if "account" in query:
+            usage = usage.filter(resource_provider_account__account_id=query["account"])
+        if "project_id" in query:
+            usage = usage.filter(
+                resource_provider_account__project_id=query["project_id"]
+            )
+        if "resource_class" in query:
+            usage = usage.filter(resource_class__name=query["resource_class"])
+        usage = usage.select_related(
+            "resource_provider_account__provider", "resource_class"
+        ).order_by("start", "resource_provider_account", "resource_class")
+
+        serializer = self.get_serializer(usage, many=True)
+        return Response(serializer.data)
+
+
+class CapacityViewSet(viewsets.GenericViewSet):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def list(self, request):
+        """Resource hours committed to consumers for each provider and class.
+
+        Example Request:
+        GET /capacity?period=day&start=2026-01-01T00:00:00Z&end=2026-02-01T00:00:00Z
+
+        Results can be filtered by account, project_id, provider and
+        resource_class.
+        """
+        query = serializers.CapacityQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        query = query.validated_data
+
+        filters = {}
+        for param, lookup in (
+            ("account", "consumer__resource_provider_account__account_id"),
+            ("project_id", "consumer__resource_provider_account__project_id"),
+            ("provider", "consumer__resource_provider_account__provider__name"),
+            ("resource_class", "resource_class__name"),
+        ):
+            if param in query:
+                filters[lookup] = query[param]
+        return Response(
+            capacity.timeline(query["start"], query["end"], query["period"], **filters)
+        )
+
+
 class ConsumerViewSet(viewsets.ModelViewSet):
     queryset = models.Consumer.objects.all()
     permission_classes = [permissions.IsAuthenticated]
     serializer_class = serializers.ConsumerRequestSerializer
 
+    def dispatch(self, request, *args, **kwargs):
+        action = self.action_map.get(request.method.lower(), "unknown")
+        with tracing.span(f"ConsumerViewSet.{action}"):
+            return super().dispatch(request, *args, **kwargs)
+
     # TODO(wtripp180901): need to split the Consumer and ConsumerRequest logic really
+    def get_queryset(self):
+        return (
+            super()
+            .get_queryset()
+            .select_related("resource_provider_account")
+            .prefetch_related("resources__resource_class")
+        )
+
     def retrieve(self, request, pk=None):
-        consumer = get_object_or_404(self.queryset, pk=pk)
+        consumer = get_object_or_404(self.get_queryset(), pk=pk)
         serializer = serializers.Consumer(consumer, context={"request": request})
         return Response(serializer.data)
 
@@ -232,16 +619,18 @@ class ConsumerViewSet(viewsets.ModelViewSet):
     # actually in the database
     def list(self, request):
         serializer = serializers.Consumer(
-            self.queryset, many=True, context={"request": request}
+            self.get_queryset(), many=True, context={"request": request}
         )
         return Response(serializer.data)
 
     @action(detail=False, methods=["post"], url_path="create")
+    @replay_consumer_commits
     def create_consumer(self, request):
         LOG.info(f"About to process create commit:\n{request.data}")
         return self._create_or_update(request)
 
     @action(detail=False, methods=["post"], url_path="update")
+    @replay_consumer_commits
     def update_consumer(self, request):
         return self._create_or_update(request, current_lease_required=True)
 
@@ -256,12 +645,12 @@ class ConsumerViewSet(viewsets.ModelViewSet):
         )
 
     @action(detail=False, methods=["post"], url_path="on-end")
+    @replay_consumer_commits
     def on_end(self, request):
         # For a deletion, we convert this to an update request
         # With the new lease's end date set to now.
         # TODO(tylerchristie) this is not very nice. we can probably do better.
         if request.data["lease"]:
-            request.data["current_lease"] = copy.deepcopy(request.data["lease"])
             if ("start_date" and "end_date") in request.data["lease"]:
                 time_now = make_aware(datetime.now())
                 # Current vs upcoming deletion
@@ -298,6 +687,9 @@ class ConsumerViewSet(viewsets.ModelViewSet):
         context, lease, current_lease = self._validate_request(
             request, current_lease_required
         )
+        current_span = tracing.current_span()
+        current_span.set_attribute("coral.lease_id", str(lease.id))
+        current_span.set_attribute("coral.project_id", str(context.project_id))
 
         LOG.info(
             f"Incoming Request - Context: {context}, Lease: {lease}, "
@@ -312,15 +704,37 @@ class ConsumerViewSet(viewsets.ModelViewSet):
             resource_provider_account = db_utils.get_resource_provider_account(
                 context.project_id
             )
-            credit_allocations = db_utils.get_all_credit_allocations(
-                resource_provider_account
-            )
         except models.Consumer.DoesNotExist:
             return _http_403_forbidden("No matching record found for current lease")
         except models.ResourceProviderAccount.DoesNotExist:
             return _http_403_forbidden("No matching ResourceProviderAccount found")
+
+        try:
+            lease = pricing.price_lease(lease)
+        except db_exceptions.ResourceRequestFormatError as e:
+            # Reservations that can't be priced
+            return _http_403_forbidden(repr(e))
+
+        # Repeated dry runs are answered without checking the allocations,
+        # until the account's balance changes
+        decision_key = None
+        if dry_run:
+            decision_key = dry_runs.decision_key(
+                resource_provider_account, lease, current_lease
+            )
+            decision = dry_runs.get(decision_key)
+            if decision is not None:
+                current_span.set_attribute("coral.cached_decision", True)
+                return decision
+
+        try:
+            credit_allocations = db_utils.get_all_credit_allocations(
+                resource_provider_account
+            )
         except models.CreditAllocation.DoesNotExist:
-            return _http_403_forbidden("No active CreditAllocation found")
+            return dry_runs.remember(
+                decision_key, _http_403_forbidden("No active CreditAllocation found")
+            )
 
         # Check resource credit availability (first check)
         try:
@@ -336,13 +750,13 @@ class ConsumerViewSet(viewsets.ModelViewSet):
             db_utils.check_credit_allocations(resource_requests, allocation_hours)
         except db_exceptions.ResourceRequestFormatError as e:
             # Incorrect resource request format
-            return _http_403_forbidden(repr(e))
+            return dry_runs.remember(decision_key, _http_403_forbidden(repr(e)))
         except db_exceptions.InsufficientCredits as e:
             # Insufficient credits
-            return _http_403_forbidden(repr(e))
+            return dry_runs.remember(decision_key, _http_403_forbidden(repr(e)))
         except db_exceptions.NoCreditAllocation as e:
             # No credit for resource class
-            return _http_403_forbidden(repr(e))
+            return dry_runs.remember(decision_key, _http_403_forbidden(repr(e)))
 
         # Don't modify the database on a dry_run
         if not dry_run:
@@ -369,22 +783,19 @@ class ConsumerViewSet(viewsets.ModelViewSet):
 
             return _http_204_no_content("Consumer and resources requested successfully")
 
-        return _http_204_no_content(
-            "Account has sufficient resources to fufill request"
+        return dry_runs.remember(
+            decision_key,
+            _http_204_no_content("Account has sufficient resources to fufill request"),
         )
 
     def _validate_request(self, request, current_lease_required):
-        resource_request = serializers.ConsumerRequestSerializer(
-            data=request.data, current_lease_required=current_lease_required
-        )
-        resource_request.is_valid(raise_exception=True)
-        consumer_create_request = resource_request.create(
-            resource_request.validated_data
+        consumer_request = decoders.decode_consumer_request(
+            request.data, current_lease_required=current_lease_required
         )
         return (
-            consumer_create_request.context,
-            consumer_create_request.lease,
-            consumer_create_request.current_lease,
+            consumer_request.context,
+            consumer_request.lease,
+            consumer_request.current_lease,
         )
 
 
@@ -0,0 +1,145 @@
+"""Routing of reads to a read replica of the database.
+
+Reads only go to the replica inside replica_reads(), which is used for
+safe (GET, HEAD and OPTIONS) requests and for the metrics collector.
+Everything else, including all writes and any reads made by a request that
+writes, uses the primary. Management commands and transactions that lock
+rows therefore never read from the replica.
+
+After an authenticated client makes a write that succeeds, its requests are
+pinned to the primary for PRIMARY_PIN_SECONDS, so it can read its own writes
+while the replica catches up. Browsers are pinned with a cookie. API
+clients, which don't keep cookies, are pinned by their Authorization header,
+with the time of their last write kept in the PRIMARY_PIN_CACHE cache, which
+must be shared by the processes serving the API. REPLICA_DATABASE,
+PRIMARY_PIN_SECONDS and PRIMARY_PIN_CACHE can be overridden in the Django
+settings. Without a database of the replica alias, everything uses the
+primary.
+"""
+
+from contextlib import contextmanager
+import contextvars
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS
+
+REPLICA_DATABASE = "replica"
+PRIMARY_PIN_SECONDS = 5
+PRIMARY_PIN_COOKIE = "coral_primary_until"
+PRIMARY_PIN_CACHE = "default"
+PRIMARY_PIN_CACHE_PREFIX = "primary_pin:"
+
+_use_replica = contextvars.ContextVar("use_replica", default=False)
+_wrote = contextvars.ContextVar("wrote", default=False)
+
+
+def replica_alias():
+    """Returns the replica database alias, or None if there isn't one."""
+    alias = getattr(settings, "REPLICA_DATABASE", REPLICA_DATABASE)
+    return alias if alias in settings.DATABASES else None
+
+
+@contextmanager
+def replica_reads():
+    """Reads from the replica, until the first write."""
+    token = _use_replica.set(True)
+    try:
+        yield
+    finally:
+        _use_replica.reset(token)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if _use_replica.get():
+            return replica_alias() or DEFAULT_DB_ALIAS
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        # Read your own writes for the rest of the request
+        _use_replica.set(False)
+        _wrote.set(True)
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica is a copy of the primary
+        return db == DEFAULT_DB_ALIAS
+
+
+class ReplicaMiddleware:
+    """Uses the replica for safe requests, unless the client just wrote."""
+
+    SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if replica_alias() is None:
+            return self.get_response(request)
+
+        if request.method in self.SAFE_METHODS and not self._pinned(request):
+            with replica_reads():
+                return self.get_response(request)
+
+        token = _wrote.set(False)
+        try:
+            response = self.get_response(request)
+            wrote = _wrote.get()
+        finally:
+            _wrote.reset(token)
+        # Only pin clients that wrote something, so failed requests, dry runs
+        # and unauthenticated clients can't fill the cache
+        user = getattr(request, "user", None)
+        if (
+            request.method not in self.SAFE_METHODS
+            and wrote
+            and 200 <= response.status_code < 300
+            and user is not None
+            and user.is_authenticated
+        ):
+            pin_seconds = self._pin_seconds()
+            now = time.time()
+            credential_key = self._credential_key(request)
+            if credential_key is not None:
+                self._cache().set(credential_key, now, timeout=pin_seconds)
+            response.set_cookie(
+                PRIMARY_PIN_COOKIE,
+                str(now + pin_seconds),
+                max_age=pin_seconds,
+                secure=request.is_secure(),
+                httponly=True,
+                samesite="Lax",
+            )
+        return response
+
+    def _pin_seconds(self):
+        return getattr(settings, "PRIMARY_PIN_SECONDS", PRIMARY_PIN_SECONDS)
+
+    def _cache(self):
+        return caches[getattr(settings, "PRIMARY_PIN_CACHE", PRIMARY_PIN_CACHE)]
+
+    def _credential_key(self, request):
+        authorization = request.META.get("HTTP_AUTHORIZATION")
+        if not authorization:
+            return None
+        digest = hashlib.sha256(authorization.encode()).hexdigest()
+        return PRIMARY_PIN_CACHE_PREFIX + digest
+
+    def _pinned(self, request):
+        try:
+            if float(request.COOKIES.get(PRIMARY_PIN_COOKIE, 0)) > time.time():
+                return True
+        except ValueError:
+            pass
+        credential_key = self._credential_key(request)
+        if credential_key is None:
+            return False
+        wrote_at = self._cache().get(credential_key)
+        return wrote_at is not None and wrote_at + self._pin_seconds() > time.time()
@@ -0,0 +1,97 @@
+"""Prometheus metrics for the API.
+
+Request counters and latency histograms are recorded by every worker. When
+PROMETHEUS_MULTIPROC_DIR is set, before prometheus_client is imported, each
+worker writes its samples to that directory and a scrape of any worker, or of
+the metrics server, returns the totals across all of them.
+
+The allocation gauges query the database on every scrape, so they are only
+served by the dedicated metrics server (manage.py serve_metrics), never by
+the API workers.
+"""
+
+import os
+import time
+
+from django.db import connections
+from prometheus_client import REGISTRY, CollectorRegistry, Counter, Histogram
+from prometheus_client import multiprocess
+from prometheus_client.registry import Collector
+
+from coral_credits import db_router
+
+METRICS_VIEW_NAME = "prometheus-metrics"
+# Requests with this set in their WSGI environ, such as those made by the
+# warm-up, weren't served to anyone so aren't counted
+UNCOUNTED_ENVIRON_KEY = "coral_credits.uncounted"
+
+REQUESTS = Counter(
+    "coral_credits_http_requests",
+    "HTTP requests handled by the API",
+    labelnames=["method", "view", "status"],
+)
+REQUEST_LATENCY = Histogram(
+    "coral_credits_http_request_duration_seconds",
+    "Time taken to handle HTTP requests",
+    labelnames=["method", "view"],
+)
+
+
+def multiprocess_dir():
+    return os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+
+
+class AllocationCollector(Collector):
+    """Collects the credit allocation gauges from the database.
+
+    The gauges are read from the replica database, if there is one. Scrapes
+    are served from a new thread each time, so the thread's database
+    connections are closed once the scrape is done.
+    """
+
+    def collect(self):
+        from coral_credits.prom_exporter import CustomCollector
+
+        try:
+            with db_router.replica_reads():
+                metrics = list(CustomCollector().collect())
+        finally:
+            connections.close_all()
+        yield from metrics
+
+
+def get_registry(include_allocations=False):
+    """Returns the registry to expose.
+
+    In multi-process mode this combines the samples written by every worker.
+    """
+    if multiprocess_dir():
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    elif include_allocations:
+        registry = CollectorRegistry()
+    else:
+        return REGISTRY
+    if include_allocations:
+        registry.register(AllocationCollector())
+    return registry
+
+
+class PrometheusMiddleware:
+    """Counts and times requests, labelled by the view that handled them."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        start = time.perf_counter()
+        response = self.get_response(request)
+        match = request.resolver_match
+        view = match.view_name if match else "unresolved"
+        uncounted = request.META.get(UNCOUNTED_ENVIRON_KEY, False)
+        if view != METRICS_VIEW_NAME and not uncounted:
+            REQUEST_LATENCY.labels(request.method, view).observe(
+                time.perf_counter() - start
+            )
+            REQUESTS.labels(request.method, view, response.status_code).inc()
+        return response
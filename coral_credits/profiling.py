@@ -0,0 +1,141 @@
+"""Opt-in profiling of individual requests.
+
+Profiling is off unless PROFILING_ENABLED is set, in which case a request is
+profiled when either:
+
+* it has an X-Profile header matching PROFILING_TOKEN, or
+* it is picked at random, with probability PROFILING_SAMPLE_RATE.
+
+The report has the time spent in each function, from cProfile, and every SQL
+query run with its duration. If PROFILING_DIR is set the report is written
+there, otherwise it is logged. A request with the header also gets a summary
+back in the X-Profile response header.
+
+When profiling is disabled the middleware removes itself at startup, so it
+costs nothing.
+"""
+
+from contextlib import ExitStack
+import cProfile
+import hmac
+import io
+import logging
+import os
+import pstats
+import random
+import re
+import time
+import uuid
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+LOG = logging.getLogger(__name__)
+
+PROFILING_ENABLED = False
+PROFILING_TOKEN = None
+PROFILING_SAMPLE_RATE = 0.0
+PROFILING_DIR = None
+# Functions listed in the report, by cumulative time
+PROFILING_TOP_FUNCTIONS = 40
+
+PROFILE_HEADER = "X-Profile"
+
+
+class QueryRecorder:
+    """Records the SQL run on a connection, with the time each query took."""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append(
+                (context["connection"].alias, time.perf_counter() - start, sql)
+            )
+
+    @property
+    def total_time(self):
+        return sum(duration for _, duration, _ in self.queries)
+
+
+class ProfilingMiddleware:
+    """Profiles requests that ask for it, and a sample of the others."""
+
+    def __init__(self, get_response):
+        if not getattr(settings, "PROFILING_ENABLED", PROFILING_ENABLED):
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+        self.token = getattr(settings, "PROFILING_TOKEN", PROFILING_TOKEN)
+        self.sample_rate = getattr(
+            settings, "PROFILING_SAMPLE_RATE", PROFILING_SAMPLE_RATE
+        )
+        self.directory = getattr(settings, "PROFILING_DIR", PROFILING_DIR)
+        self.top_functions = getattr(
+            settings, "PROFILING_TOP_FUNCTIONS", PROFILING_TOP_FUNCTIONS
+        )
+
+    def __call__(self, request):
+        requested = self._requested(request)
+        if not requested and random.random() >= self.sample_rate:
+            return self.get_response(request)
+
+        recorder = QueryRecorder()
+        profiler = cProfile.Profile()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            start = time.perf_counter()
+            profiler.enable()
+            try:
+                response = self.get_response(request)
+            finally:
+                profiler.disable()
+            elapsed = time.perf_counter() - start
+
+        summary = (
+            f"total={elapsed:.4f}s; queries={len(recorder.queries)}; "
+            f"sql={recorder.total_time:.4f}s"
+        )
+        report = self._report(request, response, summary, recorder, profiler)
+        if self.directory:
+            name = self._write_report(request, report)
+            summary += f"; report={name}"
+        else:
+            LOG.info(f"Profiled {request.method} {request.path}:\n{report}")
+        if requested:
+            response[PROFILE_HEADER] = summary
+        return response
+
+    def _requested(self, request):
+        header = request.headers.get(PROFILE_HEADER)
+        if not header or not self.token:
+            return False
+        return hmac.compare_digest(header.encode(), self.token.encode())
+
+    def _report(self, request, response, summary, recorder, profiler):
+        report = io.StringIO()
+        report.write(f"{request.method} {request.get_full_path()}\n")
+        report.write(f"status={response.status_code}; {summary}\n\n")
+        report.write("SQL queries, in the order they ran:\n")
+        for alias, duration, sql in recorder.queries:
+            report.write(f"{duration:.4f}s [{alias}] {sql}\n")
+        report.write("\n")
+        stats = pstats.Stats(profiler, stream=report)
+        stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(self.top_functions)
+        return report.getvalue()
+
+    def _write_report(self, request, report):
+        slug = re.sub(r"[^A-Za-z0-9]+", "-", request.path).strip("-") or "root"
+        name = (
+            f"{time.strftime('%Y%m%dT%H%M%S')}-{request.method.lower()}-{slug}-"
+            f"{uuid.uuid4().hex[:8]}.txt"
+        )
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, name), "w") as f:
+            f.write(report)
+        return name
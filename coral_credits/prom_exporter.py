@@ -1,8 +1,10 @@
+from collections import defaultdict
 from datetime import datetime
 from itertools import chain
 import logging
 import traceback
 
+from django.conf import settings
 from django.db.utils import OperationalError
 from django.utils.timezone import make_aware
 from prometheus_client.core import GaugeMetricFamily
@@ -12,6 +14,16 @@ from coral_credits.api import db_utils
 
 LOG = logging.getLogger(__name__)
 
+# The per consumer gauge only has series for the largest consumers in each
+# project, with the hours of the remaining consumers added up in a
+# lease_id="other" series for the project. There are at most
+# PROMETHEUS_CONSUMER_MAX_SERIES series in total, counting the "other" series:
+# projects beyond the limit are added up in a series with project_id="other"
+# for each resource class, so the limit is at least the number of resource
+# classes. Both can be overridden in the Django settings.
+PROMETHEUS_CONSUMER_TOP_N = 5
+PROMETHEUS_CONSUMER_MAX_SERIES = 1000
+
 
 def get_credit_allocation_date(date_type):
     try:
@@ -92,6 +104,77 @@ def get_reserved_hours():
         LOG.error(f"Traceback: {traceback.format_exc()}")
 
 
+def get_reclaimable_hours():
+    try:
+        reclaimable = db_utils.get_reclaimable_resource_hours(
+            make_aware(datetime.now())
+        )
+        # project_id, resource_class, provider, resource_hours
+        for (pid, rc, prov), hours in reclaimable.items():
+            yield pid, rc, prov, hours
+    # Database not yet ready
+    except OperationalError as e:
+        LOG.warning(f"Database not ready yet: {e}")
+    except Exception as e:
+        LOG.error(f"Unexpected exception: {e}")
+        LOG.error(f"Traceback: {traceback.format_exc()}")
+
+
+def get_reserved_hours_per_consumer():
+    try:
+        top_n = getattr(
+            settings, "PROMETHEUS_CONSUMER_TOP_N", PROMETHEUS_CONSUMER_TOP_N
+        )
+        max_series = getattr(
+            settings, "PROMETHEUS_CONSUMER_MAX_SERIES", PROMETHEUS_CONSUMER_MAX_SERIES
+        )
+        records = db_utils.get_largest_active_consumers(
+            make_aware(datetime.now()), top_n
+        )
+        totals = {(pid, rc, prov): total for _, _, pid, rc, prov, _, total in records}
+        # There must be room for an overflow series for every resource class
+        max_series = max(max_series, len({rc for _, rc, _ in totals}))
+
+        # Projects with the most hours keep their own "other" series, the rest
+        # are added up in one overflow series for each resource class
+        groups = sorted(totals, key=totals.get, reverse=True)
+        kept_count = min(len(groups), max_series)
+        while True:
+            overflow = groups[kept_count:]
+            overflow_classes = {rc for _, rc, _ in overflow}
+            if kept_count + len(overflow_classes) <= max_series:
+                break
+            kept_count -= 1
+        kept = set(groups[:kept_count])
+        # Whatever is left is shared by the largest consumers of the kept
+        # projects
+        budget = max_series - kept_count - len(overflow_classes)
+        records = [record for record in records if record[2:5] in kept]
+        records.sort(key=lambda record: record[5], reverse=True)
+
+        shown_hours = defaultdict(int)
+        # lease_id, user_id, project_id, resource_class, provider, resource_hours
+        for lease_id, user_id, pid, rc, prov, hours, _ in records[:budget]:
+            shown_hours[(pid, rc, prov)] += hours
+            yield lease_id, user_id, pid, rc, prov, hours
+        for key in groups:
+            if key in kept:
+                other_hours = totals[key] - shown_hours[key]
+                if other_hours:
+                    yield ("other", "", *key, other_hours)
+        overflow_hours = defaultdict(int)
+        for pid, rc, prov in overflow:
+            overflow_hours[rc] += totals[(pid, rc, prov)]
+        for rc, hours in sorted(overflow_hours.items()):
+            yield "other", "", "other", rc, "other", hours
+    # Database not yet ready
+    except OperationalError as e:
+        LOG.warning(f"Database not ready yet: {e}")
+    except Exception as e:
+        LOG.error(f"Unexpected exception: {e}")
+        LOG.error(f"Traceback: {traceback.format_exc()}")
+
+
 def get_total_hours():
     total_hours = {}
 
@@ -147,20 +230,34 @@ class CustomCollector(Collector):
             )
         yield coral_credits_allocation_hours_reserved_per_project
 
-        # TODO(tylerchristie): leaving this one for now as it's hard
-        # coral_credits_allocation_hours_reclaimable_per_project = GaugeMetricFamily(
-        #     "coral_credits_allocation_hours_reclaimable_per_project",
-        #     "How many hours can be freed up from reservations",
-        #     labels=["project_id", "resource_class", "provider"],
-        # )
-        # yield coral_credits_allocation_hours_reclaimable_per_project
-
-        # coral_credits_allocation_hours_reserved_per_consumer = GaugeMetricFamily(
-        #     "coral_credits_allocation_hours_reserved_per_consumer",
-        #     "The amount of resource each reservation is allocated.",
-        #    labels=["lease_id", "user_id", "project_id", "resource_class", "provider"],
-        # )
-        # yield coral_credits_allocation_hours_reserved_per_consumer
+        coral_credits_allocation_hours_reclaimable_per_project = GaugeMetricFamily(
+            "coral_credits_allocation_hours_reclaimable_per_project",
+            "How many hours can be freed up from reservations",
+            labels=["project_id", "resource_class", "provider"],
+        )
+        for pid, rc, prov, hours in get_reclaimable_hours():
+            coral_credits_allocation_hours_reclaimable_per_project.add_metric(
+                [pid, rc, prov], hours
+            )
+        yield coral_credits_allocation_hours_reclaimable_per_project
+
+        coral_credits_allocation_hours_reserved_per_consumer = GaugeMetricFamily(
+            "coral_credits_allocation_hours_reserved_per_consumer",
+            "The amount of resource each reservation is allocated.",
+            labels=["lease_id", "user_id", "project_id", "resource_class", "provider"],
+        )
+        for (
+            lease_id,
+            user_id,
+            pid,
+            rc,
+            prov,
+            hours,
+        ) in get_reserved_hours_per_consumer():
+            coral_credits_allocation_hours_reserved_per_consumer.add_metric(
+                [lease_id, user_id, pid, rc, prov], hours
+            )
+        yield coral_credits_allocation_hours_reserved_per_consumer
 
         # TODO(tylerchristie) question here: technically an account can have
         # multiple CreditAllocations, so is this metric 3 dimensional?
@@ -0,0 +1,43 @@
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils import encoders
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+# Datetimes are passed through to the DRF encoder so they are formatted
+# exactly as the default renderer would, e.g. with a "Z" suffix for UTC.
+ORJSON_OPTIONS = (
+    orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME if orjson else 0
+)
+
+
+class ORJSONRenderer(JSONRenderer):
+    """Renders JSON using orjson, falling back to the DRF renderer.
+
+    The fallback is used when orjson is not installed, or when the output needs
+    options orjson doesn't support, such as an indent or ASCII escaping.
+    """
+
+    encoder = encoders.JSONEncoder()
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (
+            orjson is None
+            or self.ensure_ascii
+            or self.get_indent(accepted_media_type, renderer_context or {})
+        ):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        if data is None:
+            return b""
+
+        ret = orjson.dumps(data, default=self.encoder.default, option=ORJSON_OPTIONS)
+        # As with the DRF renderer, we always fully escape \u2028 and \u2029
+        # to ensure we output JSON that is a strict javascript subset.
+        if b"\xe2\x80\xa8" in ret or b"\xe2\x80\xa9" in ret:
+            ret = ret.replace(b"\xe2\x80\xa8", b"\\u2028").replace(
+                b"\xe2\x80\xa9", b"\\u2029"
+            )
+        return ret
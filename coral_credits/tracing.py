@@ -0,0 +1,158 @@
+"""Tracing of the consumer credit checks.
+
+Spans follow the OpenTelemetry model: each has a trace id, its own id, its
+parent's id, a start time, a duration and attributes. Every database query
+made inside a trace is recorded as a child span, with the SQL in its
+db.statement attribute.
+
+Tracing is off unless TRACING_ENABLED is set. The spans of each trace are
+exported as JSON lines when the trace ends, appended to TRACING_FILE if it
+is set and printed to stdout otherwise, so no collector is needed. When
+tracing is disabled, traced functions only pay for checking the setting.
+"""
+
+from contextlib import ExitStack, contextmanager
+import contextvars
+import functools
+import json
+import os
+import sys
+import threading
+import time
+
+from django.conf import settings
+from django.db import connections
+
+TRACING_ENABLED = False
+TRACING_FILE = None
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+_export_lock = threading.Lock()
+
+
+class Span:
+    __slots__ = (
+        "name",
+        "trace_id",
+        "span_id",
+        "parent",
+        "attributes",
+        "start",
+        "duration",
+        "status",
+        "finished",
+    )
+
+    def __init__(self, name, parent, attributes):
+        self.name = name
+        self.parent = parent
+        self.trace_id = parent.trace_id if parent else os.urandom(16).hex()
+        self.span_id = os.urandom(8).hex()
+        self.attributes = attributes
+        self.start = time.time_ns()
+        self.duration = None
+        self.status = "OK"
+        # Spans of the trace that have ended, kept by the root span
+        self.finished = [] if parent is None else None
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent.span_id if self.parent else None,
+            "start_time_unix_nano": self.start,
+            "duration_ms": self.duration / 1e6,
+            "status": self.status,
+            "attributes": self.attributes,
+        }
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def set_attribute(self, key, value):
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+def enabled():
+    return getattr(settings, "TRACING_ENABLED", TRACING_ENABLED)
+
+
+def current_span():
+    """Returns the span in progress, or a span that ignores attributes."""
+    return _current_span.get() or NOOP_SPAN
+
+
+@contextmanager
+def span(name, **attributes):
+    """Records a span, as a child of the span in progress if there is one."""
+    if not enabled():
+        yield NOOP_SPAN
+        return
+
+    parent = _current_span.get()
+    new_span = Span(name, parent, attributes)
+    token = _current_span.set(new_span)
+    with ExitStack() as stack:
+        if parent is None:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(_trace_query))
+        start = time.perf_counter_ns()
+        try:
+            yield new_span
+        except BaseException as e:
+            new_span.status = "ERROR"
+            new_span.set_attribute("exception.type", type(e).__name__)
+            raise
+        finally:
+            new_span.duration = time.perf_counter_ns() - start
+            _current_span.reset(token)
+            root = new_span
+            while root.parent is not None:
+                root = root.parent
+            root.finished.append(new_span)
+            if parent is None:
+                _export(new_span.finished)
+
+
+def traced(func):
+    """Records a span for each call of the function."""
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not enabled():
+            return func(*args, **kwargs)
+        with span(func.__qualname__):
+            return func(*args, **kwargs)
+
+    return wrapper
+
+
+def _trace_query(execute, sql, params, many, context):
+    with span(
+        "db.query",
+        **{"db.system": context["connection"].vendor, "db.statement": sql},
+    ):
+        return execute(sql, params, many, context)
+
+
+def _export(spans):
+    lines = "".join(
+        json.dumps(s.to_dict(), default=str, separators=(",", ":")) + "\n"
+        for s in spans
+    )
+    path = getattr(settings, "TRACING_FILE", TRACING_FILE)
+    with _export_lock:
+        if path:
+            with open(path, "a") as f:
+                f.write(lines)
+        else:
+            sys.stdout.write(lines)
+            sys.stdout.flush()
@@ -22,6 +22,7 @@ from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
 from rest_framework.authtoken import views as drfviews
 from rest_framework_nested import routers
 
+from coral_credits import metrics
 from coral_credits.api import views
 
 # setup to endpoints to support both with and without trailing slashes
@@ -49,6 +50,10 @@ router.register(
 )
 router.register(r"account", views.AccountViewSet, basename="creditaccount")
 router.register(r"account/", views.AccountViewSet, basename="creditaccountslash")
+router.register(r"usage", views.UsageViewSet, basename="usage")
+router.register(r"usage/", views.UsageViewSet, basename="usageslash")
+router.register(r"capacity", views.CapacityViewSet, basename="capacity")
+router.register(r"capacity/", views.CapacityViewSet, basename="capacityslash")
 router.register(r"consumer", views.ConsumerViewSet, basename="resource-request")
 router.register(r"consumer/", views.ConsumerViewSet, basename="resource-requestslash")
 
@@ -66,7 +71,9 @@ allocation_router.register(
 
 
 def prometheus_metrics(request):
-    return HttpResponse(generate_latest(), content_type=CONTENT_TYPE_LATEST)
+    return HttpResponse(
+        generate_latest(metrics.get_registry()), content_type=CONTENT_TYPE_LATEST
+    )
 
 
 def status(request):
@@ -77,7 +84,7 @@ def status(request):
 # Wire up our API using automatic URL routing.
 # Additionally, we include login URLs for the browsable API.
 urlpatterns = [
-    path("metrics/", prometheus_metrics, name="prometheus-metrics"),
+    path("metrics/", prometheus_metrics, name=metrics.METRICS_VIEW_NAME),
     path("_status/", status, name="status"),
     path("", include(router.urls)),
     path("", include(allocation_router.urls)),
@@ -0,0 +1,97 @@
+"""Warm-up of the app before it serves requests.
+
+Much of Django and DRF is set up lazily, on the first request that needs it:
+URL patterns are compiled, model metadata is built and the database backend
+is loaded. With gunicorn's preload_app, warm_up() is run in the master, so
+each forked worker starts with this already done.
+"""
+
+import io
+import logging
+import time
+from wsgiref.util import setup_testing_defaults
+
+from django.apps import apps
+from django.db import DatabaseError
+from django.urls import URLResolver, get_resolver
+from rest_framework.authtoken.models import Token
+
+from coral_credits import metrics
+from coral_credits.api import models
+
+LOG = logging.getLogger(__name__)
+
+# Requests made through the app to warm up the middleware, views, DRF
+# authentication and rendering. They are not counted in the request metrics.
+WARMUP_PATHS = ["/_status/", "/resource_class", "/account", "/consumer"]
+
+
+def compile_url_patterns(resolver=None):
+    """Compiles the regular expressions of every URL pattern."""
+    resolver = resolver or get_resolver()
+    # Builds the reverse lookup tables
+    resolver.reverse_dict
+    for pattern in resolver.url_patterns:
+        pattern.pattern.regex
+        if isinstance(pattern, URLResolver):
+            compile_url_patterns(pattern)
+
+
+def warm_orm():
+    """Builds model metadata, and runs the lookups made by most requests."""
+    for model in apps.get_models():
+        model._meta.get_fields()
+    try:
+        models.ResourceClass.objects.first()
+        models.ResourceProviderAccount.objects.select_related(
+            "account", "provider"
+        ).first()
+        Token.objects.select_related("user").first()
+    except DatabaseError as e:
+        LOG.warning(f"Unable to warm up database queries: {e}")
+
+
+def request(application, path, method="GET"):
+    """Makes a request through a WSGI application, and returns the status."""
+    environ = {
+        "PATH_INFO": path,
+        "REQUEST_METHOD": method,
+        "wsgi.input": io.BytesIO(),
+        metrics.UNCOUNTED_ENVIRON_KEY: True,
+    }
+    setup_testing_defaults(environ)
+    status = []
+    response = application(environ, lambda s, headers, exc_info=None: status.append(s))
+    try:
+        for _ in response:
+            pass
+    finally:
+        if hasattr(response, "close"):
+            response.close()
+    return status[0]
+
+
+def warm_up(application):
+    """Warms up the app, returning how long each step took.
+
+    Database connections are left open, so should be closed before forking.
+    """
+    timings = {}
+    start = time.perf_counter()
+    compile_url_patterns()
+    timings["url_patterns"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    warm_orm()
+    timings["orm"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for path in WARMUP_PATHS:
+        request(application, path)
+    timings["requests"] = time.perf_counter() - start
+
+    LOG.info(
+        "Warmed up in "
+        + ", ".join(f"{step} {seconds:.3f}s" for step, seconds in timings.items())
+    )
+    return timings
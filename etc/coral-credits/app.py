@@ -17,6 +17,9 @@ DATABASES = {
     }
 }
 
+# Safe requests and metrics read from a "replica" database, if one is defined
+DATABASE_ROUTERS = ["coral_credits.db_router.ReplicaRouter"]
+
 # Application definition
 
 INSTALLED_APPS = [
@@ -35,8 +38,17 @@ INSTALLED_APPS = [
 ]
 
 AUDITLOG_INCLUDE_ALL_MODELS = True
+AUDITLOG_EXCLUDE_TRACKING_MODELS = (
+    "api.ConsumerCommitReplay",
+    "api.VersionCounter",
+    "api.UsageRollup",
+    "api.UsageRollupConsumer",
+)
 
 MIDDLEWARE = [
+    "coral_credits.metrics.PrometheusMiddleware",
+    "coral_credits.profiling.ProfilingMiddleware",
+    "coral_credits.db_router.ReplicaMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -51,6 +63,15 @@ REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": [
         "coral_credits.auth.BearerTokenAuthentication",
     ],
+    "DEFAULT_RENDERER_CLASSES": [
+        "coral_credits.renderers.ORJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ],
+    "DEFAULT_PARSER_CLASSES": [
+        "coral_credits.parsers.ORJSONParser",
+        "rest_framework.parsers.FormParser",
+        "rest_framework.parsers.MultiPartParser",
+    ],
 }
 
 ROOT_URLCONF = "coral_credits.urls"
@@ -1,5 +1,6 @@
 # Default settings for gunicorn
 # Also allows for overriding with environment variables
+import glob
 import os
 
 # Configure the bind address
@@ -7,6 +8,44 @@ _host = os.environ.get("GUNICORN_HOST", "0.0.0.0")
 _port = os.environ.get("GUNICORN_PORT", "8080")
 bind = os.environ.get("GUNICORN_BIND", "{}:{}".format(_host, _port))
 
-# TODO(tylerchristie): configure workers and threads?
+# TODO(tylerchristie): configure threads?
+workers = int(os.environ.get("GUNICORN_WORKERS", "1"))
+
+# Preloading imports the app once in the master, which warms it up before
+# the workers are forked so they serve their first requests quickly
+# Note that the app is then only reloaded on a restart, not on a HUP
+preload_app = os.environ.get("GUNICORN_PRELOAD", "false").lower() == "true"
+
+# Prometheus multi-process mode
+# Each worker writes its metrics to PROMETHEUS_MULTIPROC_DIR, which must be
+# emptied before the workers start so counters don't carry over from the
+# last run.
+_prometheus_multiproc_dir = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+
+
+def on_starting(server):
+    if _prometheus_multiproc_dir:
+        os.makedirs(_prometheus_multiproc_dir, exist_ok=True)
+        for path in glob.glob(os.path.join(_prometheus_multiproc_dir, "*.db")):
+            os.remove(path)
+
+
+def when_ready(server):
+    if preload_app:
+        from django.db import connections
+
+        from coral_credits import warmup
+
+        warmup.warm_up(server.app.wsgi())
+        # Each worker must open its own database connections
+        connections.close_all()
+
+
+def child_exit(server, worker):
+    if _prometheus_multiproc_dir:
+        from prometheus_client import multiprocess
+
+        multiprocess.mark_process_dead(worker.pid)
+
 
 # TODO(tylerchristie): configure logging
@@ -0,0 +1,85 @@
+"""Micro-benchmark for decoding Blazar consumer requests.
+
+Measures the per-request cost of turning a consumer request into business
+objects, for leases with increasing numbers of reservations and allocations.
+
+Usage:
+    pip install -e .
+    python tools/benchmarks/decode_consumer_request.py [--repeat N]
+"""
+
+import argparse
+import os
+import timeit
+import uuid
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "coral_credits.api.tests.test_settings")
+
+import django  # noqa: E402
+
+django.setup()
+
+from coral_credits.api import decoders  # noqa: E402
+
+SIZES = [(1, 0), (10, 10), (100, 10), (1000, 5)]
+
+
+def make_request(reservations, allocations):
+    return {
+        "context": {
+            "user_id": str(uuid.uuid4()),
+            "project_id": str(uuid.uuid4()),
+            "auth_url": "https://api.example.com:5000/v3",
+            "region_name": "RegionOne",
+        },
+        "lease": {
+            "id": str(uuid.uuid4()),
+            "name": "benchmark_lease",
+            "start_date": "2026-01-01T00:00:00+00:00",
+            "end_date": "2026-01-02T00:00:00+00:00",
+            "before_end_date": None,
+            "reservations": [
+                {
+                    "resource_type": "flavor:instance",
+                    "amount": 2,
+                    "flavor_id": str(uuid.uuid4()),
+                    "affinity": None,
+                    "allocations": [
+                        {
+                            "id": str(uuid.uuid4()),
+                            "hypervisor_hostname": str(uuid.uuid4()),
+                            "extra": {},
+                        }
+                        for _ in range(allocations)
+                    ],
+                }
+                for _ in range(reservations)
+            ],
+            "resource_requests": {"DISK_GB": 35, "MEMORY_MB": 1000, "VCPU": 4},
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'reservations':>12} {'allocations':>12} {'per request':>14}")
+    for reservations, allocations in SIZES:
+        data = make_request(reservations, allocations)
+        number = max(1, 2000 // (reservations * max(allocations, 1)))
+        best = min(
+            timeit.repeat(
+                lambda: decoders.decode_consumer_request(data),
+                number=number,
+                repeat=args.repeat,
+            )
+        )
+        print(
+            f"{reservations:>12} {allocations:>12} " f"{best / number * 1e6:>11.1f} us"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""Benchmark for rendering and parsing API JSON payloads.
+
+Compares the DRF JSON renderer and parser with the orjson based ones, using an
+account summary shaped like the one returned by the account endpoint.
+
+Usage:
+    pip install -e .
+    python tools/benchmarks/render_json.py [--repeat N]
+"""
+
+import argparse
+import io
+import os
+import timeit
+import uuid
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "coral_credits.api.tests.test_settings")
+
+import django  # noqa: E402
+
+django.setup()
+
+from rest_framework.parsers import JSONParser  # noqa: E402
+from rest_framework.renderers import JSONRenderer  # noqa: E402
+
+from coral_credits.parsers import ORJSONParser  # noqa: E402
+from coral_credits.renderers import ORJSONRenderer  # noqa: E402
+
+SIZES = [10, 1000, 10000]
+RESOURCE_CLASSES = ["VCPU", "MEMORY_MB", "DISK_GB"]
+
+
+def resource_class(index, name):
+    return {
+        "id": index,
+        "url": f"https://coral.example.com/resource_class/{index}",
+        "name": name,
+        "created": "2026-01-01T00:00:00.123456Z",
+    }
+
+
+def make_account_summary(consumers):
+    return {
+        "id": 1,
+        "url": "https://coral.example.com/account/1",
+        "name": "benchmark",
+        "email": "benchmark@example.com",
+        "created": "2026-01-01T00:00:00.123456Z",
+        "allocations": [
+            {
+                "id": 1,
+                "name": "benchmark",
+                "created": "2026-01-01T00:00:00.123456Z",
+                "account": "https://coral.example.com/account/1",
+                "start": "2026-01-01T00:00:00Z",
+                "end": "2027-01-01T00:00:00Z",
+                "resources": [
+                    {
+                        "id": index,
+                        "resource_class": resource_class(index, name),
+                        "resource_hours": 1000000.0,
+                        "allocated_resource_hours": 2000000,
+                        "resource_hours_remaining": 500000.0,
+                    }
+                    for index, name in enumerate(RESOURCE_CLASSES)
+                ],
+            }
+        ],
+        "consumers": [
+            {
+                "id": consumer,
+                "consumer_ref": f"lease-{consumer}",
+                "resource_provider_account": {
+                    "id": 1,
+                    "url": "https://coral.example.com/resource_provider_account/1",
+                    "account": "https://coral.example.com/account/1",
+                    "provider": "https://coral.example.com/resource_provider/1",
+                    "project_id": str(uuid.uuid4()),
+                },
+                "start": "2026-02-01T00:00:00Z",
+                "end": "2026-02-02T00:00:00Z",
+                "resources": [
+                    {
+                        "resource_class": resource_class(index, name),
+                        "resource_hours": 24,
+                    }
+                    for index, name in enumerate(RESOURCE_CLASSES)
+                ],
+            }
+            for consumer in range(consumers)
+        ],
+    }
+
+
+def best(func, number, repeat):
+    return min(timeit.repeat(func, number=number, repeat=repeat)) / number
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(
+        f"{'consumers':>10} {'bytes':>10} {'drf render':>12} {'orjson render':>14} "
+        f"{'drf parse':>12} {'orjson parse':>13}"
+    )
+    for consumers in SIZES:
+        data = make_account_summary(consumers)
+        body = JSONRenderer().render(data)
+        number = max(1, 10000 // consumers)
+        timings = [
+            best(lambda: renderer().render(data), number, args.repeat)
+            for renderer in (JSONRenderer, ORJSONRenderer)
+        ] + [
+            best(lambda: parser().parse(io.BytesIO(body)), number, args.repeat)
+            for parser in (JSONParser, ORJSONParser)
+        ]
+        print(
+            f"{consumers:>10} {len(body):>10} "
+            + " ".join(
+                f"{t * 1e3:>{width - 3}.2f} ms"
+                for t, width in zip(timings, (12, 14, 12, 13))
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()